@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Per-package cost of resolving classifiers: compiled
+:class:`gpypi.classifiers.ClassifierIndex` versus the loop
+formerly used by :meth:`gpypi.ebuild.Ebuild.set_metadata`.
+
+Usage::
+
+    python benchmarks/bench_classifiers.py [--packages 100000]
+
+"""
+
+import sys
+import time
+import random
+import string
+
+import argparse
+
+from gpypi import trove_map
+from gpypi.classifiers import ClassifierIndex
+
+
+def make_packages(count, seed=0):
+    """Return `count` classifier lists resembling real :term:`PyPi` metadata"""
+    rnd = random.Random(seed)
+    tables = [trove_map.topic_dict, trove_map.license_dict, trove_map.prog_lang,
+        trove_map.os_dict, trove_map.env_dict, trove_map.misc_dict, trove_map.audience_dict]
+    tables = [sorted(table) for table in tables]
+    packages = []
+    for i in xrange(count):
+        classifiers = []
+        for table in tables:
+            classifiers.extend(rnd.sample(table, rnd.randint(0, 3)))
+        packages.append(classifiers)
+    return packages
+
+
+def category_loop(classifiers):
+    """Category lookup as done before the index was introduced"""
+    category = 'dev-python'
+    topics = [i for i in classifiers if i[:5] == 'Topic']
+    topic_classifiers = [tuple(i.split(' :: ')) for i in topics]
+    if len(topic_classifiers) > 0:
+        length = 0
+        for i in topic_classifiers:
+            if len(i) > length:
+                length = len(i)
+                tc = i
+        category = trove_map.topic_dict[string.join(tc, ' :: ')]
+    return category
+
+
+def bench(name, f, packages):
+    start = time.time()
+    for classifiers in packages:
+        f(classifiers)
+    elapsed = time.time() - start
+    print "%-40s %8.3fs %8.2fus/package" % (name, elapsed, elapsed / len(packages) * 1e6)
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--packages', type=int, default=100000)
+    options = parser.parse_args(args)
+
+    packages = make_packages(options.packages)
+    start = time.time()
+    index = ClassifierIndex.default()
+    print "compiled %r in %.3fs" % (index, time.time() - start)
+
+    bench("loop (category only)", category_loop, packages)
+    bench("index (category, license, python, os, use)", index.resolve, packages)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+End-to-end timing of ``gpypi create``, ``echo`` and ``sync`` against
+an offline :mod:`fakepypi` server with generated sdists.
+
+Each run happens in a fresh interpreter with ``http_proxy`` pointing
+to the fake server, ``DISTDIR`` prefilled with the sdists (portage
+never fetches) and ``PORTDIR_OVERLAY`` set to a scratch overlay.
+Needs portage and the rights ``gpypi`` needs to unpack ebuilds.
+
+Results (wall time, time per :mod:`gpypi.profiling` span, peak RSS,
+requests served) are written as JSON, compare two result files
+to flag regressions between commits::
+
+    python benchmarks/bench_e2e.py --size 30 --depth 3 -o before.json
+    git checkout feature
+    python benchmarks/bench_e2e.py --size 30 --depth 3 -o after.json
+    python benchmarks/bench_e2e.py --compare before.json after.json
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import tempfile
+import resource
+import traceback
+import subprocess
+
+import argparse
+
+from fakepypi import FakePyPI, make_tree
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+OVERLAY_NAME = 'gpypi-bench'
+SCENARIOS = ['echo', 'create', 'sync']
+
+INI = """[config]
+overlay = %(overlay)s
+cache_dir = %(cache_dir)s
+metadata_disable = true
+echangelog_disable = true
+
+[config_manager]
+use = argparse pypi ini setup_py
+questionnaire_options =
+"""
+
+
+def child(result_path, argv):
+    """Run ``gpypi`` with profiling in this process, write measurements
+    to `result_path`"""
+    from gpypi.cli import main
+    from gpypi.profiling import profiler
+
+    profiler.enable()
+    status = 0
+    start = time.time()
+    try:
+        main(argv)
+    except SystemExit, e:
+        status = e.code or 0
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    elapsed = time.time() - start
+    spans = dict((path, {'count': count, 'total': total, 'max': maximum})
+        for path, (count, total, maximum) in profiler.aggregate().items())
+    result = {
+        'status': status,
+        'run': elapsed,
+        'spans': spans,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'max_rss_children_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    }
+    with open(result_path, 'w') as f:
+        json.dump(result, f)
+
+
+class Bench(object):
+    """Scratch environment, fake server and scenario runner"""
+
+    def __init__(self, options):
+        self.options = options
+        self.tmp_dir = tempfile.mkdtemp(prefix='gpypi-bench-')
+        self.distdir = os.path.join(self.tmp_dir, 'distfiles')
+        self.overlay = os.path.join(self.tmp_dir, 'overlay')
+        self.packages = make_tree(options.size, options.depth, options.fanout, options.versions)
+        self.server = FakePyPI(self.packages, self.distdir)
+        self.config_file = os.path.join(self.tmp_dir, 'gpypi.ini')
+        with open(self.config_file, 'w') as f:
+            f.write(INI % dict(overlay=OVERLAY_NAME, cache_dir=os.path.join(self.tmp_dir, 'cache')))
+
+    def reset_overlay(self):
+        """Start each run with an empty overlay"""
+        shutil.rmtree(self.overlay, ignore_errors=True)
+        for directory in ['profiles', 'metadata']:
+            os.makedirs(os.path.join(self.overlay, directory))
+        with open(os.path.join(self.overlay, 'profiles', 'repo_name'), 'w') as f:
+            f.write(OVERLAY_NAME + "\n")
+        with open(os.path.join(self.overlay, 'metadata', 'layout.conf'), 'w') as f:
+            f.write("masters = gentoo\n")
+
+    def environment(self):
+        env = dict(os.environ)
+        env.update({
+            'http_proxy': self.server.url,
+            'HTTP_PROXY': self.server.url,
+            'HOME': self.tmp_dir,
+            'DISTDIR': self.distdir,
+            'PORTDIR_OVERLAY': self.overlay,
+            'PYTHONPATH': os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')])),
+        })
+        env.pop('no_proxy', None)
+        env.pop('NO_PROXY', None)
+        return env
+
+    def argv(self, scenario):
+        root = self.packages[0].name
+        common = ['--config-file', self.config_file, '--nocolors', '-q', '-i', self.server.url + '/simple/']
+        if scenario == 'echo':
+            return ['echo'] + common + ['--format', 'none', root]
+        elif scenario == 'create':
+            return ['create'] + common + [root]
+        return ['sync'] + common
+
+    def run(self, scenario):
+        """Run `scenario` once in a fresh interpreter
+
+        :returns: measurements of the run
+        :rtype: dict
+
+        """
+        self.reset_overlay()
+        self.server.reset_counts()
+        result_path = os.path.join(self.tmp_dir, 'result.json')
+        if os.path.exists(result_path):
+            os.unlink(result_path)
+
+        command = [sys.executable, os.path.abspath(__file__), '--child', result_path, '--'] \
+            + self.argv(scenario)
+        devnull = open(os.devnull, 'w')
+        start = time.time()
+        subprocess.call(command, env=self.environment(), stdout=devnull,
+            stderr=None if self.options.verbose else devnull)
+        wall = time.time() - start
+
+        result = {'status': 'crashed'}
+        if os.path.exists(result_path):
+            with open(result_path) as f:
+                result = json.load(f)
+        result['wall'] = wall
+        result['requests'] = self.server.reset_counts()
+        result['ebuilds'] = sum(len([name for name in files if name.endswith('.ebuild')])
+            for path, dirs, files in os.walk(self.overlay))
+        return result
+
+    def main(self):
+        self.server.start()
+        try:
+            results = {}
+            for scenario in self.options.scenarios:
+                runs = [self.run(scenario) for i in xrange(self.options.repeat)]
+                best = min(runs, key=lambda r: r['wall'])
+                best['walls'] = [r['wall'] for r in runs]
+                results[scenario] = best
+                print "%-8s %8.2fs  rss %7dkB  %4d requests  %3d ebuilds  status %s" % (
+                    scenario, best['wall'], best.get('max_rss_kb', 0),
+                    sum(best['requests'].values()), best['ebuilds'], best['status'])
+            return results
+        finally:
+            self.server.stop()
+            if not self.options.keep:
+                shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+            stderr=open(os.devnull, 'w')).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old, new, threshold):
+    """Print differences of two result files
+
+    :returns: number of regressions
+    :rtype: int
+
+    """
+    regressions = 0
+    print "%s -> %s" % (old.get('revision'), new.get('revision'))
+    if old.get('params') != new.get('params'):
+        print "warning: results were measured with different parameters"
+
+    def check(label, before, after):
+        if not before or after is None:
+            return 0
+        change = (after - before) / float(before)
+        flag = "REGRESSION" if change > threshold else ""
+        print "  %-40s %10.3f %10.3f %+7.1f%% %s" % (label, before, after, change * 100, flag)
+        return 1 if flag else 0
+
+    for scenario in sorted(set(old['scenarios']) & set(new['scenarios'])):
+        a, b = old['scenarios'][scenario], new['scenarios'][scenario]
+        print "%s:" % scenario
+        if a.get('status') != b.get('status'):
+            print "  status changed: %s -> %s" % (a.get('status'), b.get('status'))
+            regressions += 1
+        regressions += check('wall (s)', a['wall'], b['wall'])
+        regressions += check('peak rss (kB)', a.get('max_rss_kb'), b.get('max_rss_kb'))
+        regressions += check('requests', sum(a['requests'].values()), sum(b['requests'].values()))
+        spans_a, spans_b = a.get('spans', {}), b.get('spans', {})
+        for path in sorted(set(spans_a) & set(spans_b)):
+            # tiny spans are dominated by noise
+            if spans_a[path]['total'] >= 0.05:
+                regressions += check('span %s (s)' % path, spans_a[path]['total'], spans_b[path]['total'])
+    return regressions
+
+
+def main(args=sys.argv[1:]):
+    if args[:1] == ['--child']:
+        return child(args[1], args[3:])
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--size', type=int, default=20, help="number of projects")
+    parser.add_argument('--depth', type=int, default=2, help="depth of dependency tree")
+    parser.add_argument('--fanout', type=int, default=3, help="requirements per project")
+    parser.add_argument('--versions', type=int, default=1, help="releases per project")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS))
+    parser.add_argument('-o', '--output', default='bench_e2e.json')
+    parser.add_argument('--keep', action='store_true', help="keep scratch directory")
+    parser.add_argument('-v', '--verbose', action='store_true', help="show gpypi errors")
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'))
+    parser.add_argument('--threshold', type=float, default=0.1,
+        help="relative slowdown reported as regression")
+    options = parser.parse_args(args)
+
+    if options.compare:
+        old, new = [json.load(open(path)) for path in options.compare]
+        sys.exit(1 if compare(old, new, options.threshold) else 0)
+
+    options.scenarios = [s.strip() for s in options.scenarios.split(',') if s.strip()]
+    unknown = set(options.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error("unknown scenarios: %s" % ", ".join(sorted(unknown)))
+    logging.disable(logging.CRITICAL)
+
+    results = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'time': time.time(),
+        'params': dict((name, getattr(options, name))
+            for name in ['size', 'depth', 'fanout', 'versions', 'repeat']),
+        'scenarios': Bench(options).main(),
+    }
+    with open(options.output, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    print "results written to %s" % options.output
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Throughput of :meth:`gpypi.enamer.Enamer.get_vars` on a synthetic corpus.
+
+Corpus resembles what ``gpypi sync`` feeds to the namer: many projects,
+several releases each, and the same (uri, up_pn, up_pv) entries
+showing up repeatedly while resolving dependencies.
+
+Usage::
+
+    python benchmarks/bench_enamer.py [--size 100000] [--unique 20000]
+
+"""
+
+import sys
+import time
+import random
+import logging
+
+import argparse
+
+from gpypi.enamer import Enamer
+from gpypi.exc import GPyPiInvalidAtom
+
+
+NAMES = ['foo', 'Foo', 'foo.bar', 'FooBar', 'foo-bar', 'foo_bar', 'zope.interface',
+    'PyYAML', 'pkg', 'Paste', 'python-dateutil', 'SQLAlchemy']
+VERSIONS = ['1.0', '0.1', '2.3.4', '1.0b1', '1.0a2', '1.0rc1', '1.0dev-r1234',
+    '0.9.dev-20091118', '1.0-r5', '3.0.1', '1.0final', '0.5pre3']
+EXTENSIONS = ['.tar.gz', '.zip', '.tar.bz2', '.tgz']
+BASE_URIS = ['http://pypi.python.org/packages/source/%s/%s/',
+    'http://downloads.sourceforge.net/%s/%s/', 'http://www.%s.org/%s/']
+
+
+def make_corpus(size, unique, seed=0):
+    """Return `size` (uri, up_pn, up_pv) tuples drawn from `unique` distinct ones.
+
+    Distribution of repeats is skewed, as popular dependencies
+    are requested far more often than leaf packages.
+
+    """
+    rnd = random.Random(seed)
+    distinct = []
+    for i in xrange(unique):
+        up_pn = "%s%d" % (rnd.choice(NAMES), i)
+        up_pv = rnd.choice(VERSIONS)
+        base = rnd.choice(BASE_URIS) % (up_pn[0], up_pn)
+        uri = "%s%s-%s%s" % (base, up_pn, up_pv, rnd.choice(EXTENSIONS))
+        distinct.append((uri, up_pn, up_pv))
+    return [distinct[min(int(rnd.paretovariate(1.2)) - 1, unique - 1)
+        if rnd.random() < 0.5 else rnd.randrange(unique)] for i in xrange(size)]
+
+
+def bench(name, f, corpus):
+    """Run `f(corpus)` and print entries/sec"""
+    start = time.time()
+    f(corpus)
+    elapsed = time.time() - start
+    print "%-30s %8.2fs %10d entries/s" % (name, elapsed, len(corpus) / elapsed)
+    return elapsed
+
+
+def get_vars_each(corpus):
+    for entry in corpus:
+        try:
+            Enamer.get_vars(*entry)
+        except GPyPiInvalidAtom:
+            pass
+
+
+def get_vars_batch(corpus):
+    Enamer.get_vars_batch(corpus, ignore_errors=True)
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--unique', type=int, default=20000)
+    options = parser.parse_args(args)
+    logging.disable(logging.CRITICAL)
+
+    corpus = make_corpus(options.size, options.unique)
+    print "corpus: %d entries, %d unique" % (len(corpus), len(set(corpus)))
+
+    Enamer.clear_caches()
+    bench("get_vars (cold caches)", get_vars_each, corpus)
+    bench("get_vars (warm caches)", get_vars_each, corpus)
+    Enamer.clear_caches()
+    bench("get_vars_batch (cold caches)", get_vars_batch, corpus)
+    print "get_vars cache: %r" % Enamer.get_vars.cache
+
+
+if __name__ == '__main__':
+    main()
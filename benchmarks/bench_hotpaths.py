@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks of naming and rendering code that runs once per
+package or once per requirement.
+
+Corpora are grown from the ``(uri, up_pn, up_pv)`` cases of
+``gpypi/tests/test_enamer.py``. Each case becomes many synthetic
+projects with the same naming quirks (dots, case, version suffixes,
+URI shapes), requested with the skewed repetition of a dependency graph.
+
+For each benchmark both a cold (caches cleared) and a warm pass are
+reported, with operations per second and Python objects per call.
+The objects are net gc-tracked containers (allocated minus freed)
+during the pass, which is what CPython 2 can count without a patched
+interpreter. Memoization shows up there as cache growth.
+
+``Ebuild`` benchmarks need portage, like ``gpypi`` does. Benchmarks
+that can't run in the current environment are reported as skipped.
+
+Usage::
+
+    python benchmarks/bench_hotpaths.py [--size 20000] [--unique 5000] [--only parse_pv,render]
+
+"""
+
+import os
+import re
+import gc
+import sys
+import time
+import random
+import logging
+
+import argparse
+
+from gpypi.enamer import Enamer
+from gpypi.exc import GPyPiException
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEST_ENAMER = os.path.join(ROOT, 'gpypi', 'tests', 'test_enamer.py')
+
+CASE_RE = re.compile(r'up_pn = "(?P<up_pn>[^"]*)"\s+up_pv = "(?P<up_pv>[^"]*)"\s+'
+    r'uri = "(?P<uri>[^"]*)"')
+SETUP_LICENSES = ['', '', '', 'BSD', 'MIT', 'GPL', 'GPLv2', 'LGPL', 'Apache 2.0',
+    'Apache License, Version 2.0', 'ZPL 2.1', 'PSF', 'GPL alike', 'UNKNOWN']
+SPECS = ['', '', '', '', '>=%s', '>=%s', '==%s', '>=%s,<%s', '<%s', '[extra]']
+
+
+def load_cases(path=TEST_ENAMER):
+    """Return (uri, up_pn, up_pv) tuples used by ``test_get_vars*`` tests"""
+    with open(path) as f:
+        return [(m.group('uri'), m.group('up_pn'), m.group('up_pv'))
+            for m in CASE_RE.finditer(f.read())]
+
+
+def mutate_version(rnd, up_pv):
+    """Return version with the same shape as `up_pv` and other numbers"""
+    return re.sub(r'\d+', lambda m: str(rnd.randrange(10 ** min(len(m.group()), 4))), up_pv)
+
+
+def skewed(rnd, distinct, size):
+    """Draw `size` items from `distinct`, popular ones far more often"""
+    unique = len(distinct)
+    return [distinct[min(int(rnd.paretovariate(1.2)) - 1, unique - 1)
+        if rnd.random() < 0.5 else rnd.randrange(unique)] for i in xrange(size)]
+
+
+def make_entries(cases, size, unique, seed=0):
+    """Return `size` (uri, up_pn, up_pv) tuples drawn from `unique`
+    variations of `cases`"""
+    rnd = random.Random(seed)
+    distinct = []
+    for i in xrange(unique):
+        uri, up_pn, up_pv = cases[i % len(cases)]
+        pn = "%s%d" % (up_pn, i)
+        pv = mutate_version(rnd, up_pv)
+        distinct.append((uri.replace(up_pn, pn).replace(up_pv, pv), pn, pv))
+    return skewed(rnd, distinct, size)
+
+
+def make_requirements(entries, seed=0):
+    """Return requirement strings naming projects of `entries`"""
+    rnd = random.Random(seed)
+    requirements = []
+    for uri, up_pn, up_pv in entries:
+        spec = rnd.choice(SPECS)
+        if '%s,<%s' in spec:
+            spec = spec % (up_pv, mutate_version(rnd, up_pv))
+        elif '%s' in spec:
+            spec = spec % up_pv
+        requirements.append(up_pn + spec)
+    return requirements
+
+
+def make_licenses(size, seed=0):
+    """Return (classifiers, setup_license) arguments of
+    :meth:`gpypi.enamer.Enamer.convert_license`"""
+    from gpypi import trove_map
+
+    rnd = random.Random(seed)
+    licenses = sorted(trove_map.license_dict)
+    other = ['Programming Language :: Python', 'Operating System :: OS Independent',
+        'Development Status :: 4 - Beta', 'Intended Audience :: Developers']
+    corpus = []
+    for i in xrange(size):
+        classifiers = rnd.sample(other, rnd.randrange(len(other)))
+        if rnd.random() < 0.7:
+            classifiers.append(rnd.choice(licenses))
+        corpus.append((classifiers, rnd.choice(SETUP_LICENSES)))
+    return corpus
+
+
+def make_ebuilds(entries, count):
+    """Return `count` ebuilds for distinct projects of `entries`"""
+    from gpypi.config import Config, ConfigManager
+    from gpypi.ebuild import Ebuild
+
+    ebuilds = []
+    for uri, up_pn, up_pv in sorted(set(entries))[:count]:
+        config = ConfigManager(['pypi'])
+        config.configs['pypi'] = Config(uri=uri, up_pn=up_pn, up_pv=up_pv,
+            category='dev-python', overwrite=False)
+        ebuild = Ebuild(config)
+        ebuild.update({'description': 'Benchmark %s' % up_pn, 'homepage': uri,
+            'license': 'BSD', 'python_modname': up_pn})
+        ebuilds.append(ebuild)
+    return ebuilds
+
+
+class Benchmark(object):
+    """Calls `func` with each item of a corpus.
+
+    :param name: Name in the report
+    :type name: string
+    :param func: Called with one item
+    :type func: callable
+    :param setup: Returns the corpus, called once
+    :type setup: callable
+    :param clear: Resets caches before the cold pass
+    :type clear: callable
+
+    """
+
+    def __init__(self, name, func, setup, clear=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.clear = clear
+
+    def report(self, outcome, error):
+        """Print why the benchmark didn't run"""
+        print "%-28s %s (%s: %s)" % (self.name, outcome, error.__class__.__name__, error)
+
+    def run_pass(self, corpus):
+        """Return (seconds, net gc objects) of calling :attr:`func` on `corpus`"""
+        func = self.func
+        gc.collect()
+        gc.disable()
+        try:
+            objects = gc.get_count()[0]
+            start = time.time()
+            for item in corpus:
+                try:
+                    func(item)
+                except GPyPiException:
+                    pass
+            elapsed = time.time() - start
+            objects = gc.get_count()[0] - objects
+        finally:
+            gc.enable()
+        return elapsed, objects
+
+    def run(self):
+        """Print cold and warm pass results"""
+        try:
+            corpus = self.setup()
+        except Exception, e:
+            self.report('skipped', e)
+            return
+        if self.clear is not None:
+            self.clear()
+        for label in ['cold', 'warm']:
+            try:
+                elapsed, objects = self.run_pass(corpus)
+            except (ImportError, EnvironmentError), e:
+                # e.g. portage missing or unconfigured, like in setup()
+                self.report('skipped', e)
+                return
+            except Exception, e:
+                self.report('failed', e)
+                return
+            elapsed = elapsed or 1e-9
+            print "%-28s %-4s %10d ops/s %9.2f us/op %8.2f objs/op" % (self.name, label,
+                len(corpus) / elapsed, elapsed * 1e6 / len(corpus), float(objects) / len(corpus))
+
+
+def benchmarks(options):
+    """Return benchmarks built for `options`"""
+    cases = load_cases()
+    entries = make_entries(cases, options.size, options.unique)
+    state = {}
+
+    def ebuilds():
+        if 'ebuilds' not in state:
+            state['ebuilds'] = make_ebuilds(entries, options.ebuilds)
+        return state['ebuilds']
+
+    def dependencies_setup():
+        pool = ebuilds()
+        requirements = make_requirements(entries)
+        return [(pool[i % len(pool)], requirement) for i, requirement in enumerate(requirements)]
+
+    def render_setup():
+        pool = ebuilds()
+        return [pool[i % len(pool)] for i in xrange(options.size // 10 or 1)]
+
+    return [
+        Benchmark('Enamer.get_vars', lambda entry: Enamer.get_vars(*entry),
+            lambda: entries, Enamer.clear_caches),
+        Benchmark('Enamer.parse_pv', Enamer.parse_pv,
+            lambda: [entry[2] for entry in entries], Enamer.clear_caches),
+        Benchmark('Enamer.parse_pn', Enamer.parse_pn,
+            lambda: [entry[1] for entry in entries], Enamer.clear_caches),
+        Benchmark('Enamer.convert_license', lambda args: Enamer.convert_license(*args),
+            lambda: make_licenses(options.size)),
+        Benchmark('Ebuild.get_dependencies', lambda args: args[0].get_dependencies(args[1]),
+            dependencies_setup, Enamer.clear_caches),
+        Benchmark('Ebuild.render', lambda ebuild: ebuild.render(), render_setup),
+    ]
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--size', type=int, default=20000, help="calls per pass")
+    parser.add_argument('--unique', type=int, default=5000, help="distinct projects")
+    parser.add_argument('--ebuilds', type=int, default=200, help="ebuilds for Ebuild benchmarks")
+    parser.add_argument('--only', default='', help="comma separated benchmark name fragments")
+    options = parser.parse_args(args)
+    logging.disable(logging.CRITICAL)
+
+    only = filter(None, options.only.split(','))
+    print "corpus: %d cases from %s, %d calls, %d distinct projects" % (
+        len(load_cases()), os.path.relpath(TEST_ENAMER), options.size, options.unique)
+    for benchmark in benchmarks(options):
+        if not only or [o for o in only if o in benchmark.name]:
+            benchmark.run()
+
+
+if __name__ == '__main__':
+    main()
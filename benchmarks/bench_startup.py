@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Startup time of ``gpypi`` invocations, measured in fresh interpreters.
+
+Run it on two commits to compare, e.g.::
+
+    python benchmarks/bench_startup.py --repeat 20
+
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+import argparse
+
+
+SCENARIOS = [
+    ('import gpypi.cli', "import gpypi.cli"),
+    ('gpypi --help', "from gpypi.cli import main\n"
+        "try:\n    main(['--help'])\nexcept SystemExit:\n    pass"),
+    ('gpypi echo (imports)', "import gpypi.cli, gpypi.ebuild"),
+    ('portage config (first use)', "from gpypi.portage_utils import PortageUtils\n"
+        "PortageUtils.get_portdir()"),
+]
+
+
+def run(code, python):
+    """Return wall time of running `code` in a new interpreter,
+    None if it failed (e.g. portage is not available)
+    """
+    devnull = open(os.devnull, 'w')
+    start = time.time()
+    if subprocess.call([python, '-c', code], stdout=devnull, stderr=devnull):
+        return None
+    return time.time() - start
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--python', default=sys.executable)
+    options = parser.parse_args(args)
+
+    baseline = min(run('pass', options.python) for i in xrange(options.repeat))
+    print "%-30s %8.1fms" % ('interpreter', baseline * 1000)
+    for name, code in SCENARIOS:
+        best = min(run(code, options.python) for i in xrange(options.repeat))
+        if best is None:
+            print "%-30s   failed" % name
+            continue
+        print "%-30s %8.1fms (+%.1fms)" % (name, best * 1000, (best - baseline) * 1000)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Offline stand-in for :term:`PyPi` used by benchmarks.
+
+:class:`FakePyPI` serves generated packages over HTTP:
+
+* XML-RPC (``list_packages``, ``package_releases``, ``release_urls``,
+  ``release_data``) on any ``POST``, so pointing ``http_proxy`` at the
+  server redirects :mod:`yolk` (which talks to a hard coded PyPI URL)
+* simple index on ``/simple/<name>/``
+* sdists on ``/packages/source/<letter>/<name>/<file>``
+
+Requests are counted in :attr:`FakePyPI.requests`.
+
+Usage::
+
+    packages = make_tree(size=50, depth=3, fanout=3)
+    server = FakePyPI(packages, '/tmp/fixtures')
+    server.start()
+    ...
+    server.stop()
+
+"""
+
+import os
+import tarfile
+import hashlib
+import StringIO
+import threading
+import posixpath
+from collections import defaultdict
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SimpleXMLRPCServer import SimpleXMLRPCDispatcher
+
+
+SETUP_PY = """from setuptools import setup
+
+setup(
+    name=%(name)r,
+    version=%(version)r,
+    description=%(summary)r,
+    license='BSD',
+    packages=[%(module)r],
+    install_requires=%(requires)r,
+)
+"""
+
+
+class Package(object):
+    """Generated project release.
+
+    :param name: Project name
+    :type name: string
+    :param version: Release version
+    :type version: string
+    :param requires: Requirements of the release
+    :type requires: list of strings
+
+    """
+
+    def __init__(self, name, version, requires=()):
+        self.name = name
+        self.version = version
+        self.requires = list(requires)
+
+    def __repr__(self):
+        return "<Package %s %s>" % (self.name, self.version)
+
+    @property
+    def filename(self):
+        return "%s-%s.tar.gz" % (self.name, self.version)
+
+    @property
+    def path(self):
+        """URL path of the sdist"""
+        return "/packages/source/%s/%s/%s" % (self.name[0], self.name, self.filename)
+
+    def release_data(self, base_url):
+        """Return metadata as returned by PyPI's ``release_data``"""
+        return {
+            'name': self.name,
+            'version': self.version,
+            'summary': 'Benchmark fixture %s' % self.name,
+            'description': 'Generated package used by gpypi benchmarks.',
+            'home_page': '%s/%s/' % (base_url, self.name),
+            'author': 'gpypi',
+            'author_email': 'gpypi@example.com',
+            'license': 'BSD',
+            'keywords': 'benchmark',
+            'platform': 'UNKNOWN',
+            'download_url': 'UNKNOWN',
+            'classifiers': ['License :: OSI Approved :: BSD License',
+                'Programming Language :: Python', 'Topic :: Software Development'],
+            'requires_dist': self.requires,
+        }
+
+    def make_sdist(self, directory):
+        """Write sdist to `directory`, return its path"""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, self.filename)
+        prefix = "%s-%s" % (self.name, self.version)
+        module = self.name.replace('-', '_')
+        files = {
+            'setup.py': SETUP_PY % dict(name=self.name, version=self.version,
+                summary='Benchmark fixture', module=module, requires=self.requires),
+            'PKG-INFO': "Metadata-Version: 1.0\nName: %s\nVersion: %s\n" % (self.name, self.version),
+            '%s/__init__.py' % module: "__version__ = %r\n" % self.version,
+            'README': "Generated package used by gpypi benchmarks.\n",
+        }
+        with tarfile.open(path, 'w:gz') as tar:
+            for name, content in sorted(files.items()):
+                info = tarfile.TarInfo(posixpath.join(prefix, name))
+                info.size = len(content)
+                info.mtime = 0
+                tar.addfile(info, StringIO.StringIO(content))
+        return path
+
+
+def make_tree(size, depth=3, fanout=3, versions=1, prefix='benchpkg'):
+    """Return releases of `size` projects forming a dependency tree.
+
+    The first project is the root, each project down to `depth`
+    levels requires `fanout` others until there are `size` projects.
+    Newest release of each project carries the requirements.
+
+    :rtype: list of :class:`Package`
+
+    """
+    names = ["%s%04d" % (prefix, i) for i in xrange(size)]
+    children = defaultdict(list)
+    levels = {0: 0}
+    queue = [0]
+    next_index = 1
+    while queue and next_index < size:
+        parent = queue.pop(0)
+        if levels[parent] >= depth:
+            continue
+        for i in xrange(fanout):
+            if next_index >= size:
+                break
+            children[parent].append(names[next_index])
+            levels[next_index] = levels[parent] + 1
+            queue.append(next_index)
+            next_index += 1
+
+    packages = []
+    for index, name in enumerate(names):
+        for minor in xrange(versions):
+            requires = children[index] if minor == versions - 1 else []
+            packages.append(Package(name, "1.%d" % minor, requires))
+    return packages
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, code, body, content_type='text/html'):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        response = self.server.dispatcher._marshaled_dispatch(body)
+        self.send(200, response, 'text/xml')
+
+    def do_GET(self):
+        path = self.path
+        if '://' in path:
+            # proxied request carries absolute URL
+            path = '/' + path.split('://', 1)[1].partition('/')[2]
+        parts = filter(None, path.split('/'))
+        server = self.server
+        if len(parts) == 2 and parts[0] == 'simple':
+            server.count('simple')
+            links = ['<a href="%s#md5=%s">%s</a>' % (p.path, server.md5[p.filename], p.filename)
+                for p in server.releases.get(parts[1].lower(), [])]
+            if not links:
+                return self.send(404, 'Not Found')
+            return self.send(200, "<html><body>\n%s\n</body></html>" % "\n".join(links))
+        if len(parts) == 5 and parts[:2] == ['packages', 'source']:
+            server.count('download')
+            path = os.path.join(server.fixtures_dir, parts[-1])
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return self.send(200, f.read(), 'application/x-gzip')
+        server.count('not_found')
+        self.send(404, 'Not Found')
+
+
+class FakePyPI(ThreadingMixIn, HTTPServer):
+    """HTTP server impersonating PyPI for `packages`.
+
+    :param packages: Releases to serve
+    :type packages: list of :class:`Package`
+    :param fixtures_dir: Where sdists are generated
+    :type fixtures_dir: string
+    :param port: Port to listen on, 0 picks a free one
+    :type port: int
+
+    """
+    daemon_threads = True
+
+    def __init__(self, packages, fixtures_dir, port=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), _Handler)
+        self.fixtures_dir = fixtures_dir
+        self.releases = defaultdict(list)
+        self.md5 = {}
+        self.requests = defaultdict(int)
+        self._lock = threading.Lock()
+        self._thread = None
+        for package in packages:
+            self.releases[package.name.lower()].append(package)
+            with open(package.make_sdist(fixtures_dir), 'rb') as f:
+                self.md5[package.filename] = hashlib.md5(f.read()).hexdigest()
+
+        self.dispatcher = SimpleXMLRPCDispatcher(allow_none=True, encoding=None)
+        for name in ['list_packages', 'package_releases', 'release_urls', 'release_data']:
+            self.dispatcher.register_function(self._counted(name), name)
+
+    @property
+    def url(self):
+        return "http://%s:%d" % self.server_address
+
+    def count(self, kind):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def reset_counts(self):
+        """Return request counts and start counting from zero"""
+        with self._lock:
+            counts = dict(self.requests)
+            self.requests.clear()
+        return counts
+
+    def _counted(self, name):
+        method = getattr(self, name)
+
+        def wrapper(*args):
+            self.count('xmlrpc.%s' % name)
+            return method(*args)
+        return wrapper
+
+    def _find(self, name, version):
+        for package in self.releases.get(name.lower(), []):
+            if package.version == version:
+                return package
+
+    def list_packages(self):
+        return sorted(releases[0].name for releases in self.releases.values())
+
+    def package_releases(self, name, show_hidden=False):
+        return [p.version for p in reversed(self.releases.get(name.lower(), []))]
+
+    def release_urls(self, name, version):
+        package = self._find(name, version)
+        if package is None:
+            return []
+        return [{'url': self.url + package.path, 'packagetype': 'sdist',
+            'filename': package.filename, 'md5_digest': self.md5[package.filename],
+            'size': os.path.getsize(os.path.join(self.fixtures_dir, package.filename))}]
+
+    def release_data(self, name, version):
+        package = self._find(name, version)
+        return package.release_data(self.url) if package else {}
+
+    def start(self):
+        """Serve requests from a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='fakepypi')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self.shutdown()
+        self._thread.join()
+        self.server_close()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Portage atom and version handling
+=================================
+
+Pure-Python implementation of portage's package name splitting, atom
+validation and version comparison, following the Package Manager
+Specification. Behaves like :func:`portage.pkgsplit`,
+:func:`portage.dep.isvalidatom` and :func:`portage.versions.vercmp`
+(see :mod:`gpypi.tests.test_atom`), but doesn't need portage to be
+installed and avoids its import cost.
+
+"""
+
+import re
+
+from gpypi.utils import memoize
+
+# building blocks, as specified by PMS
+_cat = r'[\w+][\w+.-]*'
+_pkg = r'[\w+][\w+-]*?'
+_v = r'(cvs\.)?(\d+)((?:\.\d+)*)([a-z]?)((?:_(?:pre|p|beta|alpha|rc)\d*)*)'
+_rev = r'\d+'
+_vr = _v + r'(?:-r(' + _rev + r'))?'
+_slot = r'(?:\*|=|[\w+][\w+.-]*(?:/[\w+][\w+.-]*)?=?)'
+_repo = r'[\w][\w-]*'
+_use_flag = r'[A-Za-z0-9][A-Za-z0-9+_@-]*'
+
+VERSION_RE = re.compile(r'^' + _vr + r'$')
+SUFFIX_RE = re.compile(r'^(alpha|beta|rc|pre|p)(\d*)$')
+SUFFIX_VALUES = {'pre': -2, 'p': 0, 'alpha': -4, 'beta': -3, 'rc': -1}
+PKG_VERSION_RE = re.compile(r'^(?P<pn>' + _pkg + r'(?P<pn_inval>-' + _vr + r')?)' +
+    r'-(?P<ver>' + _v + r')(?:-r(?P<rev>' + _rev + r'))?$', re.UNICODE)
+CATEGORY_RE = re.compile(r'^' + _cat + r'$', re.UNICODE)
+ATOM_RE = re.compile(r'^(?:(?P<op>[=~]|[<>]=?)' + _cat + r'/' + _pkg + r'(?P<op_inval>-' + _vr + r')?-' +
+    _vr + r'(?P<star>\*)?|' + _cat + r'/' + _pkg + r'(?P<simple_inval>-' + _vr + r')?)' +
+    r'(?::(?P<slot>' + _slot + r'))?(?:::(?P<repo>' + _repo + r'))?' +
+    r'(?:\[(?P<use>[^\]]*)\])?$', re.UNICODE)
+USE_DEP_RE = re.compile(r'^(?:!?' + _use_flag + r'(?:\([+-]\))?[?=]|-?' + _use_flag + r'(?:\([+-]\))?)$')
+
+
+@memoize(10000)
+def pkgsplit(mypkg):
+    """Split :term:`P` (optionally with category) into name, version and revision.
+
+    :param mypkg: [category/]package-version[-rREV]
+    :type mypkg: string
+    :returns: (pn, pv, rev) or None if `mypkg` is not valid
+    :rtype: tuple of strings
+
+    **Example:**
+
+    >>> pkgsplit('foo-2.3_beta3-r5')
+    ('foo', '2.3_beta3', 'r5')
+    >>> pkgsplit('dev-python/foo-1.0')
+    ('dev-python/foo', '1.0', 'r0')
+    >>> pkgsplit('foo-1.0-2.0') is None
+    True
+
+    """
+    parts = mypkg.split('/')
+    if len(parts) > 2:
+        return None
+    elif len(parts) == 2 and not CATEGORY_RE.match(parts[0]):
+        return None
+
+    m = PKG_VERSION_RE.match(parts[-1])
+    if m is None or m.group('pn_inval') is not None:
+        # package name appears to have a version-like suffix
+        return None
+
+    pn = m.group('pn')
+    if len(parts) == 2:
+        pn = '%s/%s' % (parts[0], pn)
+    return pn, m.group('ver'), 'r' + (m.group('rev') or '0')
+
+
+def catpkgsplit(mydata):
+    """Split category/package-version into four parts.
+
+    :returns: (category, pn, pv, rev) or None, category is None
+        when it is missing
+    :rtype: tuple of strings
+
+    **Example:**
+
+    >>> catpkgsplit('dev-python/foo-1.0-r1')
+    ('dev-python', 'foo', '1.0', 'r1')
+
+    """
+    psplit = pkgsplit(mydata)
+    if psplit is None:
+        return None
+    cat = None
+    pn, pv, rev = psplit
+    if '/' in pn:
+        cat, pn = pn.split('/')
+    return cat, pn, pv, rev
+
+
+def isvalidatom(atom, allow_blockers=False, allow_repo=False):
+    """Check if `atom` is a valid portage dependency atom.
+
+    :param atom: Portage atom
+    :type atom: string
+    :param allow_blockers: Accept ``!`` and ``!!`` blockers
+    :type allow_blockers: bool
+    :param allow_repo: Accept ``::repository`` part
+    :type allow_repo: bool
+    :rtype: bool
+
+    **Example:**
+
+    >>> isvalidatom('=dev-python/foobar-1.0')
+    True
+    >>> isvalidatom('dev-python/foobar-1.0')
+    False
+    >>> isvalidatom('>=dev-python/foobar-1.0[foo,-bar,baz?]')
+    True
+    >>> isvalidatom('=foobar-1.0')
+    False
+
+    """
+    if atom.startswith('!'):
+        if not allow_blockers:
+            return False
+        atom = atom[2:] if atom.startswith('!!') else atom[1:]
+
+    m = ATOM_RE.match(atom)
+    if m is None:
+        return False
+    if m.group('op_inval') is not None or m.group('simple_inval') is not None:
+        # package name appears to have a version-like suffix,
+        # or atom without operator has a version
+        return False
+    if m.group('star') and m.group('op') != '=':
+        return False
+
+    if m.group('repo') and not allow_repo:
+        return False
+
+    use = m.group('use')
+    if use is not None:
+        for flag in use.split(','):
+            if not USE_DEP_RE.match(flag):
+                return False
+    return True
+
+
+@memoize(10000)
+def _parse_version(ver):
+    """Return comparable parts of a version or None if it is invalid"""
+    m = VERSION_RE.match(ver)
+    if m is None:
+        return None
+    cvs, major, minors, letter, suffixes, rev = m.groups()
+    suffix_list = []
+    for suffix in suffixes.split('_')[1:]:
+        name, num = SUFFIX_RE.match(suffix).groups()
+        suffix_list.append((name, int(num or 0)))
+    return bool(cvs), int(major), minors[1:].split('.') if minors else [], \
+        letter, suffix_list, int(rev or 0)
+
+
+def vercmp(ver1, ver2):
+    """Compare two versions as portage does.
+
+    :param ver1: version[-rREV]
+    :param ver2: version[-rREV]
+    :type ver1: string
+    :type ver2: string
+    :returns: negative if `ver1` is lower than `ver2`, 0 if they are
+        equal, positive if `ver1` is greater or None if a version is invalid
+    :rtype: int
+
+    **Example:**
+
+    >>> vercmp('1.0', '1.0')
+    0
+    >>> vercmp('1.0_beta1', '1.0') < 0
+    True
+    >>> vercmp('1.0.0', '1.0') > 0
+    True
+    >>> vercmp('1.02', '1.1') < 0
+    True
+
+    """
+    if ver1 == ver2:
+        return 0
+    v1 = _parse_version(ver1)
+    v2 = _parse_version(ver2)
+    if v1 is None or v2 is None:
+        return None
+
+    # cvs versions are always greater
+    if v1[0] != v2[0]:
+        return 1 if v1[0] else -1
+
+    list1 = [v1[1]]
+    list2 = [v2[1]]
+    minors1, minors2 = v1[2], v2[2]
+    for i in range(max(len(minors1), len(minors2))):
+        # implicit .0 is lower, so 1.0.0 > 1.0
+        if len(minors1) <= i:
+            list1.append(-1)
+            list2.append(int(minors2[i]))
+        elif len(minors2) <= i:
+            list1.append(int(minors1[i]))
+            list2.append(-1)
+        elif minors1[i][0] != '0' and minors2[i][0] != '0':
+            list1.append(int(minors1[i]))
+            list2.append(int(minors2[i]))
+        else:
+            # leading zeros compare as decimal fractions, 1.02 < 1.1
+            max_len = max(len(minors1[i]), len(minors2[i]))
+            list1.append(int(minors1[i].ljust(max_len, '0')))
+            list2.append(int(minors2[i].ljust(max_len, '0')))
+
+    if v1[3]:
+        list1.append(ord(v1[3]))
+    if v2[3]:
+        list2.append(ord(v2[3]))
+
+    for i in range(max(len(list1), len(list2))):
+        if len(list1) <= i:
+            return -1
+        elif len(list2) <= i:
+            return 1
+        elif list1[i] != list2[i]:
+            return cmp(list1[i], list2[i])
+
+    suffixes1, suffixes2 = v1[4], v2[4]
+    for i in range(max(len(suffixes1), len(suffixes2))):
+        # implicit _p0 is lower, so 1 < 1_p0
+        s1 = suffixes1[i] if i < len(suffixes1) else ('p', -1)
+        s2 = suffixes2[i] if i < len(suffixes2) else ('p', -1)
+        if s1[0] != s2[0]:
+            return cmp(SUFFIX_VALUES[s1[0]], SUFFIX_VALUES[s2[0]])
+        if s1[1] != s2[1]:
+            return cmp(s1[1], s2[1])
+
+    return cmp(v1[5], v2[5])
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Compiled index over :mod:`gpypi.trove_map` tables. Resolves all
+:term:`PyPi` classifiers of a package in one pass.
+
+"""
+
+import logging
+
+from gpypi.trove_map import topic_dict, license_dict, os_dict, prog_lang, env_dict
+
+log = logging.getLogger(__name__)
+
+
+class ClassifierIndex(object):
+    """Prefix trie of classifier segments (split by ``" :: "``).
+    Each node can hold a value per kind of lookup, a classifier
+    resolves to values of the deepest matching node (longest match),
+    so unknown sub-classifiers fall back to their known parent.
+
+    Matches are cached per classifier string, so resolving a package
+    costs one dict lookup per classifier once the cache is warm.
+
+    Kinds resolved by :meth:`resolve`:
+
+    * category -- Portage category, from the most detailed topic
+    * license -- Portage license, from the last license classifier
+    * python -- set of supported Python versions
+    * os -- set of supported operating systems
+    * languages -- set of programming languages
+    * use -- set of :term:`USE` flag hints from environment classifiers
+
+    :param tables: Mapping of kind to ``{classifier: value}`` dict,
+        classifiers with None value are skipped
+    :type tables: dict
+
+    Example::
+
+        >>> index = ClassifierIndex.default()
+        >>> info = index.resolve(['Topic :: Text Processing :: Markup :: Foo',
+        ...     'Programming Language :: Python :: 2.7'])
+        >>> info['category'], info['python']
+        ('app-text', set(['2.7']))
+
+    """
+    SEPARATOR = ' :: '
+    SINGLE_KINDS = ['category', 'license']
+    MULTI_KINDS = ['python', 'os', 'languages', 'use']
+    MAX_CACHED = 10000
+    _default = None
+
+    def __init__(self, tables):
+        self.root = ({}, {})
+        self._matches = {}
+        for kind, table in tables.iteritems():
+            for classifier, value in table.iteritems():
+                if value is not None:
+                    self.add(kind, classifier, value)
+
+    def __repr__(self):
+        return "<ClassifierIndex nodes(%d)>" % self.count_nodes()
+
+    @classmethod
+    def default(cls):
+        """Return process-wide index compiled from :mod:`gpypi.trove_map`"""
+        if cls._default is None:
+            cls._default = cls(cls.default_tables())
+        return cls._default
+
+    @classmethod
+    def default_tables(cls):
+        """Build lookup tables from :mod:`gpypi.trove_map`.
+
+        :returns: kind -> {classifier: value}
+        :rtype: dict
+
+        """
+        split = lambda classifier: classifier.split(cls.SEPARATOR)
+        python = dict((c, split(c)[2]) for c in prog_lang
+            if c.startswith('Programming Language :: Python :: '))
+        return {
+            'category': topic_dict,
+            'license': license_dict,
+            'python': python,
+            'os': dict((c, cls.SEPARATOR.join(split(c)[1:])) for c in os_dict),
+            'languages': dict((c, split(c)[1]) for c in prog_lang),
+            'use': env_dict,
+        }
+
+    def add(self, kind, classifier, value):
+        """Store `value` of `kind` under `classifier` node"""
+        node = self.root
+        for segment in classifier.split(self.SEPARATOR):
+            children = node[0]
+            if segment not in children:
+                children[segment] = ({}, {})
+            node = children[segment]
+        node[1][kind] = value
+        self._matches.clear()
+
+    def match(self, classifier):
+        """Return longest matches for a classifier.
+
+        :param classifier: :term:`PyPi` classifier
+        :type classifier: string
+        :returns: kind -> (depth of the match, value)
+        :rtype: dict
+
+        """
+        matches = {}
+        node = self.root
+        depth = 0
+        for segment in classifier.split(self.SEPARATOR):
+            node = node[0].get(segment)
+            if node is None:
+                break
+            depth += 1
+            for kind, value in node[1].iteritems():
+                matches[kind] = (depth, value)
+        return matches
+
+    def resolve(self, classifiers):
+        """Resolve all classifiers of a package.
+
+        :param classifiers: :term:`PyPi` classifiers
+        :type classifiers: list of strings
+        :returns: values for :attr:`SINGLE_KINDS` (None if not found)
+            and sets for :attr:`MULTI_KINDS`
+        :rtype: dict
+
+        """
+        result = dict.fromkeys(self.SINGLE_KINDS)
+        for kind in self.MULTI_KINDS:
+            result[kind] = set()
+        category_depth = 0
+
+        for classifier in classifiers:
+            matches = self._matches.get(classifier)
+            if matches is None:
+                if len(self._matches) >= self.MAX_CACHED:
+                    self._matches.clear()
+                matches = self._matches[classifier] = self.match(classifier).items()
+            for kind, (depth, value) in matches:
+                if kind == 'category':
+                    # most detailed topic wins, first one on ties
+                    if depth > category_depth:
+                        category_depth = depth
+                        result['category'] = value
+                elif kind == 'license':
+                    result['license'] = value
+                else:
+                    result[kind].add(value)
+        return result
+
+    def count_nodes(self, node=None):
+        """Return number of nodes in the trie"""
+        node = node or self.root
+        return sum(1 + self.count_nodes(child) for child in node[0].itervalues())
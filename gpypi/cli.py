@@ -4,30 +4,25 @@
 """
 Command-line code for :mod:`gpypi`
 
+Heavy dependencies (portage, yolk, jinja2, pygments, metagen, setuptools)
+are imported only by commands that need them, so startup of
+``gpypi --help`` stays cheap. :mod:`gpypi.tests.test_cli` guards this.
+
 """
 
 import os
 import sys
-import pdb
 import logging
+from collections import OrderedDict
 
 import argparse
 
-from yolk.pypi import CheeseShop
-from yolk.yolklib import get_highest_version
-from yolk.setuptools_support import get_download_uri
-
 from gpypi import __version__
 from gpypi.exc import *
-from gpypi.enamer import Enamer
 from gpypi.config import Config, ConfigManager
-from gpypi.ebuild import Ebuild
-from gpypi.portage_utils import PortageUtils
+from gpypi.profiling import profiler, span
 from gpypi.utils import PortageFormatter, PortageStreamHandler
 
-# Portages' security level
-from portage.data import secpass, portage_gid
-
 log = logging.getLogger(__name__)
 
 
@@ -44,26 +39,98 @@ class GPyPI(object):
     :param options: command-line options
     :type options: ArgParse options
 
+    :param requirements: more packages to create, e.g. from requirements file
+    :type requirements: list of :class:`pkg_resources.Requirement`
+
     """
 
-    def __init__(self, package_name, version, options):
+    _pypi = None
+    OUTCOMES = ['created', 'skipped', 'failed', 'not found']
+
+    def __init__(self, package_name, version, options, requirements=()):
         self.package_name = package_name
         self.version = version
         self.options = options
-        self.tree = [(package_name, version)]
-        self.pypi = CheeseShop()
+        self.tree = []
+        self.seen = set()
+        self.results = OrderedDict()
+        self.lockfile = None
+        self.pypi = self.get_pypi(options)
+
+        if package_name:
+            self.add(package_name, version)
+        for req in requirements:
+            specs = req.specs
+            if len(specs) == 1 and specs[0][0] in ('==', '==='):
+                self.add(req.project_name, specs[0][1])
+            else:
+                self.add(req.project_name, req if specs else None)
+
+    @classmethod
+    def get_pypi(cls, options=None):
+        """Return process-wide :class:`yolk.pypi.CheeseShop`,
+        loading its package list once (``gpypi serve`` reuses it),
+        :class:`gpypi.mirror.LocalMirror` with ``mirror_dir`` or
+        :class:`gpypi.store.MetadataStore` with ``offline`` `options`.
+        With `options`, answers of CheeseShop are recorded to the
+        metadata store (:class:`gpypi.store.RecordingPyPI`)."""
+        if options is not None and options.mirror_dir:
+            from gpypi.mirror import LocalMirror
+            return LocalMirror(options.mirror_dir)
+        if options is not None and options.offline:
+            from gpypi.store import MetadataStore
+            return MetadataStore.from_config(options)
+        if GPyPI._pypi is None:
+            from yolk.pypi import CheeseShop
+            GPyPI._pypi = CheeseShop()
+        if options is not None:
+            from gpypi.store import RecordingPyPI
+            return RecordingPyPI.wrap(GPyPI._pypi, options)
+        return GPyPI._pypi
+
+    def add(self, project_name, version=None):
+        """Queue package unless it was queued before.
+
+        :param version: exact version, requirement to select the
+            highest matching version or None for the highest
+        :type version: string, :class:`pkg_resources.Requirement` or None
+        :returns: True if package was queued
+        :rtype: bool
+
+        """
+        from pkg_resources import safe_name
+
+        key = safe_name(project_name).lower()
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+        self.tree.append((project_name, version))
+        return True
 
     def create_ebuilds(self):
         """
         Create ebuild for given package_name and any ebuilds for dependencies
         if needed. If no version is given we use the highest available.
+        Packages shared by several roots are created once, failure of one
+        package is logged and recorded in :attr:`results`.
 
         """
         while len(self.tree):
             (project_name, version) = self.tree.pop(0)
             self.package_name = project_name
             self.version = version
-            requires = self.do_ebuild()
+            try:
+                requires = self.do_ebuild()
+            except GPyPiException, e:
+                log.error("%s: %s: %s", self.package_name, e.__class__.__name__, e)
+                self.results[self.package_name] = 'failed'
+                continue
+            except (Exception, SystemExit), e:
+                # setup.py of the package, portage or network, may
+                # raise anything (or exit), the rest is still created
+                log.exception("%s: %s: %s", self.package_name, e.__class__.__name__, e)
+                self.results[self.package_name] = 'failed'
+                continue
             if requires:
                 for req in requires:
                     if self.options.no_deps:
@@ -75,18 +142,38 @@ class GPyPI(object):
             #self.options.category = None
 
     def handle_dependencies(self, project_name):
-        """Add dependency if not already in self.tree"""
-        pkgs = []
-        if len(self.tree):
-            for deps in self.tree:
-                pkgs.append(deps[0])
-
-        if project_name not in pkgs:
-            # TODO: document that we can not query pypi with version spec or use distutils2
-            # for dependencies
-            self.tree.append((project_name, None))
+        """Add dependency if it was not queued already"""
+        # TODO: document that we can not query pypi with version spec or use distutils2
+        # for dependencies
+        if self.add(project_name):
             log.info("Dependency needed: %s" % project_name)
 
+    def summary(self):
+        """Return lines reporting what happened to each package
+
+        :rtype: list of strings
+
+        """
+        return self.summarize(self.results)
+
+    @classmethod
+    def summarize(cls, results):
+        """Return summary lines of `results`, see :meth:`summary`
+
+        :param results: outcome by package name
+        :type results: dict
+
+        """
+        outcomes = OrderedDict((outcome, []) for outcome in cls.OUTCOMES)
+        for name, outcome in results.iteritems():
+            outcomes[outcome].append(name)
+        lines = [", ".join("%d %s" % (len(names), outcome)
+            for outcome, names in outcomes.iteritems())]
+        for outcome, names in outcomes.iteritems():
+            if names:
+                lines.append("%s: %s" % (outcome.capitalize(), " ".join(names)))
+        return lines
+
     def url_from_pypi(self):
         """
         Query PyPI to find a package's URI
@@ -106,6 +193,8 @@ class GPyPI(object):
         :returns: source URL string or None
 
         """
+        from yolk.setuptools_support import get_download_uri
+
         #if self.options.subversion:
         #    src_uri = get_download_uri(self.package_name, "dev", "source")
         #else:
@@ -128,7 +217,8 @@ class GPyPI(object):
         if method == "all" or method == "xml-rpc":
             download_url = self.url_from_pypi()
 
-        if (method == "all" or method == "setuptools") and not download_url:
+        if (method == "all" or method == "setuptools") and not download_url \
+                and not (self.options.mirror_dir or self.options.offline):
             #Sometimes setuptools can find a package URI if PyPI doesn't have it
             download_url = self.url_from_setuptools()
 
@@ -144,37 +234,65 @@ class GPyPI(object):
         :returns: tuple with exit code and pkg_resources requirement
 
         """
+        with span('package', package=self.package_name):
+            return self._do_ebuild()
+
+    def _do_ebuild(self):
+        from pkg_resources import Requirement
+        from gpypi.ebuild import Ebuild
+        from gpypi.versions import highest_version, highest_matching
+
+        requirement = None
+        if isinstance(self.version, Requirement):
+            requirement, self.version = self.version, None
+
         #Get proper case for project name:
-        (self.package_name, versions) = self.pypi.query_versions_pypi(self.package_name)
+        with span('pypi.versions'):
+            (self.package_name, versions) = self.pypi.query_versions_pypi(self.package_name)
 
         if not versions:
             log.error("No package %s on PyPi." % self.package_name)
+            self.results[self.package_name] = 'not found'
             return
 
         if self.version and (self.version not in versions):
             log.error("No package %s for version %s on PyPi." % (self.package_name, self.version))
+            self.results[self.package_name] = 'not found'
             return
-        else:
-            self.version = get_highest_version(versions)
+        elif requirement is not None:
+            self.version = highest_matching(versions, requirement)
+            if not self.version:
+                log.error("No package %s matching %s on PyPi." % (self.package_name, requirement))
+                self.results[self.package_name] = 'not found'
+                return
+        elif not self.version:
+            self.version = highest_version(versions)
 
         # TODO: self.options.uri only for first ebuild
         # TODO: make find_uri method configurable
-        download_url = self.find_uri()
+        with span('pypi.download_url'):
+            download_url = self.find_uri()
+        if download_url and self.options.mirror_dir:
+            self.pypi.fetch(download_url)
 
         log.info('Generating ebuild: %s %s', self.package_name, self.version)
         log.debug('URI from PyPi: %s', download_url)
 
-        self.options.configs['argparse']['uri'] = download_url
-        self.options.configs['argparse']['up_pn'] = self.package_name
-        self.options.configs['argparse']['up_pv'] = self.version
+        options = self.options.snapshot(uri=download_url,
+            up_pn=self.package_name, up_pv=self.version)
 
-        ebuild = Ebuild(self.options)
-        ebuild.set_metadata(self.query_metadata())
+        ebuild = Ebuild(options)
+        with span('pypi.release_data'):
+            metadata = self.query_metadata()
+        ebuild.set_metadata(metadata)
 
-        if self.options.command == 'echo':
+        if options.command == 'echo':
             ebuild.print_formatted()
         else:
             ebuild.create()
+            self.results[self.package_name] = 'created' if ebuild.created else 'skipped'
+            if self.lockfile is not None:
+                self.lockfile.add(ebuild)
         return ebuild.requires
 
     def query_metadata(self):
@@ -184,12 +302,13 @@ class GPyPI(object):
         :returns: metadata text
 
         """
+        from gpypi.versions import highest_version
 
         if self.version:
             return self.pypi.release_data(self.package_name, self.version)
         else:
             (pn, vers) = self.pypi.query_versions_pypi(self.package_name)
-            return self.pypi.release_data(self.package_name, get_highest_version(vers))
+            return self.pypi.release_data(self.package_name, highest_version(vers))
 
 
 class CLI(object):
@@ -213,12 +332,35 @@ class CLI(object):
 
     def create(self):
         """"""
-        gpypi = GPyPI(self.config.up_pn, self.config.up_pv, self.config)
-        gpypi.create_ebuilds()
+        from gpypi.lockfile import Lockfile
+        from gpypi.utils import read_requirements
+
+        if self.config.from_lock:
+            results = Lockfile.load(self.config.from_lock).regenerate(self.config)
+            for line in GPyPI.summarize(results):
+                log.info(line)
+            return
+
+        requirements = []
+        if self.config.requirements:
+            requirements = read_requirements(self.config.requirements)
+        gpypi = GPyPI(self.config.up_pn, self.config.up_pv, self.config, requirements)
+        if self.config.lock_file:
+            gpypi.lockfile = Lockfile.open(self.config.lock_file)
+        try:
+            gpypi.create_ebuilds()
+        finally:
+            if gpypi.lockfile is not None:
+                gpypi.lockfile.write()
+        if len(gpypi.results) > 1 or requirements:
+            for line in gpypi.summary():
+                log.info(line)
         # TODO: atomic cleanup
 
     def install(self):
         """"""
+        from gpypi.enamer import Enamer
+
         self.create()
         package = Enamer.parse_pn(self.config.up_pn)[0]
         os.execvp('emerge', ['emerge', '-av', package or self.config.up_pn])
@@ -231,41 +373,134 @@ class CLI(object):
         gpypi.do_ebuild()
         # TODO: cleanup
 
+    def metadata(self):
+        """"""
+        from gpypi.store import MetadataStore
+
+        store = MetadataStore.from_config(self.config)
+        try:
+            store.transfer(self.config.metadata_action, self.config.metadata_dump)
+        finally:
+            store.close()
+
+    def rdeps(self):
+        """"""
+        from gpypi.rdeps import ReverseDependencyIndex
+
+        index = ReverseDependencyIndex.from_config(self.config)
+        try:
+            dependants = index.dependants(self.config.rdeps_package, self.config.recursive)
+        finally:
+            index.close()
+
+        if not dependants:
+            log.warn("No generated ebuilds depend on %s", self.config.rdeps_package)
+            return
+        for entry in dependants:
+            print "%s/%s: %s" % (os.path.dirname(entry['cpn']), entry['pf'], " ".join(entry['atoms']))
+
+        if self.config.regenerate:
+            gpypi = GPyPI(None, None, self.config.snapshot(overwrite=True, no_deps=True))
+            # every version is written, add() would keep only the first of a project
+            for entry in dependants:
+                job = (entry['up_pn'], entry['up_pv'])
+                if job not in gpypi.tree:
+                    gpypi.tree.append(job)
+            gpypi.create_ebuilds()
+            for line in gpypi.summary():
+                log.info(line)
+
+    def search(self):
+        """"""
+        from gpypi.enamer import Enamer
+        from gpypi.portage_utils import PortageUtils
+        from gpypi.search import SearchIndex
+        from gpypi.store import MetadataStore
+
+        store = MetadataStore.from_config(self.config)
+        try:
+            if not len(store):
+                log.warn("Metadata store is empty, import a dump with gpypi metadata import")
+                return
+            index = SearchIndex(store)
+            index.update(full=self.config.reindex)
+            hits = []
+            for name, summary in index.search(self.config.search_query, self.config.search_limit):
+                pn = Enamer.parse_pn(name)[0] or name
+                hits.append((name, summary, '%s/%s' % (index.category(name), pn)))
+        finally:
+            store.close()
+
+        if not hits:
+            log.warn("No packages match %r", self.config.search_query)
+        for name, summary, cpn in hits:
+            overlays = PortageUtils.package_overlays(cpn)
+            print "%s (%s: %s)" % (name, cpn,
+                "in " + ", ".join(overlays) if overlays else "no ebuild")
+            if summary:
+                print "    " + summary
+
+    def serve(self):
+        """"""
+        from gpypi.daemon import Server, socket_path
+
+        server = Server(socket_path(self.config))
+        server.warm_up()
+        log.info("Serving on %s", server.path)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+
     def sync(self):
         """"""
-        pypi = CheeseShop()
-        for package in pypi.list_packages():
-            (pn, vers) = pypi.query_versions_pypi(package)
-            for version in vers:
-                # TODO: parse_* will not return anything for correct atoms
-                atom = Enamer.construct_atom(Enamer.parse_pn(pn)[0], self.config.category, Enamer.parse_pv(version[0]))
-
-                # we skip existing ebuilds
-                if PortageUtils.ebuild_exists(atom):
-                    continue
-                try:
-                    url = pypi.get_download_urls(pn, version)[0]
-                    # TODO: use setuptools way also
-                except IndexError:
-                    log.warn('Skipping %s, no download url', atom)
-                else:
-                    try:
-                        self.config.configs['argparse']['uri'] = url
-                        self.config.configs['argparse']['up_pn'] = pn
-                        self.config.configs['argparse']['up_pv'] = version
-                        gpypi = GPyPI(pn, version, self.config)
-                        gpypi.create_ebuilds()
-                    except KeyboardInterrupt:
-                        raise
-                    except:
-                        log.exception('Unexpected error occured during ebuild creation:')
+        from gpypi.pipeline import SyncPipeline
+        from gpypi.journal import SyncJournal
+
+        # stages must not depend on the working directory of the process
+        config = self.config.snapshot(**dict((name, os.path.abspath(getattr(self.config, name)))
+            for name in ('cache_dir', 'sync_journal', 'metrics_file', 'mirror_dir')
+            if getattr(self.config, name)))
+        path = config.sync_journal or os.path.join(config.cache_dir, 'sync.journal')
+        try:
+            journal = SyncJournal(path, resume=config.resume, retries=config.sync_retries)
+        except GPyPiConfigurationError, e:
+            # journal is required only to resume or when asked for explicitly
+            if config.resume or config.sync_journal:
+                raise
+            log.warn("%s, syncing without journal", e)
+            journal = None
+        pipeline = SyncPipeline(config, journal)
+        writer = None
+        if config.metrics_file:
+            from gpypi.metrics import MetricsWriter, metrics
+            writer = MetricsWriter(metrics, config.metrics_file, config.metrics_interval)
+            writer.start()
+        try:
+            pipeline.run()
+        finally:
+            if journal is not None:
+                journal.close()
+            if writer is not None:
+                writer.stop()
+            for line in pipeline.report():
+                log.info(line)
 
 
-def main(args=sys.argv[1:]):
-    """Parse command-line options and do it.
-    Core function for gpypi command.
+class JoinedArguments(argparse.Action):
+    """Store words of a positional argument as one string"""
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        setattr(namespace, self.dest, " ".join(values))
+
+
+def make_parser():
+    """Return parser of gpypi command line
+
+    :rtype: :class:`argparse.ArgumentParser`
 
-    Dispatches commands to :class:`gpypi.cli.CLI`
     """
     main_parser = argparse.ArgumentParser(prog='gpypi',
         description="Builds ebuilds from PyPi.")
@@ -299,12 +534,24 @@ def main(args=sys.argv[1:]):
         help=Config.allowed_options['uri'][0])
     parser.add_argument("-i", "--index-url", action='store', dest="index_url",
         help=Config.allowed_options['index_url'][0])
+    parser.add_argument("--mirror", action='store', dest="mirror_dir",
+        metavar="DIR", help=Config.allowed_options['mirror_dir'][0])
+    parser.add_argument("--offline", action='store_true', dest="offline",
+        help=Config.allowed_options['offline'][0])
     # TODO: release yolk with support to query third party PyPi
     # TODO: test --index-url is always taken in account
     parser.add_argument('--nocolors', action='store_true', dest='nocolors',
         help=Config.allowed_options['nocolors'][0])
     parser.add_argument("--config-file", action='store', dest="config_file",
         default="/etc/gpypi", help="Absolute path to a config file")
+    parser.add_argument("--profile", action='store_true', dest="profile",
+        default=False, help="Report time spent in each step per package.")
+    parser.add_argument("--profile-dump", action='store', dest="profile_dump",
+        metavar="FILE", help="Implies --profile, also dump cProfile stats to FILE.")
+    parser.add_argument("--socket", action='store', dest="daemon_socket",
+        metavar="PATH", help=Config.allowed_options['daemon_socket'][0])
+    parser.add_argument("--no-daemon", action='store_true', dest="no_daemon",
+        default=False, help="Do not forward the command to running gpypi serve.")
 
     logging_group = parser.add_mutually_exclusive_group()
     logging_group.add_argument("-q", "--quiet", action='store_true',
@@ -360,9 +607,20 @@ def main(args=sys.argv[1:]):
     ## subcommands
     subparsers = main_parser.add_subparsers(title="commands", dest="command")
 
+    # create can take packages from requirements file instead
+    requirements_parser = argparse.ArgumentParser(add_help=False)
+    requirements_parser.add_argument('up_pn', nargs='?', default=None, metavar="package name")
+    requirements_parser.add_argument('up_pv', nargs='?', default=None, metavar="package version")
+    requirements_parser.add_argument("-r", "--requirement", action='store', dest="requirements",
+        metavar='FILE', help=Config.allowed_options['requirements'][0])
+    requirements_parser.add_argument("--lock", action='store', dest="lock_file",
+        metavar='FILE', help=Config.allowed_options['lock_file'][0])
+    requirements_parser.add_argument("--from-lock", action='store', dest="from_lock",
+        metavar='FILE', help=Config.allowed_options['from_lock'][0])
+
     parser_create = subparsers.add_parser('create', help="Write ebuild and it's dependencies to an overlay",
         description="Write ebuild and it's dependencies to an overlay",
-        parents=[parser, ebuild_parser, create_install_parser])
+        parents=[parser, requirements_parser, create_install_parser])
 
     parser_echo = subparsers.add_parser('echo', help="Echo ebuild to stdout",
         description="Echo ebuild to stdout",
@@ -379,15 +637,80 @@ def main(args=sys.argv[1:]):
     parser_pypi = subparsers.add_parser('sync', help="Populate all packages from pypi into an overlay",
         description="Populate all packages from pypi into an overlay",
         parents=[parser, create_install_parser])
+    parser_pypi.add_argument("--newest", action='store', type=int, dest="newest",
+        metavar='N', help=Config.allowed_options['newest'][0])
+    parser_pypi.add_argument("-j", "--jobs", action='store', dest="sync_jobs",
+        metavar='STAGE=N,...', help=Config.allowed_options['sync_jobs'][0])
+    parser_pypi.add_argument("--queue-size", action='store', type=int, dest="sync_queue_size",
+        metavar='N', help=Config.allowed_options['sync_queue_size'][0])
+    parser_pypi.add_argument("--resume", action='store_true', dest="resume",
+        help=Config.allowed_options['resume'][0])
+    parser_pypi.add_argument("--journal", action='store', dest="sync_journal",
+        metavar='FILE', help=Config.allowed_options['sync_journal'][0])
+    parser_pypi.add_argument("--retries", action='store', type=int, dest="sync_retries",
+        metavar='N', help=Config.allowed_options['sync_retries'][0])
+    parser_pypi.add_argument("--metrics-file", action='store', dest="metrics_file",
+        metavar='FILE', help=Config.allowed_options['metrics_file'][0])
+    parser_pypi.add_argument("--metrics-interval", action='store', type=int, dest="metrics_interval",
+        metavar='SECONDS', help=Config.allowed_options['metrics_interval'][0])
+
+    parser_metadata = subparsers.add_parser('metadata', help="Import or export "
+        "PyPI metadata dump of the local metadata store",
+        description="Import or export PyPI metadata dump (JSON lines) of the "
+        "local metadata store used by --offline",
+        parents=[parser])
+    parser_metadata.add_argument('metadata_action', choices=['import', 'export'],
+        metavar='import|export', help=Config.allowed_options['metadata_action'][0])
+    parser_metadata.add_argument('metadata_dump', metavar='FILE',
+        help=Config.allowed_options['metadata_dump'][0])
+
+    parser_rdeps = subparsers.add_parser('rdeps', help="List generated ebuilds "
+        "depending on a package",
+        description="List generated ebuilds depending on a package, "
+        "optionally write them again",
+        parents=[parser])
+    parser_rdeps.add_argument('rdeps_package', metavar='PACKAGE',
+        help=Config.allowed_options['rdeps_package'][0])
+    parser_rdeps.add_argument("-R", "--recursive", action='store_true', dest="recursive",
+        help=Config.allowed_options['recursive'][0])
+    parser_rdeps.add_argument("--regenerate", action='store_true', dest="regenerate",
+        help=Config.allowed_options['regenerate'][0])
+
+    parser_search = subparsers.add_parser('search', help="Search PyPI packages "
+        "in the local metadata store",
+        description="Search PyPI packages in the local metadata store by name, "
+        "summary, keywords and classifiers",
+        parents=[parser])
+    parser_search.add_argument('search_query', nargs='+', action=JoinedArguments,
+        metavar='WORD', help=Config.allowed_options['search_query'][0])
+    parser_search.add_argument("-n", "--limit", action='store', type=int, dest="search_limit",
+        metavar='N', help=Config.allowed_options['search_limit'][0])
+    parser_search.add_argument("--reindex", action='store_true', dest="reindex",
+        help=Config.allowed_options['reindex'][0])
+
+    parser_serve = subparsers.add_parser('serve', help="Keep caches warm and "
+        "run echo/create commands forwarded by other gpypi calls",
+        description="Keep caches warm and run echo/create commands "
+        "forwarded by other gpypi calls",
+        parents=[parser])
+
+    return main_parser
+
+
+def setup_logging(args, stream=None):
+    """Send log records to `stream` (stderr by default)
+    formatted according to command line options.
+
+    :returns: the added handler
+    :rtype: :class:`logging.Handler`
 
-    args = main_parser.parse_args(args)
-
+    """
     # TODO: configurable logging
     if args.nocolors:
-        ch = logging.StreamHandler()
+        ch = logging.StreamHandler(stream)
         ch.setFormatter(logging.Formatter("%(message)s"))
     else:
-        ch = PortageStreamHandler()
+        ch = PortageStreamHandler(stream)
         ch.setFormatter(PortageFormatter("%(message)s"))
     logger = logging.getLogger()
     logger.addHandler(ch)
@@ -398,15 +721,47 @@ def main(args=sys.argv[1:]):
         logger.setLevel(logging.WARN)
     else:
         logger.setLevel(logging.INFO)
+    return ch
+
+
+def main(args=sys.argv[1:]):
+    """Parse command-line options and do it.
+    Core function for gpypi command.
+
+    Dispatches commands to :class:`gpypi.cli.CLI`, commands in
+    :data:`gpypi.daemon.FORWARDED_COMMANDS` are run by ``gpypi serve``
+    if it is running.
+    """
+    argv = list(args)
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if args.command == 'create' and not (args.up_pn or args.requirements or args.from_lock):
+        parser.error("create needs a package name, --requirement FILE or --from-lock FILE")
+    setup_logging(args)
+
+    config_mgr = ConfigManager.load_from_ini(args.config_file)
+    config_mgr.configs['argparse'] = Config.from_argparse(args)
+
+    # daemon can't read our stdin
+    stdin = getattr(args, 'requirements', None) == '-'
+    if not (args.no_daemon or args.debug or args.profile or args.profile_dump or stdin):
+        from gpypi.daemon import FORWARDED_COMMANDS, forward, socket_path
+        if args.command in FORWARDED_COMMANDS:
+            status = forward(socket_path(config_mgr), argv)
+            if status:
+                sys.exit(status)
+            elif status is not None:
+                return
 
     # portage group access must be used for write permission in overlay and for
     # unpacking of ebuilds
+    from portage.data import secpass, portage_gid
     if secpass < 1:
         log.warn('Should be run as root or in group ' + str(portage_gid) +
                 ". Expect more problems to come.\n")
 
-    config_mgr = ConfigManager.load_from_ini(args.config_file)
-    config_mgr.configs['argparse'] = Config.from_argparse(args)
+    if args.profile or args.profile_dump:
+        profiler.enable(args.profile_dump)
 
     # handle command
     try:
@@ -414,9 +769,14 @@ def main(args=sys.argv[1:]):
     except:
         # enter pdb debugger when debugging is enabled
         if args.debug:
+            import pdb
             pdb.post_mortem()
         else:
             raise
+    finally:
+        if profiler.enabled:
+            for line in profiler.finish():
+                log.info(line)
 
 if __name__ == "__main__":
     main()
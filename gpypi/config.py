@@ -12,12 +12,13 @@ Implements :class:`Config` and :class:`ConfigManager` to be used as
 """
 
 import os
+import copy
 import shutil
 import logging
+import threading
+from weakref import WeakSet
 from ConfigParser import SafeConfigParser
 
-from portage.output import colorize
-
 from gpypi.utils import asbool
 from gpypi.exc import *
 
@@ -25,7 +26,72 @@ log = logging.getLogger(__name__)
 HERE = os.path.dirname(os.path.abspath(__file__))
 
 
-class Config(dict):
+class WatchedDict(dict):
+    """Dictionary that notifies watchers when it's mutated.
+    Watchers are held by weak reference and must implement
+    ``invalidate(key)``, which is called after each change with
+    the changed key (None when unknown).
+
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(WatchedDict, self).__init__()
+        self._watchers = WeakSet()
+        self.update(*args, **kwargs)
+
+    def __copy__(self):
+        new = self.__class__.__new__(self.__class__)
+        dict.update(new, self)
+        new.__dict__.update(self.__dict__)
+        new._watchers = WeakSet()
+        return new
+
+    def watch(self, watcher):
+        """Notify `watcher` about changes"""
+        self._watchers.add(watcher)
+
+    def unwatch(self, watcher):
+        """Stop notifying `watcher` about changes"""
+        self._watchers.discard(watcher)
+
+    def changed(self, key=None):
+        """Invalidate all watchers"""
+        for watcher in list(getattr(self, '_watchers', ())):
+            watcher.invalidate(key)
+
+    def __setitem__(self, key, value):
+        super(WatchedDict, self).__setitem__(key, value)
+        self.changed(key)
+
+    def __delitem__(self, key):
+        super(WatchedDict, self).__delitem__(key)
+        self.changed(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).iteritems():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        value = super(WatchedDict, self).pop(key, *default)
+        self.changed(key)
+        return value
+
+    def popitem(self):
+        item = super(WatchedDict, self).popitem()
+        self.changed(item[0])
+        return item
+
+    def clear(self):
+        super(WatchedDict, self).clear()
+        self.changed()
+
+
+class Config(WatchedDict):
     """Holds config values retrieved from various sources. To load
     configuration from a source use one of :meth:`from_*` methods.
     Class also defines specification for supported options in :attr:`allowed_options`.
@@ -47,6 +113,9 @@ class Config(dict):
         # 'config_name': ("doc", "type", "default_value"),
         'up_pn': ('Upstream package name', str, ""),
         'up_pv': ('Upstream package version', str, ""),
+        'requirements': ('Create packages listed in this requirements file, - reads stdin', str, ""),
+        'lock_file': ('Write resolved packages to this lockfile', str, ""),
+        'from_lock': ('Write ebuilds recorded in this lockfile, without querying PyPI', str, ""),
         'pn': ('Specify PN to use when naming ebuild', str, ""),
         'pv': ('Specify PV to use when naming ebuild', str, ""),
         # TODO: move my_* stuff into config, make [] as default and make sure it handles lists from ini
@@ -55,10 +124,30 @@ class Config(dict):
         'my_p': ('Specify MY_P used in ebuild', str, ""),
         'uri': ('Specify SRC_URI of the package', str, ""),
         'index_url': ('Base URL for PyPi', str, "http://pypi.python.org/pypi"),
+        'offline': ('Read PyPI metadata only from the local metadata store (see gpypi metadata import)', bool, False),
+        'metadata_action': ('Import dump to the metadata store or export the store', str, ""),
+        'metadata_dump': ('Metadata dump file (JSON lines), - is stdin/stdout', str, ""),
+        'rdeps_package': ('Package to list reverse dependencies of, category/pn or pn', str, ""),
+        'recursive': ('Also list ebuilds depending on reverse dependencies, and so on', bool, False),
+        'regenerate': ('Write listed ebuilds again (overwriting them, without dependencies)', bool, False),
+        'search_query': ('Words to search for in names, summaries, keywords and classifiers', str, ""),
+        'search_limit': ('Maximum number of search results', int, 20),
+        'reindex': ('Rebuild the whole search index', bool, False),
+        'mirror_dir': ('Read packages from this local PyPI mirror (PEP 503 simple index, e.g. bandersnatch) instead of PyPI', str, ""),
         'overlay': ('Specify overlay to use by name (stored in $OVERLAY/profiles/repo_name)', str, "local"),
         'overwrite': ('Overwrite existing ebuild', bool, False),
         'no_deps': ("Don't create ebuilds for any needed dependencies", bool, False),
         'category': ("Specify portage category to use when creating ebuild", str, ""),
+        'newest': ("Sync only N newest versions of each package (0 syncs all)", int, 0),
+        'sync_jobs': ("Workers of sync stages, e.g. metadata=8,download=4", str, ""),
+        'sync_queue_size': ("Maximum number of items waiting for each sync stage", int, 100),
+        'sync_retries': ("How many times sync --resume retries failed versions", int, 2),
+        'resume': ("Resume interrupted sync, skipping versions done according to journal", bool, False),
+        'sync_journal': ("Sync journal file, sync.journal in cache_dir by default", str, ""),
+        'cache_dir': ("Directory for sync journal and other caches", str, "/var/cache/gpypi"),
+        'metrics_file': ("Periodically write sync metrics to this file, Prometheus format if it ends with .prom, JSON otherwise", str, ""),
+        'metrics_interval': ("Seconds between writes of metrics file", int, 30),
+        'daemon_socket': ("Unix socket of gpypi serve, defaults to gpypi.sock in cache_dir", str, ""),
         'format': ("Format when printing to stdout (use pygments identifier)", str, "none"),
         'command': ("Name of command that was invoked on CLI", str, ""),
         'nocolors': ("Disable colorful output", bool, False),
@@ -170,6 +259,18 @@ class Config(dict):
         except ValueError:
             raise GPyPiValidationError("Not a boolean (write y/n): %r" % value)
 
+    @classmethod
+    def validate_int(cls, value):
+        """Subvalidator for integers
+
+        :raises: :exc:`GPyPiValidationError` if not an integer
+
+        """
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise GPyPiValidationError("Not an integer: %r" % value)
+
     @classmethod
     def validate_str(cls, value, encoding='utf-8'):
         """Subvalidator for string. Also converts to unicode
@@ -185,6 +286,70 @@ class Config(dict):
             raise GPyPiValidationError("Not a string: %r" % value)
 
 
+class ConfigLayers(WatchedDict):
+    """Configs used by :class:`ConfigManager`, by name.
+    Watchers are notified when a config is replaced or mutated,
+    plain dictionaries are converted to :class:`Config`.
+
+    Configs of a :meth:`snapshot` are borrowed from the original and
+    copied when first retrieved by name, which is how configs are
+    modified (``configs['argparse']['uri'] = ...``).
+
+    """
+    _borrowed = frozenset()
+
+    def snapshot(self, shared=()):
+        """Return copy-on-write copy of configs.
+
+        :param shared: Names of configs which are never copied
+        :type shared: list of strings
+        :rtype: :class:`ConfigLayers`
+
+        """
+        layers = self.__class__(self)
+        layers._borrowed = set(self) - set(shared)
+        return layers
+
+    def __getitem__(self, name):
+        config = super(ConfigLayers, self).__getitem__(name)
+        if name in self._borrowed:
+            config = copy.copy(config)
+            self[name] = config
+        return config
+
+    def watch(self, watcher):
+        super(ConfigLayers, self).watch(watcher)
+        for config in self.itervalues():
+            config.watch(watcher)
+
+    def unwatch(self, watcher):
+        super(ConfigLayers, self).unwatch(watcher)
+        for config in self.itervalues():
+            config.unwatch(watcher)
+
+    def __setitem__(self, name, config):
+        if not isinstance(config, WatchedDict):
+            config = Config(config)
+        watchers = list(getattr(self, '_watchers', ()))
+        if name in self:
+            for watcher in watchers:
+                dict.__getitem__(self, name).unwatch(watcher)
+        for watcher in watchers:
+            config.watch(watcher)
+        if name in self._borrowed:
+            self._borrowed.discard(name)
+        super(ConfigLayers, self).__setitem__(name, config)
+
+    def __delitem__(self, name):
+        if name in self._borrowed:
+            self._borrowed.discard(name)
+        super(ConfigLayers, self).__delitem__(name)
+
+    def changed(self, key=None):
+        # any change of layers affects all options
+        super(ConfigLayers, self).changed(None)
+
+
 class ConfigManager(object):
     """Holds multiple :class:`Config` instances and retrieves
     values from them.
@@ -203,8 +368,15 @@ class ConfigManager(object):
         * when option is retrieved that does not exist in :attr:`Config.allowed_options`
         * `use` does not have unique elements
 
+    Values are resolved through all configs once and kept in a flattened
+    view, so reading an option is a dictionary lookup. The view is
+    rebuilt after any config in :attr:`configs` is replaced or mutated.
+
     :attr:`INI_TEMPLATE_PATH` -- Absolute path to .ini template file
 
+    :attr:`SHARED_CONFIGS` -- Configs shared by all snapshots, so
+    questions are asked once per run
+
     Example::
 
         >>> mgr = ConfigManager(['pypi', 'setup_py'])
@@ -215,12 +387,16 @@ class ConfigManager(object):
 
     """
     INI_TEMPLATE_PATH = os.path.join(HERE, 'templates', 'gpypi.ini')
+    SHARED_CONFIGS = ['questionnaire']
 
     def __init__(self, use, questionnaire_options=None, questionnaire_class=None):
         for config in use:
             if use.count(config) != 1:
                 raise GPyPiConfigurationError("ConfigManager could not be setup"
                     ", config order has non-unique member: %s" % config)
+        self._view = None
+        self._generation = 0
+        self._lock = threading.Lock()
         self.use = ['questionnaire'] + use
         self.questionnaire_options = questionnaire_options or []
         self.q = (questionnaire_class or Questionnaire)(self)
@@ -230,22 +406,124 @@ class ConfigManager(object):
         return "<ConfigManager configs(%s) use(%s)>" % (self.configs.keys(), self.use)
 
     def __getattr__(self, name):
-        if len(self.configs) == 1:
-            raise GPyPiConfigurationError("At least one config file must be used.")
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        view = self._view
+        if view is None:
+            if len(self.configs) == 1:
+                raise GPyPiConfigurationError("At least one config file must be used.")
+            view = self.resolve()
+
+        try:
+            return view[name]
+        except KeyError:
+            if name not in Config.allowed_options:
+                raise GPyPiConfigurationError("No such option in Config.allowed_options: %s" % name)
+            return self.default_or_question(name)
+
+    @property
+    def use(self):
+        """Names of configs, in order of precedence"""
+        return self._use
+
+    @use.setter
+    def use(self, use):
+        self._use = use
+        self.invalidate()
+
+    @property
+    def configs(self):
+        """:class:`ConfigLayers` by name, as referenced in :attr:`use`"""
+        return self._configs
+
+    @configs.setter
+    def configs(self, configs):
+        if getattr(self, '_configs', None) is not None:
+            self._configs.unwatch(self)
+        if not isinstance(configs, ConfigLayers):
+            configs = ConfigLayers(configs)
+        self._configs = configs
+        self._configs.watch(self)
+        self.invalidate()
+
+    def snapshot(self, **values):
+        """Return manager for one job (ebuild), so jobs don't see
+        each other's values.
+
+        Snapshot shares configs with this manager until they are
+        modified (see :meth:`ConfigLayers.snapshot`), except for
+        configs in :attr:`SHARED_CONFIGS` which remain shared.
+
+        :param values: Options set for the job, stored in ``job`` config
+            which takes precedence over all configs but ``questionnaire``
+        :returns: :class:`ConfigManager` instance
+
+        Example::
+
+            >>> mgr = ConfigManager(['argparse'])
+            >>> mgr.configs['argparse'] = Config(up_pn='foo')
+            >>> job = mgr.snapshot(up_pn='bar')
+            >>> print mgr.up_pn, job.up_pn
+            foo bar
 
-        if name not in Config.allowed_options:
-            raise GPyPiConfigurationError("No such option in Config.allowed_options: %s" % name)
+        """
+        snap = self.__class__.__new__(self.__class__)
+        snap.__dict__.update(self.__dict__)
+        snap._view = None
+        snap._generation = 0
+        snap._lock = threading.Lock()
+        snap._configs = None
+        snap._use = list(self.use)
+        if 'job' not in snap.use:
+            position = snap.use.index('questionnaire') + 1 if 'questionnaire' in snap.use else 0
+            snap.use.insert(position, 'job')
+        snap.q = self.q.__class__(snap)
+        snap.configs = self.configs.snapshot(self.SHARED_CONFIGS)
+        snap.configs.setdefault('job', Config()).update(values)
+        return snap
+
+    def invalidate(self, name=None):
+        """Drop resolved view, called when :attr:`configs` change.
+        A view being resolved meanwhile by another thread is not kept.
+
+        :param name: Changed key, view is kept if it's not an option
+        :type name: string
 
-        for config_name in self.use:
-            value = self.configs.get(config_name, {}).get(name, None)
-            log.debug("Got %r from %s", value, config_name)
+        """
+        if name is None or name in Config.allowed_options:
+            with self._lock:
+                self._generation += 1
+                self._view = None
 
-            if value is not None:
-                return value
-            else:
-                continue
+    def resolve(self):
+        """Flatten :attr:`configs` in order of :attr:`use` into
+        a view of validated values.
 
-        return self.default_or_question(name)
+        :returns: option name -> value, without options that
+            are not set in any config
+        :rtype: dict
+
+        """
+        with self._lock:
+            generation = self._generation
+        view = {}
+        for config_name in reversed(self.use):
+            for name, value in self.configs.get(config_name, {}).iteritems():
+                if value is not None and name in Config.allowed_options:
+                    view[name] = value
+
+        for name, value in view.items():
+            try:
+                view[name] = Config.validate(name, value)
+            except (GPyPiValidationError, UnicodeError), e:
+                log.debug("Using invalid value of %s: %s", name, e)
+
+        log.debug("Resolved configuration: %r", view)
+        with self._lock:
+            if generation == self._generation:
+                self._view = view
+        return view
 
     def default_or_question(self, name):
         """When no value is retrieved from :attr:`ConfigManager.configs`,
@@ -326,6 +604,7 @@ class Questionnaire(object):
         if self.options.nocolors:
             msg = "%s [%r]: "
         else:
+            from portage.output import colorize
             msg = colorize("GOOD", " * ") + "%s" + colorize("BRACKET", " [")\
                 + "%r" + colorize("BRACKET", ']') + ": "
 
@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+gpypi serve
+===========
+
+``gpypi serve`` keeps one process with warm caches (imported modules,
+portage configuration, compiled ebuild template, PyPI package list,
+naming caches) and runs ``echo``/``create`` commands for other
+``gpypi`` invocations. These forward their command line over a Unix
+socket with :func:`forward` and print what the daemon sends back, so
+the daemon is transparent to the caller. When no daemon is running,
+the command runs locally as before.
+
+The daemon only serves clients running as its own user, whose
+:data:`ENVIRONMENT` matches its own (portage configuration is loaded
+once), other clients run the command locally. Output of commands
+the daemon starts (ebuild, repoman, echangelog) is sent back after
+output of gpypi itself.
+
+Protocol: client sends one JSON line ``{"argv": [...], "cwd": "...",
+"env": {...}}``, server answers with one JSON line ``{"status": 0,
+"output": "..."}``, status is null if the request was refused.
+Requests are processed one at a time.
+
+"""
+
+import os
+import sys
+import json
+import struct
+import socket
+import logging
+import tempfile
+import traceback
+import SocketServer
+from StringIO import StringIO
+
+from gpypi.exc import *
+
+log = logging.getLogger(__name__)
+
+#: commands run by the daemon when it is running
+FORWARDED_COMMANDS = ['echo', 'create']
+SOCKET_NAME = 'gpypi.sock'
+#: environment variables of the client that must match the daemon's
+ENVIRONMENT = ['ROOT', 'PORTAGE_CONFIGROOT', 'PORTDIR', 'PORTDIR_OVERLAY', 'DISTDIR',
+    'ECHANGELOG_USER', 'http_proxy', 'https_proxy', 'ftp_proxy', 'no_proxy', 'PATH']
+# from <asm-generic/socket.h>, not exported by Python 2
+SO_PEERCRED = getattr(socket, 'SO_PEERCRED', 17)
+
+
+def environment(environ=None):
+    """Return :data:`ENVIRONMENT` variables set in `environ`,
+    :data:`os.environ` by default"""
+    environ = os.environ if environ is None else environ
+    return dict((name, environ[name]) for name in ENVIRONMENT if name in environ)
+
+
+def peer_uid(sock):
+    """Return uid of the process connected to Unix socket `sock`
+
+    :raises: :exc:`socket.error` if the platform can't tell
+
+    """
+    pid, uid, gid = struct.unpack('3i', sock.getsockopt(socket.SOL_SOCKET,
+        SO_PEERCRED, struct.calcsize('3i')))
+    return uid
+
+
+def socket_path(config):
+    """Return socket path from ``daemon_socket`` option or
+    ``gpypi.sock`` in ``cache_dir``
+
+    :param config: Configuration
+    :type config: :class:`gpypi.config.ConfigManager`
+
+    """
+    return config.daemon_socket or os.path.join(config.cache_dir, SOCKET_NAME)
+
+
+def forward(path, argv, stream=None):
+    """Run command line `argv` in ``gpypi serve`` listening on `path`.
+
+    :param path: Unix socket of the daemon
+    :type path: string
+    :param argv: Command line arguments, without program name
+    :type argv: list of strings
+    :param stream: Where to write output of the command, stdout by default
+    :type stream: file
+    :returns: exit status, None if no daemon listens on `path`
+        or it refused the request
+    :rtype: int or None
+    :raises: :exc:`gpypi.exc.GPyPiDaemonError` if daemon
+        closes connection without answering
+
+    """
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+        except socket.error, e:
+            log.debug("No gpypi serve on %s: %s", path, e)
+            return None
+        f = sock.makefile('rwb')
+        f.write(json.dumps({'argv': argv, 'cwd': os.getcwd(), 'env': environment()}) + "\n")
+        f.flush()
+        line = f.readline()
+    finally:
+        sock.close()
+
+    try:
+        response = json.loads(line)
+    except ValueError:
+        raise GPyPiDaemonError("gpypi serve on %s did not answer" % path)
+    if response['status'] is None:
+        log.debug("gpypi serve on %s refused: %s", path, response['output'])
+        return None
+    (stream or sys.stdout).write(response['output'].encode('utf-8'))
+    return response['status']
+
+
+def is_listening(path):
+    """Return True if something accepts connections on `path`"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except socket.error:
+        return False
+    finally:
+        sock.close()
+
+
+class RequestHandler(SocketServer.StreamRequestHandler):
+    """Reads a request line and writes response of :meth:`Server.execute`"""
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # connection check of is_listening
+            return
+        try:
+            request = json.loads(line)
+        except ValueError:
+            log.warn("Invalid request: %r", line)
+            return
+        try:
+            uid = peer_uid(self.request)
+        except socket.error, e:
+            uid = None
+            log.debug("Could not get peer credentials: %s", e)
+        if uid != os.getuid():
+            log.warn("Refusing request of uid %s", uid)
+            response = {'status': None, 'output': u"gpypi serve runs as another user"}
+        else:
+            response = self.server.execute(request)
+        self.wfile.write(json.dumps(response) + "\n")
+
+
+class Server(SocketServer.UnixStreamServer):
+    """Unix socket server running forwarded commands.
+
+    :param path: Socket path, a stale socket is replaced
+    :type path: string
+    :raises: :exc:`gpypi.exc.GPyPiDaemonError` if another
+        daemon listens on `path`
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            if is_listening(path):
+                raise GPyPiDaemonError("gpypi serve is already running on %s" % path)
+            os.unlink(path)
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        SocketServer.UnixStreamServer.__init__(self, path, RequestHandler)
+        # commands run as the daemon's user, so only that user may connect
+        os.chmod(path, 0600)
+
+    def __repr__(self):
+        return "<Server %s>" % self.path
+
+    def warm_up(self):
+        """Load what every command needs, so the first request is fast too"""
+        from gpypi.cli import GPyPI
+        from gpypi.ebuild import Ebuild
+        from gpypi.portage_utils import PortageUtils
+
+        PortageUtils.get_portdir()
+        PortageUtils.get_keyword()
+        Ebuild.get_template()
+        GPyPI.get_pypi()
+
+    def execute(self, request):
+        """Run command line of `request` with output captured,
+        including output of subprocesses.
+
+        :param request: ``argv``, ``cwd`` and ``env`` of the client
+        :type request: dict
+        :returns: ``status`` and ``output``, status is None
+            if environment of the client differs
+        :rtype: dict
+
+        """
+        from gpypi.cli import CLI, make_parser, setup_logging
+        from gpypi.config import Config, ConfigManager
+
+        if request.get('env', {}) != environment():
+            differ = sorted(set(environment().items()) ^ set(request.get('env', {}).items()))
+            log.info("Refusing request with different environment: %s",
+                ", ".join(sorted(set(name for name, value in differ))))
+            return {'status': None, 'output': u"environment differs from gpypi serve"}
+
+        output = StringIO()
+        captured = tempfile.TemporaryFile()
+        root = logging.getLogger()
+        saved = root.handlers[:], root.level, sys.stdout, sys.stderr, os.getcwd()
+        for stream in (sys.__stdout__, sys.__stderr__):
+            stream.flush()
+        saved_fds = [os.dup(1), os.dup(2)]
+        status = 0
+        try:
+            os.dup2(captured.fileno(), 1)
+            os.dup2(captured.fileno(), 2)
+            os.chdir(request.get('cwd') or '/')
+            sys.stdout = sys.stderr = output
+            root.handlers = []
+            argv = [arg.encode('utf-8') for arg in request['argv']]
+            args = make_parser().parse_args(argv)
+            if args.command not in FORWARDED_COMMANDS:
+                raise GPyPiDaemonError("gpypi serve does not run %s" % args.command)
+            setup_logging(args, output)
+
+            config_mgr = ConfigManager.load_from_ini(args.config_file)
+            config_mgr.configs['argparse'] = Config.from_argparse(args)
+            # nobody can answer questions
+            config_mgr.questionnaire_options = []
+            CLI(config_mgr)
+        except SystemExit, e:
+            status = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc(file=output)
+            status = 1
+        finally:
+            root.handlers, level, sys.stdout, sys.stderr, cwd = saved
+            root.setLevel(level)
+            os.chdir(cwd)
+            for fd, saved_fd in enumerate(saved_fds, 1):
+                os.dup2(saved_fd, fd)
+                os.close(saved_fd)
+        log.info("%s: %s (status %d)", request.get('cwd'), " ".join(request['argv']), status)
+        captured.seek(0)
+        value = output.getvalue()
+        if isinstance(value, str):
+            value = value.decode('utf-8', 'replace')
+        value += captured.read().decode('utf-8', 'replace')
+        captured.close()
+        return {'status': status, 'output': value}
+
+    def close(self):
+        """Stop listening and remove the socket"""
+        self.server_close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
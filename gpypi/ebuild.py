@@ -22,35 +22,32 @@ import os
 import logging
 import tempfile
 import shutil
-import string
 
 from pprint import pformat
 from datetime import date
 import distutils.core
 
 from jinja2 import Environment, PackageLoader
-from pygments import highlight
-from pygments.lexers import BashLexer
-from pygments.formatters import get_formatter_by_name
 from pkg_resources import parse_requirements
-import setuptools
 
 from gpypi import __version__
-from gpypi import utils
 from gpypi.portage_utils import PortageUtils
 from gpypi.enamer import Enamer
-from gpypi.workflow import Repoman, Echangelog, Metadata
 from gpypi.exc import *
-from gpypi.trove_map import topic_dict
+from gpypi.classifiers import ClassifierIndex
+from gpypi.config import WatchedDict
+from gpypi.profiling import span, traced
 
 log = logging.getLogger(__name__)
 
 
 # TODO: dependency can be a string or list of strings
-class Ebuild(dict):
+class Ebuild(WatchedDict):
     """Contains, populates and renders an ebuild.
 
-    :param options: Configuration for ebuild
+    :param options: Configuration for ebuild, registers itself as
+        its ``setup_py`` config, so use a
+        :meth:`gpypi.config.ConfigManager.snapshot` per ebuild
     :type options: :class:`gpypi.config.ConfigManager` instance
 
     :attr:`DOC_DIRS` -- Possible locations for documentation
@@ -61,27 +58,35 @@ class Ebuild(dict):
 
     :attr:`requires` -- set of packages that this ebuild depends on
 
+    :attr:`classifier_info` -- classifiers resolved by
+    :meth:`gpypi.classifiers.ClassifierIndex.resolve`
+
+    :attr:`probe` -- what was found in unpacked sources, with
+    :attr:`setup_keywords` enough to redo :meth:`post_unpack`
+    with :meth:`replay`
+
     """
     # TODO: __init__ attrs
     DOC_DIRS = ['doc', 'docs', 'documentation']
     EXAMPLES_DIRS = ['example', 'examples', 'demo', 'demos']
     EBUILD_TEMPLATE = 'ebuild.jinja'
     EBUILD_TEMPLATE_PACKAGE = 'gpypi'
+    _templates = {}
 
     def __init__(self, options):
         self.setup_keywords = {}
+        self.probe = {}
         self.metadata = {}
         self.unpacked_dir = None
         self.ebuild_path = None
         self.requires = set()
         self.has_tests = None
+        self.created = False
+        self.classifier_info = {}
         self.options = options
 
         # init stuff
-        self.env = Environment(
-            loader=PackageLoader(self.EBUILD_TEMPLATE_PACKAGE, 'templates'),
-            trim_blocks=True)
-        self.template = self.env.get_template(self.EBUILD_TEMPLATE)
+        self.template = self.get_template()
 
         # Variables that will be passed to the Jinja template
         d = {
@@ -106,6 +111,18 @@ class Ebuild(dict):
     def __repr__(self):
         return '<Ebuild (%s)>' % pformat(dict.__repr__(self))
 
+    @classmethod
+    def get_template(cls):
+        """Return compiled :attr:`EBUILD_TEMPLATE`, shared by all ebuilds"""
+        key = (cls.EBUILD_TEMPLATE_PACKAGE, cls.EBUILD_TEMPLATE)
+        if key not in Ebuild._templates:
+            env = Environment(
+                loader=PackageLoader(cls.EBUILD_TEMPLATE_PACKAGE, 'templates'),
+                trim_blocks=True)
+            Ebuild._templates[key] = env.get_template(cls.EBUILD_TEMPLATE)
+        return Ebuild._templates[key]
+
+    @traced('ebuild.metadata')
     def set_metadata(self, metadata):
         """Set metadata from :term:`PyPi`.
 
@@ -114,6 +131,7 @@ class Ebuild(dict):
 
         """
         d = {}
+        self.metadata = metadata or {}
         if metadata and 'pypi' in self.options.use:
             for key, value in metadata.iteritems():
                 new_key = key.lower().replace('-', '').replace('_', '')
@@ -123,22 +141,14 @@ class Ebuild(dict):
         else:
             log.error("No metadata or pypi configuration is disabled.")
 
+        # resolve all classifiers in one pass
+        self.classifier_info = ClassifierIndex.default().resolve(self.get('classifiers', []))
+
         if self.options.category == "":
-            # Unless given on the command line,
+            # Unless given on the command line, set the category to the
+            # one paired with the most detailed topic classifier,
             # default category is 'dev-python'
-            self.options.category = 'dev-python'
-
-            topics = [i for i in self.get('classifiers', []) if i[:5] == 'Topic']
-            # Other wise set the category to the one paired with the
-            # most detailed classifier.
-            topic_classifiers = [tuple(i.split(' :: ')) for i in topics]
-            if len(topic_classifiers) > 0:
-                length = 0
-                for i in topic_classifiers:
-                    if len(i) > length:
-                        length = len(i)
-                        tc = i
-                self.options.category = topic_dict[string.join(tc, ' :: ')]
+            self.options.category = self.classifier_info['category'] or 'dev-python'
 
     def set_ebuild_vars(self):
         """Calls :meth:`gpypi.enamer.Enamer.get_vars` and
@@ -172,9 +182,10 @@ class Ebuild(dict):
 
         self.options.configs['setup_py'].update(self)
 
+    @traced('ebuild.setup_py')
     def post_unpack(self):
-        """Perform finalization tasks. Dynamically imports *setup.py*
-        file and extracts it's kwargs.
+        """Perform finalization tasks. Runs *setup.py* file in
+        a child process (:mod:`gpypi.setup_probe`) and extracts it's kwargs.
 
             * determine if :term:`PYTHON_MODNAME` is not
               :term:`PN` -- We inspect `packages`, `py_module` and `package_dir`
@@ -193,38 +204,54 @@ class Ebuild(dict):
 
         :raises: :exc:`gpypi.exc.GPyPiNoSetupFile`
         :raises: :exc:`gpypi.exc.GPyPiNoDistribution`
+        :raises: :exc:`gpypi.exc.GPyPiSetupError`
 
         """
-        # save original functions to undo monkeypaching at the end
-        temp_setup = setuptools.setup
-        temp_distutils = distutils.core.setup
+        from gpypi import setup_probe
 
-        # mock functions to get metadata
         self.setup_keywords = {}
-
-        def wrapper(**kw):
-            self.setup_keywords.update(kw)
-
-        # monkeypatch setups
-        setuptools.setup = wrapper
-        distutils.core.setup = wrapper
-
         setup_file = os.path.join(self.unpacked_dir, "setup.py")
         if os.path.exists(self.unpacked_dir):
             if not os.path.exists(setup_file):
                 raise GPyPiNoSetupFile("%s does not exists." % setup_file)
             else:
-                # run setup file from unpacked_dir
-                cwd = os.getcwdu()
-                try:
-                    os.chdir(self.unpacked_dir)
-                    utils.import_path(setup_file)
-                finally:
-                    os.chdir(cwd)
+                with span('import'):
+                    self.setup_keywords = setup_probe.run(setup_file)
         else:
             raise GPyPiNoDistribution("Unpacked dir could not be found: %s"\
                 % self.unpacked_dir)
 
+        # check dependency on setuptools
+        with open(setup_file) as f:
+            contents = f.read()
+        self.probe['setuptools'] = ('setuptools' in contents) or ('pkg_resources' in contents)
+
+        self.set_setup_keywords()
+        self.discover_docs_and_examples()
+        self.discover_tests()
+
+    def replay(self, setup_keywords, probe):
+        """Redo :meth:`update_with_s` and :meth:`post_unpack` from
+        recorded :attr:`setup_keywords` and :attr:`probe`, without
+        unpacked sources.
+
+        :param setup_keywords: Arguments of ``setup()``
+        :type setup_keywords: dict
+        :param probe: Findings in unpacked sources
+        :type probe: dict
+
+        """
+        self.setup_keywords = setup_keywords
+        self.probe = probe
+        if 's' in probe:
+            self['s'] = probe['s']
+        self.set_setup_keywords()
+        self.set_docs_and_examples()
+        self.set_tests()
+
+    def set_setup_keywords(self):
+        """Set dependencies, :term:`PYTHON_MODNAME` and metadata
+        from :attr:`setup_keywords`"""
         # extract dependencies
         self.install_requires = self.setup_keywords.get('install_requires', '')
         self.setup_requires = self.setup_keywords.get('setup_requires', '')
@@ -238,15 +265,9 @@ class Ebuild(dict):
         for use_flag, dependency in self.extras_require.iteritems():
             self.get_dependencies(dependency, if_use=use_flag)
 
-        self.discover_docs_and_examples()
-        self.discover_tests()
-
-        # check dependency on setuptools
-        with open(setup_file) as f:
-            contents = f.read()
-            if ('setuptools' in contents) or ('pkg_resources' in contents):
-                self.add_depend('dev-python/setuptools')
-                self.add_rdepend('dev-python/setuptools')
+        if self.probe.get('setuptools'):
+            self.add_depend('dev-python/setuptools')
+            self.add_rdepend('dev-python/setuptools')
 
         # handle PYTHON_MODNAME
         module_names = []
@@ -258,10 +279,6 @@ class Ebuild(dict):
         if len(module_names) == 1 and module_names[0] != self['pn']:
             self['python_modname'] = module_names
 
-        # undo monkeypatching
-        setuptools.setup = temp_setup
-        distutils.core.setup = temp_distutils
-
         # extract metadata
         if 'setup_py' in self.options.use:
             d = distutils.core.Distribution(self.setup_keywords)
@@ -382,16 +399,26 @@ class Ebuild(dict):
 
         for ddir in self.DOC_DIRS:
             if os.path.exists(os.path.join(self.unpacked_dir, ddir)):
-                self['docs_dir'] = ddir
-                self.add_use("doc")
+                self.probe['docs_dir'] = ddir
                 break
 
         for edir in self.EXAMPLES_DIRS:
             if os.path.exists(os.path.join(self.unpacked_dir, edir)):
-                self['examples_dir'] = edir
-                self.add_use("examples")
+                self.probe['examples_dir'] = edir
                 break
 
+        self.set_docs_and_examples()
+
+    def set_docs_and_examples(self):
+        """Use directories found by :meth:`discover_docs_and_examples`"""
+        if self.probe.get('docs_dir'):
+            self['docs_dir'] = self.probe['docs_dir']
+            self.add_use("doc")
+
+        if self.probe.get('examples_dir'):
+            self['examples_dir'] = self.probe['examples_dir']
+            self.add_use("examples")
+
     def discover_tests(self):
         """Determine :term:`DISTUTILS_SRC_TEST` if tests are detected"""
         # TODO: py.test and trial
@@ -399,7 +426,15 @@ class Ebuild(dict):
 
         for root, dirs, files in os.walk(self.unpacked_dir):
             if 'tests' in dirs or 'test' in dirs:
-                self['tests_method'] = 'setup.py'
+                self.probe['tests_dir'] = True
+                break
+
+        self.set_tests()
+
+    def set_tests(self):
+        """Set test method and dependencies, see :meth:`discover_tests`"""
+        if self.probe.get('tests_dir'):
+            self['tests_method'] = 'setup.py'
 
         if self.setup_keywords.get('test_suite', '') == 'nose.collector':
             self['tests_method'] = 'nosetests'
@@ -421,7 +456,22 @@ class Ebuild(dict):
             self["s"] = "${WORKDIR}/${MY_P}"
         else:
             pass  # ${WORKDIR}/${P}
+        self.probe['s'] = self['s']
+
+    def release(self):
+        """Drop per-package data and the reference cycle with
+        :attr:`options` once the ebuild is written, so runs over
+        many packages don't keep it until garbage collection"""
+        if dict.get(self.options.configs, 'setup_py') is self:
+            del self.options.configs['setup_py']
+        self.clear()
+        self.metadata = {}
+        self.setup_keywords = {}
+        self.classifier_info = {}
+        self.requires = set()
+        self.output = None
 
+    @traced('ebuild.render')
     def render(self):
         """Generate ebuild from template"""
         self.output = self.template.render(self, options=self.options)
@@ -446,6 +496,10 @@ class Ebuild(dict):
             print self.output
         else:
             # use pygments to print ebuild
+            from pygments import highlight
+            from pygments.lexers import BashLexer
+            from pygments.formatters import get_formatter_by_name
+
             formatter = get_formatter_by_name(formatting, background=background)
             print highlight(self.output, BashLexer(), formatter)
 
@@ -458,19 +512,16 @@ class Ebuild(dict):
         if self.write(overwrite=self.options.overwrite):
             if self.unpacked_dir is None:
                 PortageUtils.unpack_ebuild(self.ebuild_path)
-            self.update_with_s()
-            self.post_unpack()
+            self.analyze()
 
             # Write ebuild again after unpacking and adding ${S}
             self.write(overwrite=True)
 
             if self.options.command != 'echo':
-                # apply workflows
-                Metadata(self.options, os.path.dirname(self.ebuild_path))()
-                Echangelog(self.options, os.path.dirname(self.ebuild_path))()
-                Repoman(self.options, os.path.dirname(self.ebuild_path))()
-
+                self.record_dependencies()
+                self.run_workflows()
                 log.info("Your ebuild is here: " + self.ebuild_path)
+            self.created = True
 
         # TODO: If ebuild already exists, we don't unpack and get dependencies
         # because they must exist.
@@ -478,6 +529,29 @@ class Ebuild(dict):
         # overwrite be used?
         return self.requires
 
+    @traced('ebuild.analyze')
+    def analyze(self):
+        """Examine unpacked sources, see :meth:`update_with_s`
+        and :meth:`post_unpack`"""
+        self.update_with_s()
+        self.post_unpack()
+
+    def record_dependencies(self):
+        """Record dependencies of the written, analyzed ebuild in
+        :class:`gpypi.rdeps.ReverseDependencyIndex`"""
+        from gpypi.rdeps import record_ebuild
+        record_ebuild(self)
+
+    @traced('workflows')
+    def run_workflows(self):
+        """Generate metadata, changelog and manifest for written ebuild"""
+        from gpypi.workflow import Repoman, Echangelog, Metadata
+
+        ebuild_dir = os.path.dirname(self.ebuild_path)
+        Metadata(self.options, ebuild_dir)()
+        Echangelog(self.options, ebuild_dir)()
+        Repoman(self.options, ebuild_dir)()
+
     def find_path_to_ebuild(self, overlay_path):
         """"""
         ebuild_dir = PortageUtils.make_ebuild_dir(self.options.category,
@@ -486,6 +560,7 @@ class Ebuild(dict):
             raise GPyPiCouldNotCreateEbuildPath('Couldn not create ebuild directory %s' % ebuild_dir)
         return os.path.join(ebuild_dir, self['p'] + ".ebuild")
 
+    @traced('ebuild.write')
     def write(self, overwrite=False):
         """Write ebuild file
 
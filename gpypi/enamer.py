@@ -14,13 +14,28 @@ import httplib
 import re
 import os
 
-from portage import pkgsplit
-
 from gpypi.portage_utils import PortageUtils
+from gpypi.atom import pkgsplit
+from gpypi.utils import memoize
+from gpypi.trove_map import license_dict
 from gpypi.exc import *
 
 
 log = logging.getLogger(__name__)
+NAMING_CACHE_SIZE = 10000
+
+
+def _copy_parsed(result):
+    """Copy (name, bash substitutions) tuple so callers may mutate the list"""
+    return result[0], list(result[1])
+
+
+def _copy_vars(d):
+    """Copy :meth:`Enamer.get_vars` result so callers may mutate the lists"""
+    d = dict(d)
+    d['my_pn'] = list(d['my_pn'])
+    d['my_pv'] = list(d['my_pv'])
+    return d
 
 
 class Enamer(object):
@@ -32,10 +47,90 @@ class Enamer(object):
        Most of utilities are classmethods, for purpose
        of customization support.
 
+       Results of the pure naming methods are memoized in bounded
+       caches (see :data:`NAMING_CACHE_SIZE`), since bulk operations
+       call them many times with repeated input.
+       Use :meth:`Enamer.clear_caches` to drop them.
+
     """
     VALID_EXTENSIONS = [".zip", ".tgz", ".tar.gz", ".tar.bz2", ".tbz2"]
 
+    # parse_pv regexes
+    BAD_SUFFIXES = re.compile(
+        r'((?:[._-]*)(?:dev|devel|final|stable|snapshot)$)', re.I)
+    REVISION_SUFFIXES = re.compile(
+        r'(.*?)([\._-]*(?:r|patch|p)[\._-]*)([0-9]*)$', re.I)
+    SUFFIX_MATCHES = {
+            '_pre': [
+                r'(.*?)([\._-]*dev[\._-]*r?)([0-9]+)$',
+                r'(.*?)([\._-]*(?:pre|preview)[\._-]*)([0-9]*)$',
+            ],
+            '_alpha': [
+                r'(.*?)([\._-]*(?:alpha|test)[\._-]*)([0-9]*)$',
+                r'(.*?)([\._-]*a[\._-]*)([0-9]*)$',
+                r'(.*[^a-z])(a)([0-9]*)$',
+            ],
+            '_beta': [
+                r'(.*?)([\._-]*beta[\._-]*)([0-9]*)$',
+                r'(.*?)([\._-]*b)([0-9]*)$',
+                r'(.*[^a-z])(b)([0-9]*)$',
+            ],
+            '_rc': [
+                r'(.*?)([\._-]*rc[\._-]*)([0-9]*)$',
+                r'(.*?)([\._-]*c[\._-]*)([0-9]*)$',
+                r'(.*[^a-z])(c[\._-]*)([0-9]+)$',
+            ],
+    }
+    # compiled once, iterate SUFFIX_MATCHES to keep the order of suffixes
+    SUFFIX_REGEXES = dict((suffix, [re.compile(regex, re.I) for regex in regexes])
+        for suffix, regexes in SUFFIX_MATCHES.iteritems())
+
+    # last part of license classifier -> portage license
+    KNOWN_LICENSES = {
+        "Academic Free License (AFL)": "AFL-3.0",
+        "Aladdin Free Public License (AFPL)": "Aladdin",
+        "Aladdin Free Public License (AFPL)": "Aladdin",
+        "Apache Software License": "Apache-2.0",
+        "Apple Public Source License": "Apple",
+        "Artistic License": "Artistic-2",
+        "BSD License": "BSD-2",
+        "Common Public License": "CPL-1.0",
+        "GNU Affero General Public License v3": "AGPL-3",
+        "GNU Free Documentation License (FDL)": "FDL-3",
+        "GNU General Public License (GPL)": "GPL-2",
+        "GNU Library or Lesser General Public License (LGPL)": "LGPL-2.1",
+        "IBM Public License": "IBM",
+        "Intel Open Source License": "Intel",
+        "ISC License (ISCL)": "ISC",
+        "MIT License": "MIT",
+        "Mozilla Public License 1.0 (MPL)": "MPL",
+        "Mozilla Public License 1.1 (MPL 1.1)": "MPL-1.1",
+        "Nethack General Public License": "nethack",
+        "Netscape Public License (NPL)": "NPL-1.1",
+        "Open Group Test Suite License": "OGTSL",
+        "Public Domain": "public-domain",
+        "Python License (CNRI Python License)": "CNRI",
+        "Python Software Foundation License": "PSF-2.4",
+        "Qt Public License (QPL)": "QPL",
+        "Repoze Public License": "repoze",
+        "Sleepycat License": "DB",
+        "Sun Public License": "SPL",
+        "University of Illinois/NCSA Open Source License": "ncsa-1.3",
+        "W3C License": "WC3",
+        "zlib/libpng License": "ZLIB",
+        "Zope Public License": "ZPL",
+    }
+    # full license classifier -> portage license, from trove_map
+    CLASSIFIER_LICENSES = dict((classifier, license)
+        for classifier, license in license_dict.iteritems() if license)
+    # substrings of setup.py license -> portage license, in order of lookup
+    GUESS_LICENSE = [
+        ('LGPL', 'LGPL-2.1'),
+        ('GPL', 'GPL-2'),
+    ]
+
     @classmethod
+    @memoize(NAMING_CACHE_SIZE)
     def get_filename(cls, uri):
         """
         Return file name minus extension from src_uri
@@ -108,6 +203,7 @@ class Enamer(object):
                 return psplit
 
     @classmethod
+    @memoize(NAMING_CACHE_SIZE)
     def split_uri(cls, uri):
         """Try to split a URI into PN, PV and REV
 
@@ -193,6 +289,7 @@ class Enamer(object):
         return d
 
     @classmethod
+    @memoize(NAMING_CACHE_SIZE, copy=_copy_parsed)
     def parse_pv(cls, up_pv, pv="", my_pv=None):
         """Convert PV to MY_PV if needed
 
@@ -247,37 +344,12 @@ class Enamer(object):
             number of match.groups every time to simplify the code
 
         """
-        bad_suffixes = re.compile(
-            r'((?:[._-]*)(?:dev|devel|final|stable|snapshot)$)', re.I)
-        revision_suffixes = re.compile(
-            r'(.*?)([\._-]*(?:r|patch|p)[\._-]*)([0-9]*)$', re.I)
-        suf_matches = {
-                '_pre': [
-                    r'(.*?)([\._-]*dev[\._-]*r?)([0-9]+)$',
-                    r'(.*?)([\._-]*(?:pre|preview)[\._-]*)([0-9]*)$',
-                ],
-                '_alpha': [
-                    r'(.*?)([\._-]*(?:alpha|test)[\._-]*)([0-9]*)$',
-                    r'(.*?)([\._-]*a[\._-]*)([0-9]*)$',
-                    r'(.*[^a-z])(a)([0-9]*)$',
-                ],
-                '_beta': [
-                    r'(.*?)([\._-]*beta[\._-]*)([0-9]*)$',
-                    r'(.*?)([\._-]*b)([0-9]*)$',
-                    r'(.*[^a-z])(b)([0-9]*)$',
-                ],
-                '_rc': [
-                    r'(.*?)([\._-]*rc[\._-]*)([0-9]*)$',
-                    r'(.*?)([\._-]*c[\._-]*)([0-9]*)$',
-                    r'(.*[^a-z])(c[\._-]*)([0-9]+)$',
-                ],
-        }
         rs_match = None
         my_pv = my_pv or []
         additional_version = ""
         log.debug("parse_pv: up_pv(%s)", up_pv)
 
-        rev_match = revision_suffixes.search(up_pv)
+        rev_match = cls.REVISION_SUFFIXES.search(up_pv)
         if rev_match:
             pv = up_pv = rev_match.group(1)
             replace_me = rev_match.group(2)
@@ -288,14 +360,13 @@ class Enamer(object):
                 up_pv, additional_version, my_pv)
             # TODO: if ALSO suf_matches succeeds, it's not implemented
 
-        for this_suf in suf_matches.keys():
+        for this_suf in cls.SUFFIX_MATCHES.keys():
             if rs_match:
                 break
-            for regex in suf_matches[this_suf]:
-                rsuffix_regex = re.compile(regex, re.I)
+            for rsuffix_regex in cls.SUFFIX_REGEXES[this_suf]:
                 rs_match = rsuffix_regex.match(up_pv)
                 if rs_match:
-                    log.debug("parse_pv: chosen regex: %s", regex)
+                    log.debug("parse_pv: chosen regex: %s", rsuffix_regex.pattern)
                     portage_suffix = this_suf
                     break
 
@@ -309,7 +380,7 @@ class Enamer(object):
             log.debug("parse_pv: major_ver(%s) replace_me(%s), rev(%s)", major_ver, replace_me, rev)
         else:
             # Single suffixes with no numeric component are simply removed.
-            match = bad_suffixes.search(up_pv)
+            match = cls.BAD_SUFFIXES.search(up_pv)
             if match:
                 suffix = match.groups()[0]
                 my_pv.append("${PV}%s" % suffix)
@@ -321,6 +392,7 @@ class Enamer(object):
         return pv, my_pv
 
     @classmethod
+    @memoize(NAMING_CACHE_SIZE, copy=_copy_parsed)
     def parse_pn(cls, up_pn, pn="", my_pn=None):
         """Convert PN to MY_PN if needed
 
@@ -369,6 +441,7 @@ class Enamer(object):
         return pn, my_pn
 
     @classmethod
+    @memoize(NAMING_CACHE_SIZE, copy=_copy_vars)
     def get_vars(cls, uri, up_pn, up_pv, pn="", pv="", my_pn=None, my_pv=None):
         """
         Determine P* and MY_* ebuild variables
@@ -453,7 +526,7 @@ class Enamer(object):
         >>> assert len(d) == 8
 
         """
-        log.debug("get_vars: %r" % locals())
+        log.debug("get_vars: %r", locals())
         my_pn = my_pn or []
         my_pv = my_pv or []
         my_p = ""
@@ -535,6 +608,45 @@ class Enamer(object):
             'src_uri': src_uri,
         }
 
+    @classmethod
+    def get_vars_batch(cls, entries, ignore_errors=False):
+        """
+        Determine P* and MY_* ebuild variables for many packages at once.
+        Repeated input is served from naming caches.
+
+        :param entries: (uri, up_pn, up_pv) tuples
+        :type entries: iterable
+        :param ignore_errors: Put None in place of entries that
+            raise :exc:`GPyPiInvalidAtom` instead of raising
+        :type ignore_errors: bool
+        :raises: :exc:`GPyPiInvalidAtom` if version/name could not be parsed correctly
+        :returns: dicts as returned by :meth:`Enamer.get_vars`, in order of `entries`
+        :rtype: list
+
+        **Example:**
+
+        >>> l = Enamer.get_vars_batch([('http://www.foo.com/foo-1.0.tbz2', 'foo', '1.0')])
+        >>> l[0]['p']
+        'foo-1.0'
+
+        """
+        results = []
+        for uri, up_pn, up_pv in entries:
+            try:
+                results.append(cls.get_vars(uri, up_pn, up_pv))
+            except GPyPiInvalidAtom:
+                if not ignore_errors:
+                    raise
+                results.append(None)
+        return results
+
+    @classmethod
+    def clear_caches(cls):
+        """Drop memoized results of naming methods."""
+        for method in [cls.get_filename, cls.split_uri, cls.parse_pv,
+                cls.parse_pn, cls.get_vars]:
+            method.cache.clear()
+
     @classmethod
     def _get_src_uri(cls, uri, my_pn):
         """
@@ -605,56 +717,19 @@ class Enamer(object):
         if not isinstance(setup_license, basestring):
             raise ValueError("setup_license should be a string, not %s" % type(setup_license))
 
-        my_license = ""
+        classifier = ""
         for line in classifiers:
             if line.startswith("License :: "):
-                my_license = line
-
-        my_license = my_license.split(":: ")[-1]
-        known_licenses = {
-            "Academic Free License (AFL)": "AFL-3.0",
-            "Aladdin Free Public License (AFPL)": "Aladdin",
-            "Aladdin Free Public License (AFPL)": "Aladdin",
-            "Apache Software License": "Apache-2.0",
-            "Apple Public Source License": "Apple",
-            "Artistic License": "Artistic-2",
-            "BSD License": "BSD-2",
-            "Common Public License": "CPL-1.0",
-            "GNU Affero General Public License v3": "AGPL-3",
-            "GNU Free Documentation License (FDL)": "FDL-3",
-            "GNU General Public License (GPL)": "GPL-2",
-            "GNU Library or Lesser General Public License (LGPL)": "LGPL-2.1",
-            "IBM Public License": "IBM",
-            "Intel Open Source License": "Intel",
-            "ISC License (ISCL)": "ISC",
-            "MIT License": "MIT",
-            "Mozilla Public License 1.0 (MPL)": "MPL",
-            "Mozilla Public License 1.1 (MPL 1.1)": "MPL-1.1",
-            "Nethack General Public License": "nethack",
-            "Netscape Public License (NPL)": "NPL-1.1",
-            "Open Group Test Suite License": "OGTSL",
-            "Public Domain": "public-domain",
-            "Python License (CNRI Python License)": "CNRI",
-            "Python Software Foundation License": "PSF-2.4",
-            "Qt Public License (QPL)": "QPL",
-            "Repoze Public License": "repoze",
-            "Sleepycat License": "DB",
-            "Sun Public License": "SPL",
-            "University of Illinois/NCSA Open Source License": "ncsa-1.3",
-            "W3C License": "WC3",
-            "zlib/libpng License": "ZLIB",
-            "Zope Public License": "ZPL",
-        }
-        guess_license = {
-            'LGPL': 'LGPL-2.1',
-            'GPL': 'GPL-2',
-        }
-        license = known_licenses.get(my_license, "")
+                classifier = line
+
+        my_license = classifier.split(":: ")[-1]
+        license = cls.KNOWN_LICENSES.get(my_license, "") or \
+            cls.CLASSIFIER_LICENSES.get(classifier, "")
         if license:
             return license
         else:
             if isinstance(setup_license, str) and not Enamer.is_valid_portage_license(setup_license):
-                for guess, value in guess_license.iteritems():
+                for guess, value in cls.GUESS_LICENSE:
                     if guess in setup_license:
                         return value
                 return ""
@@ -665,6 +740,8 @@ class Enamer(object):
     def is_valid_portage_license(cls, license):
         """
         Check if license string matches a valid one in ${PORTDIR}/licenses
+        or licenses directory of an overlay. Lookups are served from
+        :class:`gpypi.portage_utils.LicenseRegistry`.
 
         :param license: Portage license name
         :type license: string
@@ -679,7 +756,11 @@ class Enamer(object):
         False
 
         """
-        return os.path.exists(os.path.join(PortageUtils.get_portdir(), "licenses", license))
+        registry = PortageUtils.get_license_registry()
+        if not license:
+            # os.path.exists on licenses directory itself
+            return registry.has_directory()
+        return license in registry
 
     @classmethod
     def construct_atom(cls, pn, category, pv=None, operator="", uses=None, if_use=None):
@@ -45,3 +45,11 @@ class GPyPiConfigurationError(GPyPiException):
 
 class GPyPiValidationError(GPyPiException):
     """"""
+
+
+class GPyPiDaemonError(GPyPiException):
+    """Raised when gpypi serve can not be started or reached."""
+
+
+class GPyPiSetupError(GPyPiException):
+    """Raised when setup.py of a package could not be run."""
@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Sync journal
+============
+
+Append-only record of what ``gpypi sync`` did with each project version,
+so an interrupted sync can be resumed (``gpypi sync --resume``).
+
+Each line is a JSON object with ``project``, ``version``, ``outcome``,
+``time`` and optional ``error``. Lines with ``version`` null are about
+the whole project: its metadata query failed, or all its queued versions
+are done, so a resumed sync doesn't query it again. Lines are flushed and synced to disk
+as they are written, an incomplete last line (crash while writing) is
+ignored when the journal is loaded.
+
+"""
+
+import os
+import time
+import json
+import logging
+import threading
+
+from gpypi.exc import *
+
+log = logging.getLogger(__name__)
+
+
+class SyncJournal(object):
+    """Progress journal of a sync.
+
+    :param path: Journal file
+    :type path: string
+    :param resume: Load existing journal and append to it,
+        otherwise the journal is started from scratch
+    :type resume: bool
+    :param retries: How many times failed versions are retried
+        when resuming, 0 never retries them
+    :type retries: int
+    :raises: :exc:`gpypi.exc.GPyPiConfigurationError` if the journal
+        can't be opened
+
+    :attr:`DONE` -- outcomes that need no further work,
+    :attr:`COMPLETE` is recorded for projects with all versions done
+
+    Example::
+
+        journal = SyncJournal('/var/cache/gpypi/sync.journal', resume=True)
+        if journal.should_process('foobar', '1.0'):
+            journal.record('foobar', '1.0', SyncJournal.CREATED)
+
+    """
+    CREATED = 'created'
+    EXISTS = 'exists'
+    NO_URL = 'nourl'
+    FAILED = 'failed'
+    COMPLETE = 'complete'
+    DONE = [CREATED, EXISTS, NO_URL, COMPLETE]
+
+    def __init__(self, path, resume=False, retries=2):
+        self.path = path
+        self.retries = retries
+        self.entries = {}
+        self.skipped = 0
+        self.retried = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        try:
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            if resume:
+                self.load()
+            self._file = open(path, 'a' if resume else 'w')
+            if resume and self._file.tell():
+                # terminate line left incomplete by a crash
+                with open(path) as f:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != "\n":
+                        self._file.write("\n")
+        except (OSError, IOError), e:
+            raise GPyPiConfigurationError("Could not open sync journal %s: %s" % (path, e))
+
+    def __repr__(self):
+        return "<SyncJournal %s entries(%d)>" % (self.path, len(self.entries))
+
+    @classmethod
+    def key(cls, project, version):
+        """Return journal key of a project version"""
+        return project.lower(), version
+
+    def load(self):
+        """Read outcomes from the journal file.
+
+        :returns: (project, version) -> {'outcome', 'attempts', 'time'}
+        :rtype: dict
+
+        """
+        if not os.path.exists(self.path):
+            return self.entries
+        with open(self.path) as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                    self._add(record['project'], record['version'],
+                        record['outcome'], record['time'])
+                except (ValueError, KeyError):
+                    log.debug("Ignoring broken journal line %d: %r", number, line)
+        log.debug("Loaded %d journal entries from %s", len(self.entries), self.path)
+        return self.entries
+
+    def _add(self, project, version, outcome, timestamp):
+        key = self.key(project, version)
+        entry = self.entries.setdefault(key, {'attempts': 0})
+        entry['outcome'] = outcome
+        entry['time'] = timestamp
+        if outcome == self.FAILED:
+            entry['attempts'] += 1
+
+    def record(self, project, version, outcome, error=None):
+        """Append outcome of processing a project version.
+
+        :param project: Upstream project name
+        :type project: string
+        :param version: Upstream version, None if the whole project failed
+        :type version: string
+        :param outcome: One of :attr:`DONE` or :attr:`FAILED`
+        :type outcome: string
+        :param error: Description of a failure
+        :type error: string
+
+        """
+        with self._lock:
+            self._write(project, version, outcome, error)
+            pending = self._pending.get(self.key(project, None))
+            if pending is not None and outcome in self.DONE:
+                pending.discard(version)
+                if not pending:
+                    del self._pending[self.key(project, None)]
+                    self._write(project, None, self.COMPLETE)
+
+    def _write(self, project, version, outcome, error=None):
+        record = {'project': project, 'version': version,
+            'outcome': outcome, 'time': time.time()}
+        if error is not None:
+            record['error'] = error
+        self._add(project, version, outcome, record['time'])
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def expect(self, project, versions):
+        """Start waiting for outcomes of queued `versions` of a project,
+        it's recorded as :attr:`COMPLETE` once all of them are done.
+
+        :param project: Upstream project name
+        :type project: string
+        :param versions: Upstream versions the sync processes
+        :type versions: list of strings
+
+        """
+        with self._lock:
+            pending = set(version for version in versions
+                if self.entries.get(self.key(project, version), {}).get('outcome') not in self.DONE)
+            if pending:
+                self._pending[self.key(project, None)] = pending
+            else:
+                self._write(project, None, self.COMPLETE)
+
+    def should_process(self, project, version):
+        """Return False for versions that are done or failed too many times"""
+        entry = self.entries.get(self.key(project, version))
+        if entry is None:
+            return True
+        with self._lock:
+            if entry['outcome'] in self.DONE or entry['attempts'] > self.retries:
+                self.skipped += 1
+                return False
+            self.retried += 1
+            return True
+
+    def report(self):
+        """Return lines summarizing the journal
+
+        :rtype: list of strings
+
+        """
+        return ["journal: %d entries, %d skipped, %d retried (%s)" % (
+            len(self.entries), self.skipped, self.retried, self.path)]
+
+    def close(self):
+        """Close the journal file"""
+        self._file.close()
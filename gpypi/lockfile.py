@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Resolution lockfile
+===================
+
+``gpypi create --lock FILE`` records every package the run resolved:
+upstream name and version, source URL, sha256 of the distfile,
+chosen category, :term:`PyPi` metadata, ``setup()`` keywords and
+what was found in unpacked sources (:attr:`gpypi.ebuild.Ebuild.probe`).
+Entries are merged into FILE if it exists. Packages whose ebuild
+already existed weren't unpacked, their entries are not ``analyzed``.
+
+``gpypi create --from-lock FILE`` writes the same ebuilds again. Analyzed
+entries need only the lockfile: no :term:`PyPi` queries, no unpacking
+and no *setup.py* execution. Useful to regenerate an overlay after
+template changes. Other entries are unpacked and examined again.
+
+The file is JSON::
+
+    {"format": 1, "gpypi": "0.3", "packages": [{"name": "Foo", ...}]}
+
+"""
+
+import os
+import json
+import hashlib
+import logging
+import urlparse
+from collections import OrderedDict
+
+from gpypi import __version__
+from gpypi.exc import *
+
+log = logging.getLogger(__name__)
+
+LOCK_FORMAT = 1
+
+
+def to_json(value):
+    """Return copy of `value` made of JSON types only.
+
+    Sets become sorted lists, values that can't be represented
+    (classes, functions, ``Extension`` objects of ``setup()``
+    keywords) are dropped.
+
+    **Example:**
+
+    >>> to_json({'packages': ('foo',), 'cmdclass': {'test': object}}) == \\
+    ...     {'packages': [u'foo'], 'cmdclass': {}}
+    True
+
+    """
+    if value is None or isinstance(value, (bool, int, long, float)):
+        return value
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    if isinstance(value, unicode):
+        return value
+    if isinstance(value, dict):
+        d = {}
+        for key, item in value.iteritems():
+            item = to_json(item)
+            if isinstance(key, basestring) and (item is not None or value[key] is None):
+                d[key] = item
+        return d
+    if isinstance(value, (set, frozenset)):
+        value = sorted(value)
+    if isinstance(value, (list, tuple)):
+        return [item for item in map(to_json, value) if item is not None]
+    return None
+
+
+def distfile_sha256(uri):
+    """Return sha256 of downloaded `uri` in DISTDIR, None if missing"""
+    from gpypi.portage_utils import PortageUtils
+
+    filename = os.path.basename(urlparse.urlparse(uri or '').path)
+    path = os.path.join(PortageUtils.get_distdir(), filename)
+    if not filename or not os.path.isfile(path):
+        return None
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), ''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class Lockfile(object):
+    """Resolved packages of a ``create`` run.
+
+    :param path: Lockfile path
+    :type path: string
+
+    :attr:`packages` -- lock entries by lowercase project name,
+    in order of creation
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.packages = OrderedDict()
+
+    def __repr__(self):
+        return "<Lockfile %s (%d packages)>" % (self.path, len(self.packages))
+
+    def __iter__(self):
+        return iter(self.packages.values())
+
+    def __len__(self):
+        return len(self.packages)
+
+    @classmethod
+    def entry(cls, ebuild):
+        """Return lock entry of created `ebuild`
+
+        :type ebuild: :class:`gpypi.ebuild.Ebuild`
+        :rtype: dict
+
+        """
+        options = ebuild.options
+        return {
+            'name': options.up_pn,
+            'version': options.up_pv,
+            'url': options.uri,
+            'sha256': distfile_sha256(options.uri),
+            'category': options.category,
+            'metadata': to_json(ebuild.metadata),
+            'setup_keywords': to_json(ebuild.setup_keywords),
+            'probe': to_json(ebuild.probe),
+            'analyzed': bool(ebuild.probe),
+        }
+
+    def add(self, ebuild):
+        """Record resolved `ebuild`, replacing older entry of the
+        project unless that one describes the same version better
+        (it was analyzed, `ebuild` wasn't)"""
+        entry = self.entry(ebuild)
+        key = entry['name'].lower()
+        old = self.packages.get(key)
+        if old is not None and old['version'] == entry['version'] \
+                and old['analyzed'] and not entry['analyzed']:
+            return
+        self.packages[key] = entry
+
+    @classmethod
+    def open(cls, path):
+        """Return lockfile of `path` to add packages to, with
+        entries of `path` if it exists
+
+        :raises: :exc:`gpypi.exc.GPyPiInvalidParameter` if existing
+            lockfile can't be read
+
+        """
+        if os.path.exists(path):
+            return cls.load(path)
+        return cls(path)
+
+    @classmethod
+    def load(cls, path):
+        """Read lockfile from `path`
+
+        :raises: :exc:`gpypi.exc.GPyPiInvalidParameter` if lockfile
+            can't be read or has unknown format
+
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (IOError, ValueError), e:
+            raise GPyPiInvalidParameter("Could not read lockfile %s: %s" % (path, e))
+        if data.get('format') != LOCK_FORMAT:
+            raise GPyPiInvalidParameter("Unsupported lockfile format %s in %s"
+                % (data.get('format'), path))
+
+        lock = cls(path)
+        for entry in data.get('packages', []):
+            # setup() keywords are used as attribute names
+            entry['setup_keywords'] = dict((str(key), value)
+                for key, value in entry['setup_keywords'].iteritems())
+            entry.setdefault('analyzed', True)
+            lock.packages[entry['name'].lower()] = entry
+        return lock
+
+    def write(self):
+        """Atomically replace :attr:`path` with recorded packages"""
+        content = json.dumps({
+            'format': LOCK_FORMAT,
+            'gpypi': __version__,
+            'packages': self.packages.values(),
+        }, indent=2, sort_keys=True)
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp_path = "%s.%d.tmp" % (self.path, os.getpid())
+        with open(temp_path, 'w') as f:
+            f.write(content)
+        os.rename(temp_path, self.path)
+        log.info("Lockfile with %d packages written to %s", len(self), self.path)
+
+    def regenerate(self, options):
+        """Write ebuilds of all entries, entries that are not
+        ``analyzed`` are unpacked (see :meth:`gpypi.ebuild.Ebuild.create`).
+
+        :param options: Configuration, snapshotted for each ebuild
+        :type options: :class:`gpypi.config.ConfigManager`
+        :returns: outcome of each package, see
+            :attr:`gpypi.cli.GPyPI.OUTCOMES`
+        :rtype: :class:`collections.OrderedDict`
+
+        """
+        from gpypi.ebuild import Ebuild
+
+        results = OrderedDict()
+        for entry in self:
+            name = entry['name']
+            try:
+                sha256 = distfile_sha256(entry['url'])
+                if sha256 and entry['sha256'] and sha256 != entry['sha256']:
+                    log.warn("%s: distfile differs from the locked one (sha256 %s, locked %s)",
+                        name, sha256, entry['sha256'])
+
+                log.info('Generating ebuild from lockfile: %s %s', name, entry['version'])
+                ebuild = Ebuild(options.snapshot(uri=entry['url'], up_pn=name,
+                    up_pv=entry['version'], category=entry['category']))
+                ebuild.set_metadata(entry['metadata'])
+                if not entry['analyzed']:
+                    ebuild.create()
+                    results[name] = 'created' if ebuild.created else 'skipped'
+                    continue
+                ebuild.replay(entry['setup_keywords'], entry['probe'])
+                if ebuild.write(overwrite=ebuild.options.overwrite):
+                    if ebuild.options.command != 'echo':
+                        ebuild.record_dependencies()
+                        ebuild.run_workflows()
+                    log.info("Your ebuild is here: " + ebuild.ebuild_path)
+                    results[name] = 'created'
+                else:
+                    results[name] = 'skipped'
+            except GPyPiException, e:
+                log.error("%s: %s: %s", name, e.__class__.__name__, e)
+                results[name] = 'failed'
+        return results
@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Metrics
+=======
+
+Counters and histograms of a long running ``gpypi sync``, periodically
+written to a file by :class:`MetricsWriter` so throughput can be
+monitored without parsing logs. Files ending with ``.prom`` are written
+in Prometheus text format (for node_exporter's textfile collector),
+anything else as JSON.
+
+Hit rates of :func:`gpypi.utils.memoize` caches are collected
+at the time the file is written.
+
+Example::
+
+    >>> m = Metrics()
+    >>> m.inc('gpypi_sync_packages_total', outcome='created')
+    >>> m.observe('gpypi_stage_seconds', 0.2, stage='unpack')
+    >>> print m.to_prometheus(caches={}) # doctest: +ELLIPSIS
+    # TYPE gpypi_sync_packages_total counter
+    gpypi_sync_packages_total{outcome="created"} 1
+    # TYPE gpypi_stage_seconds histogram
+    gpypi_stage_seconds_bucket{stage="unpack",le="0.01"} 0
+    ...
+
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from gpypi import utils
+
+log = logging.getLogger(__name__)
+
+
+class Histogram(object):
+    """Cumulative histogram of observed values.
+
+    :param buckets: Upper bounds of buckets, in increasing order
+    :type buckets: tuple of floats
+
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def __repr__(self):
+        return "<Histogram count(%d) sum(%.3f)>" % (self.count, self.sum)
+
+    def observe(self, value):
+        """Add a value"""
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics(object):
+    """Thread-safe registry of counters and histograms.
+
+    Metrics are identified by name and keyword labels,
+    values of labels are converted to strings.
+
+    """
+    LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+    def __init__(self):
+        self.counters = OrderedDict()
+        self.histograms = OrderedDict()
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Metrics counters(%d) histograms(%d)>" % (len(self.counters), len(self.histograms))
+
+    @classmethod
+    def key(cls, name, labels):
+        """Return hashable (name, sorted labels) key"""
+        return name, tuple(sorted((k, str(v)) for k, v in labels.iteritems()))
+
+    def inc(self, name, value=1, **labels):
+        """Increase counter `name` by `value`"""
+        key = self.key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets=None, **labels):
+        """Add `value` to histogram `name`, :attr:`LATENCY_BUCKETS`
+        are used unless `buckets` are given"""
+        key = self.key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets or self.LATENCY_BUCKETS)
+            histogram.observe(value)
+
+    def get(self, name, **labels):
+        """Return value of a counter, 0 if it was never increased"""
+        return self.counters.get(self.key(name, labels), 0)
+
+    def reset(self):
+        """Forget all values"""
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def _cache_counters(self, caches):
+        """Return cache hits and misses as counter items"""
+        if caches is None:
+            caches = utils.CACHES
+        items = []
+        for name, cache in sorted(caches.iteritems()):
+            items.append((('gpypi_cache_hits_total', (('cache', name),)), cache.hits))
+            items.append((('gpypi_cache_misses_total', (('cache', name),)), cache.misses))
+        return items
+
+    @classmethod
+    def _format_labels(cls, labels):
+        if not labels:
+            return ""
+        return "{%s}" % ",".join('%s="%s"' % (k, v.replace('\\', '\\\\').replace('"', '\\"'))
+            for k, v in labels)
+
+    def to_prometheus(self, caches=None):
+        """Return metrics in Prometheus text exposition format.
+
+        :param caches: name -> :class:`gpypi.utils.LRUCache`,
+            defaults to :data:`gpypi.utils.CACHES`
+        :type caches: dict
+        :rtype: string
+
+        """
+        lines = []
+        typed = set()
+        with self._lock:
+            counters = self.counters.items() + self._cache_counters(caches)
+            histograms = [(key, (h.buckets, list(h.counts), h.count, h.sum))
+                for key, h in self.histograms.items()]
+
+        for (name, labels), value in counters:
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE %s counter" % name)
+            lines.append("%s%s %s" % (name, self._format_labels(labels), value))
+
+        for (name, labels), (buckets, counts, count, total) in histograms:
+            if name not in typed:
+                typed.add(name)
+                lines.append("# TYPE %s histogram" % name)
+            for bound, bucket_count in zip(buckets, counts):
+                lines.append("%s_bucket%s %d" % (name,
+                    self._format_labels(labels + (('le', str(bound)),)), bucket_count))
+            lines.append("%s_bucket%s %d" % (name, self._format_labels(labels + (('le', '+Inf'),)), count))
+            lines.append("%s_sum%s %f" % (name, self._format_labels(labels), total))
+            lines.append("%s_count%s %d" % (name, self._format_labels(labels), count))
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self, caches=None):
+        """Return metrics as JSON serializable dict, with cache
+        hit rates and mean histogram values.
+
+        :param caches: name -> :class:`gpypi.utils.LRUCache`,
+            defaults to :data:`gpypi.utils.CACHES`
+        :type caches: dict
+        :rtype: dict
+
+        """
+        if caches is None:
+            caches = utils.CACHES
+        data = {'time': time.time(), 'uptime': time.time() - self.started,
+            'counters': [], 'histograms': [], 'caches': {}}
+        with self._lock:
+            for (name, labels), value in self.counters.items():
+                data['counters'].append({'name': name, 'labels': dict(labels), 'value': value})
+            for (name, labels), h in self.histograms.items():
+                data['histograms'].append({'name': name, 'labels': dict(labels),
+                    'count': h.count, 'sum': h.sum, 'mean': h.sum / (h.count or 1),
+                    'buckets': dict(zip(map(str, h.buckets), h.counts))})
+        for name, cache in sorted(caches.iteritems()):
+            lookups = cache.hits + cache.misses
+            data['caches'][name] = {'hits': cache.hits, 'misses': cache.misses,
+                'hit_rate': float(cache.hits) / lookups if lookups else None}
+        return data
+
+    def write(self, path):
+        """Atomically replace `path` with current metrics,
+        Prometheus format if it ends with ``.prom``, JSON otherwise"""
+        if path.endswith('.prom'):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), indent=2, sort_keys=True)
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+        with open(temp_path, 'w') as f:
+            f.write(content)
+        os.rename(temp_path, path)
+
+
+class MetricsWriter(threading.Thread):
+    """Background thread writing :class:`Metrics` to a file
+    every `interval` seconds and once more when stopped.
+
+    :param metrics: Metrics to write
+    :type metrics: :class:`Metrics`
+    :param path: Output file, see :meth:`Metrics.write`
+    :type path: string
+    :param interval: Seconds between writes
+    :type interval: int
+
+    """
+
+    def __init__(self, metrics, path, interval=30):
+        super(MetricsWriter, self).__init__(name="metrics-writer")
+        self.daemon = True
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def write(self):
+        """Write metrics, errors are logged but never raised"""
+        try:
+            self.metrics.write(self.path)
+        except (OSError, IOError), e:
+            log.warn("Could not write metrics to %s: %s", self.path, e)
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        """Stop the thread and write final metrics"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        self.write()
+
+
+#: process-wide metrics recorded by sync
+metrics = Metrics()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local PyPI mirror
+=================
+
+:class:`LocalMirror` reads packages from a :pep:`503` mirror on disk,
+such as one kept by bandersnatch, instead of querying :term:`PyPi`
+(``--mirror DIR`` or ``mirror_dir`` option). It offers the part of
+:class:`yolk.pypi.CheeseShop` gpypi uses, answered from local files:
+
+* versions come from sdist links of ``simple/<project>/index.html``
+* download URLs are the canonical
+  ``http://pypi.python.org/packages/source/`` ones, so SRC_URI is
+  still rewritten to ``mirror://pypi/`` by the ebuild template
+* release data come from JSON metadata kept by the mirror
+  (``json/<project>``, ``pypi/<project>/json``) or from ``PKG-INFO``
+  of the sdist
+* :meth:`LocalMirror.fetch` puts the sdist into DISTDIR, so portage
+  never downloads it
+
+Supported layouts: bandersnatch root (``web/simple``), a directory
+with ``simple/`` and a bare simple index directory.
+
+"""
+
+import os
+import re
+import json
+import shutil
+import logging
+import tarfile
+import zipfile
+import urlparse
+import HTMLParser
+from email.parser import Parser
+
+from gpypi.exc import *
+
+log = logging.getLogger(__name__)
+
+PYPI_SOURCE_URL = "http://pypi.python.org/packages/source/%s/%s/%s"
+SDIST_EXTENSIONS = ['.tar.gz', '.tar.bz2', '.tgz', '.zip']
+#: PKG-INFO fields that can appear more than once
+MULTIPLE_FIELDS = {'classifier': 'classifiers', 'requires_dist': 'requires_dist',
+    'platform': 'platform'}
+
+
+def normalize(name):
+    """Return :pep:`503` normalized project name
+
+    **Example:**
+
+    >>> normalize('Zope.Interface_Foo')
+    'zope-interface-foo'
+
+    """
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def split_sdist(filename, project):
+    """Return (project name, version) from sdist `filename` of
+    `project`, None if it's not an sdist of `project`
+
+    **Example:**
+
+    >>> split_sdist('Flask_Foo-0.8-1.tar.gz', 'flask-foo')
+    ('Flask_Foo', '0.8-1')
+    >>> split_sdist('Flask-0.8-py2.7.egg', 'flask')
+
+    """
+    for extension in SDIST_EXTENSIONS:
+        if filename.endswith(extension):
+            base = filename[:-len(extension)]
+            break
+    else:
+        return None
+    project = normalize(project)
+    index = base.find('-')
+    while index != -1:
+        if normalize(base[:index]) == project:
+            return base[:index], base[index + 1:]
+        index = base.find('-', index + 1)
+    return None
+
+
+class _LinkParser(HTMLParser.HTMLParser):
+    """Collects (href, text) of anchors"""
+
+    def __init__(self):
+        HTMLParser.HTMLParser.__init__(self)
+        self.links = []
+        self._href = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._href = dict(attrs).get('href')
+            self._text = ''
+
+    def handle_data(self, data):
+        if self._href is not None:
+            self._text += data
+
+    def handle_endtag(self, tag):
+        if tag == 'a' and self._href is not None:
+            self.links.append((self._href, self._text.strip()))
+            self._href = None
+
+
+class LocalMirror(object):
+    """:term:`PyPi` client reading a mirror directory.
+
+    :param path: Mirror directory
+    :type path: string
+    :raises: :exc:`gpypi.exc.GPyPiConfigurationError` if there
+        is no simple index in `path`
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        for simple in [os.path.join(path, 'web', 'simple'), os.path.join(path, 'simple'), path]:
+            if os.path.isdir(simple):
+                break
+        self.simple_dir = simple
+        self.web_dir = os.path.dirname(simple.rstrip(os.sep))
+        if not os.path.isdir(simple):
+            raise GPyPiConfigurationError("No simple index in mirror %s" % path)
+
+    def __repr__(self):
+        return "<LocalMirror %s>" % self.path
+
+    def list_packages(self):
+        """Return names of all projects in the mirror"""
+        return sorted(name for name in os.listdir(self.simple_dir)
+            if os.path.isfile(os.path.join(self.simple_dir, name, 'index.html')))
+
+    def sdists(self, project):
+        """Return sdists of `project` in the simple index
+
+        :returns: (name, version, filename, local path) tuples,
+            name is the project name as used in file names
+        :rtype: list of tuples
+
+        """
+        directory = os.path.join(self.simple_dir, normalize(project))
+        try:
+            with open(os.path.join(directory, 'index.html')) as f:
+                html = f.read()
+        except IOError:
+            return []
+        parser = _LinkParser()
+        parser.feed(html.decode('utf-8', 'replace'))
+
+        sdists = []
+        for href, text in parser.links:
+            href = href.split('#', 1)[0]
+            url = urlparse.urlparse(href)
+            filename = text or os.path.basename(url.path)
+            parsed = split_sdist(filename, project)
+            if parsed is None:
+                continue
+            if url.scheme:
+                local = os.path.join(self.web_dir, url.path.lstrip('/'))
+            else:
+                local = os.path.normpath(os.path.join(directory, url.path))
+            sdists.append(parsed + (filename, local))
+        return sdists
+
+    def json_metadata(self, project):
+        """Return JSON metadata saved by the mirror, None if there is none"""
+        name = normalize(project)
+        for path in [os.path.join(self.web_dir, 'json', name),
+                os.path.join(self.web_dir, 'pypi', name, 'json')]:
+            if os.path.isfile(path):
+                try:
+                    with open(path) as f:
+                        return json.load(f)
+                except ValueError, e:
+                    log.warn("Invalid JSON metadata %s: %s", path, e)
+        return None
+
+    def query_versions_pypi(self, package_name):
+        """Return (project name, versions) like
+        :meth:`yolk.pypi.CheeseShop.query_versions_pypi`"""
+        sdists = self.sdists(package_name)
+        versions = []
+        for name, version, filename, local in sdists:
+            if version not in versions:
+                versions.append(version)
+        metadata = self.json_metadata(package_name)
+        if metadata is not None:
+            return metadata['info']['name'], versions
+        if sdists:
+            return sdists[-1][0], versions
+        return package_name, versions
+
+    def get_download_urls(self, package_name, version="", pkg_type="all"):
+        """Return canonical :term:`PyPi` URLs of sdists of `version`"""
+        return [PYPI_SOURCE_URL % (name[0], name, filename)
+            for name, v, filename, local in self.sdists(package_name) if v == version]
+
+    def local_path(self, url):
+        """Return mirror file of URL from :meth:`get_download_urls`, None
+        if the mirror doesn't have it"""
+        parts = urlparse.urlparse(url).path.split('/')
+        if len(parts) < 3:
+            return None
+        project, filename = parts[-2], parts[-1]
+        for name, version, sdist, local in self.sdists(project):
+            if sdist == filename and os.path.isfile(local):
+                return local
+        return None
+
+    def release_data(self, package_name, version):
+        """Return metadata of a release like
+        :meth:`yolk.pypi.CheeseShop.release_data`, from JSON metadata
+        of the mirror when it describes `version`, otherwise
+        from ``PKG-INFO`` of the sdist"""
+        metadata = self.json_metadata(package_name)
+        if metadata is not None and metadata['info'].get('version') == version:
+            return metadata['info']
+        for name, v, filename, local in self.sdists(package_name):
+            if v == version and os.path.isfile(local):
+                pkg_info = self.read_pkg_info(local)
+                if pkg_info is not None:
+                    return self.parse_pkg_info(pkg_info)
+        return {}
+
+    @classmethod
+    def read_pkg_info(cls, path):
+        """Return top level ``PKG-INFO`` of sdist `path`, None if missing"""
+        try:
+            if path.endswith('.zip'):
+                with zipfile.ZipFile(path) as archive:
+                    names = [n for n in archive.namelist() if n.count('/') == 1
+                        and n.endswith('/PKG-INFO')]
+                    return archive.read(names[0]) if names else None
+            with tarfile.open(path) as archive:
+                for member in archive:
+                    if member.name.count('/') == 1 and member.name.endswith('/PKG-INFO'):
+                        return archive.extractfile(member).read()
+        except (IOError, tarfile.TarError, zipfile.BadZipfile), e:
+            log.warn("Could not read %s: %s", path, e)
+        return None
+
+    @classmethod
+    def parse_pkg_info(cls, text):
+        """Convert ``PKG-INFO`` to release data keys
+
+        **Example:**
+
+        >>> data = LocalMirror.parse_pkg_info('Name: foo\\nHome-page: http://foo\\n'
+        ...     'Classifier: A\\nClassifier: B\\n\\nLong description')
+        >>> data['home_page'], data['classifiers'], data['description']
+        ('http://foo', ['A', 'B'], 'Long description')
+
+        """
+        message = Parser().parsestr(text)
+        data = {}
+        for key in set(message.keys()):
+            name = key.lower().replace('-', '_')
+            if name in MULTIPLE_FIELDS:
+                data[MULTIPLE_FIELDS[name]] = message.get_all(key)
+            else:
+                data[name] = message[key]
+        body = message.get_payload()
+        if body and body.strip() and not data.get('description'):
+            data['description'] = body.strip()
+        return data
+
+    def fetch(self, url):
+        """Put the sdist of `url` into DISTDIR unless it's there already.
+
+        :returns: path in DISTDIR, None if the mirror doesn't have the file
+            or it couldn't be copied (portage will fetch it then)
+        :rtype: string
+
+        """
+        from gpypi.portage_utils import PortageUtils
+
+        local = self.local_path(url)
+        if local is None:
+            return None
+        dest = os.path.join(PortageUtils.get_distdir(), os.path.basename(local))
+        if not os.path.exists(dest):
+            try:
+                try:
+                    os.link(local, dest)
+                except OSError:
+                    shutil.copy2(local, dest)
+            except (IOError, OSError), e:
+                log.warn("Could not copy %s to DISTDIR: %s", local, e)
+                return None
+            log.debug("Fetched %s from mirror to %s", local, dest)
+        return dest
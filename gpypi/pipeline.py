@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Staged processing
+=================
+
+:class:`Pipeline` runs items through a chain of :class:`Stage` instances.
+Stages are connected with bounded queues and each stage runs its own
+number of worker threads, so network, disk and CPU work overlap while
+a slow stage blocks its producers (backpressure) instead of piling up
+items in memory.
+
+:class:`SyncPipeline` implements ``gpypi sync`` on top of it.
+
+"""
+
+import os
+import time
+import logging
+import urlparse
+import threading
+from Queue import Queue, Full
+
+from gpypi.exc import *
+from gpypi.journal import SyncJournal
+from gpypi.profiling import profiler, span
+from gpypi.metrics import metrics
+
+log = logging.getLogger(__name__)
+_DONE = object()
+
+
+class Stage(object):
+    """Step of a :class:`Pipeline`.
+
+    :param name: Name used in reports
+    :type name: string
+    :param func: Called with each item, returns iterable of items
+        for the next stage. Generator functions stream their items,
+        each one is passed on as soon as it's produced
+    :type func: callable
+    :param workers: Number of threads processing items
+    :type workers: int
+
+    """
+
+    def __init__(self, name, func, workers=1):
+        if workers < 1:
+            raise GPyPiConfigurationError("Stage %s needs at least one worker" % name)
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.processed = 0
+        self.produced = 0
+        self.failed = 0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Stage %s workers(%d) processed(%d)>" % (self.name, self.workers, self.processed)
+
+    def process(self, item):
+        """Run :attr:`func` on `item` and yield items for the next
+        stage as they are produced, errors are logged and counted.
+        Time spent by the consumer between items is not counted as busy.
+
+        """
+        busy = 0.0
+        produced = failed = 0
+        start = time.time()
+        try:
+            for result in self.func(item) or []:
+                busy += time.time() - start
+                produced += 1
+                yield result
+                start = time.time()
+        except Exception:
+            log.exception("Stage %s failed on %r:", self.name, item)
+            failed = 1
+        busy += time.time() - start
+        with self._lock:
+            self.busy += busy
+            self.processed += 1
+            self.produced += produced
+            self.failed += failed
+
+
+class Pipeline(object):
+    """Chain of stages connected by bounded queues.
+
+    :param stages: Stages in order of processing
+    :type stages: list of :class:`Stage`
+    :param queue_size: Maximum number of items waiting for each stage
+    :type queue_size: int
+
+    Example::
+
+        >>> results = []
+        >>> pipeline = Pipeline([Stage('double', lambda i: [i * 2], workers=2),
+        ...     Stage('collect', results.append)])
+        >>> pipeline.run(xrange(5))
+        >>> sorted(results)
+        [0, 2, 4, 6, 8]
+
+    """
+    QUEUE_SIZE = 100
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, stages, queue_size=None):
+        self.stages = stages
+        self.queue_size = queue_size or self.QUEUE_SIZE
+        self.fed = 0
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+
+    def run(self, items):
+        """Feed `items` to the first stage and wait until all stages finish.
+
+        :param items: Input of the first stage
+        :type items: iterable
+
+        """
+        queues = [Queue(self.queue_size) for stage in self.stages]
+        remaining = [stage.workers for stage in self.stages]
+        lock = threading.Lock()
+        threads = []
+        start = time.time()
+
+        def worker(index):
+            stage = self.stages[index]
+            next_queue = queues[index + 1] if index + 1 < len(queues) else None
+            while not self._stop.is_set():
+                item = queues[index].get()
+                if item is _DONE:
+                    break
+                for result in stage.process(item):
+                    if next_queue is not None:
+                        self._put(next_queue, result)
+            with lock:
+                remaining[index] -= 1
+                last = not remaining[index]
+            if last and next_queue is not None:
+                for i in range(self.stages[index + 1].workers):
+                    self._put(next_queue, _DONE)
+
+        for index, stage in enumerate(self.stages):
+            for i in range(stage.workers):
+                thread = threading.Thread(target=worker, args=(index,),
+                    name="%s-%d" % (stage.name, i))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for item in items:
+                self._put(queues[0], item)
+                self.fed += 1
+            for i in range(self.stages[0].workers):
+                self._put(queues[0], _DONE)
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(self.POLL_INTERVAL)
+        except KeyboardInterrupt:
+            self._stop.set()
+            raise
+        finally:
+            self.elapsed = time.time() - start
+
+    def _put(self, queue, item):
+        """Block until there is room in `queue`, unless pipeline is stopped"""
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=self.POLL_INTERVAL)
+                return
+            except Full:
+                continue
+
+    def report(self):
+        """Return lines with throughput of each stage
+
+        :rtype: list of strings
+
+        """
+        elapsed = self.elapsed or 1e-9
+        lines = ["input: %d items in %.1fs" % (self.fed, self.elapsed)]
+        for stage in self.stages:
+            lines.append("%s: %d processed (%d failed), %d passed on, "
+                "%.2f items/s, %d%% busy" % (stage.name, stage.processed,
+                stage.failed, stage.produced, stage.processed / elapsed,
+                100 * stage.busy / (elapsed * stage.workers)))
+        return lines
+
+
+class SyncPipeline(Pipeline):
+    """Create ebuilds for all packages on :term:`PyPi`.
+
+    Memory stays bounded however many packages there are: package names
+    are dropped as they are fed, versions stream through the stages and
+    each :class:`gpypi.ebuild.Ebuild` is released once it's done.
+
+    Progress is counted in :data:`gpypi.metrics.metrics`:
+
+    * ``gpypi_sync_packages_total`` by ``outcome`` (journal outcomes
+      and ``skipped`` for versions done by previous sync)
+    * ``gpypi_sync_failures_total`` by ``stage`` and ``exception`` class
+    * ``gpypi_stage_seconds`` histogram by ``stage``
+    * ``gpypi_download_bytes_total`` -- size of distfiles downloaded
+      by portage, not counting ones already in DISTDIR
+
+    Stages:
+
+    * metadata -- query versions, download URL and release data
+    * download -- name the ebuild, skip existing ones, write it and fetch sources
+    * unpack -- unpack sources and analyze ``setup.py``
+    * render -- write the final ebuild
+    * workflows -- generate metadata, changelog and manifest
+
+    :param config: Configuration for all ebuilds, each ebuild
+        gets its own :meth:`gpypi.config.ConfigManager.snapshot`
+    :type config: :class:`gpypi.config.ConfigManager`
+    :param journal: Journal to record outcomes to and to skip
+        versions done by previous sync
+    :type journal: :class:`gpypi.journal.SyncJournal`
+
+    :attr:`STAGES` -- stage names with default number of workers,
+    overridden by ``sync_jobs`` option
+
+    """
+    STAGES = [('metadata', 4), ('download', 4), ('unpack', 2), ('render', 1), ('workflows', 2)]
+
+    def __init__(self, config, journal=None):
+        self.config = config
+        self.journal = journal
+        self._local = threading.local()
+        workers = dict(self.STAGES)
+        workers.update(self.parse_jobs(config.sync_jobs))
+        stages = [Stage(name, self.journaled(getattr(self, name)), workers[name])
+            for name, default in self.STAGES]
+        super(SyncPipeline, self).__init__(stages, config.sync_queue_size)
+
+    @classmethod
+    def parse_jobs(cls, jobs):
+        """Parse ``stage=workers`` pairs.
+
+        :param jobs: comma separated pairs
+        :type jobs: string
+        :rtype: dict
+        :raises: :exc:`gpypi.exc.GPyPiConfigurationError` on unknown stage
+            or number of workers
+
+        **Example:**
+
+        >>> sorted(SyncPipeline.parse_jobs('metadata=8, download=2').items())
+        [('download', 2), ('metadata', 8)]
+
+        """
+        names = [name for name, default in cls.STAGES]
+        parsed = {}
+        for pair in filter(None, [p.strip() for p in (jobs or '').split(',')]):
+            name, sep, workers = pair.partition('=')
+            name = name.strip()
+            if name not in names or not workers.strip().isdigit():
+                raise GPyPiConfigurationError("Invalid sync job %r, use one of "
+                    "%s with number of workers" % (pair, ", ".join(names)))
+            parsed[name] = int(workers)
+        return parsed
+
+    @property
+    def pypi(self):
+        """:class:`yolk.pypi.CheeseShop` of current thread,
+        XML-RPC connections can't be shared between threads,
+        recording to the metadata store, :class:`gpypi.mirror.LocalMirror`
+        with ``mirror_dir`` or :class:`gpypi.store.MetadataStore` with ``offline``"""
+        if not hasattr(self._local, 'pypi'):
+            if self.config.mirror_dir:
+                from gpypi.mirror import LocalMirror
+                self._local.pypi = LocalMirror(self.config.mirror_dir)
+            elif self.config.offline:
+                from gpypi.store import MetadataStore
+                self._local.pypi = MetadataStore.from_config(self.config)
+            else:
+                from yolk.pypi import CheeseShop
+                from gpypi.store import RecordingPyPI
+                self._local.pypi = RecordingPyPI.wrap(CheeseShop(), self.config)
+        return self._local.pypi
+
+    @classmethod
+    def describe(cls, item):
+        """Return (project, version) of a stage item, version
+        is None for project names fed to the first stage"""
+        if isinstance(item, basestring):
+            return item, None
+        options = item[0] if isinstance(item, tuple) else item.options
+        return options.up_pn, options.up_pv
+
+    def journaled(self, func):
+        """Wrap stage function to record its failures in :attr:`journal`
+        and :data:`gpypi.metrics.metrics`, and to profile it as a span
+        of the processed package. Items are streamed, time waiting
+        for the next stage is not measured."""
+        def wrapper(item):
+            package = None
+            if profiler.enabled:
+                package = " ".join(filter(None, self.describe(item)))
+            start = time.time()
+            waited = 0.0
+            try:
+                with span(func.__name__, package=package) as current:
+                    for result in func(item) or []:
+                        pause = time.time()
+                        yield result
+                        pause = time.time() - pause
+                        waited += pause
+                        current.exclude(pause)
+            except Exception, e:
+                metrics.inc('gpypi_sync_failures_total', stage=func.__name__,
+                    exception=e.__class__.__name__)
+                project, version = self.describe(item)
+                self.record(project, version, SyncJournal.FAILED, error="%s: %s" % (e.__class__.__name__, e))
+                self.release(item)
+                raise
+            finally:
+                metrics.observe('gpypi_stage_seconds', time.time() - start - waited,
+                    stage=func.__name__)
+        wrapper.__name__ = func.__name__
+        return wrapper
+
+    @classmethod
+    def release(cls, item):
+        """Free per-package state of a stage item that won't go further"""
+        if hasattr(item, 'release'):
+            item.release()
+
+    @classmethod
+    def consume(cls, packages):
+        """Yield items of list `packages`, removing them from the list,
+        so names are freed as they are fed to the pipeline"""
+        packages.reverse()
+        while packages:
+            yield packages.pop()
+
+    def record(self, project, version, outcome, error=None):
+        """Count outcome and record it to :attr:`journal` if there is one"""
+        metrics.inc('gpypi_sync_packages_total', outcome=outcome)
+        if self.journal is not None:
+            self.journal.record(project, version, outcome, error)
+
+    def report(self):
+        lines = super(SyncPipeline, self).report()
+        if self.journal is not None:
+            lines.extend(self.journal.report())
+        return lines
+
+    def run(self, packages=None):
+        """Sync `packages` or all packages on :term:`PyPi`"""
+        if packages is None:
+            packages = self.consume(self.pypi.list_packages())
+        super(SyncPipeline, self).run(packages)
+
+    def metadata(self, package):
+        from gpypi.versions import newest_versions
+
+        # project that is complete or whose metadata query failed too many times
+        if self.journal is not None and not self.journal.should_process(package, None):
+            metrics.inc('gpypi_sync_packages_total', outcome='skipped')
+            return
+        (pn, versions) = self.pypi.query_versions_pypi(package)
+        versions = newest_versions(versions, self.config.newest or None)
+        if self.journal is not None:
+            self.journal.expect(pn, versions)
+        for version in versions:
+            if self.journal is not None and not self.journal.should_process(pn, version):
+                metrics.inc('gpypi_sync_packages_total', outcome='skipped')
+                continue
+            try:
+                url = self.pypi.get_download_urls(pn, version, pkg_type="source")[0]
+                # TODO: use setuptools way also
+            except IndexError:
+                log.warn('Skipping %s %s, no download url', pn, version)
+                self.record(pn, version, SyncJournal.NO_URL)
+                continue
+            options = self.config.snapshot(uri=url, up_pn=pn, up_pv=version)
+            yield options, self.pypi.release_data(pn, version)
+
+    def download(self, job):
+        from gpypi.ebuild import Ebuild
+        from gpypi.enamer import Enamer
+        from gpypi.portage_utils import PortageUtils
+
+        options, metadata = job
+        ebuild = Ebuild(options)
+        ebuild.set_metadata(metadata)
+
+        # we skip existing ebuilds
+        atom = Enamer.construct_atom(ebuild['pn'], options.category, ebuild['pv'], '=')
+        if PortageUtils.ebuild_exists(atom):
+            log.debug('Skipping %s, ebuild exists', atom)
+            self.record(options.up_pn, options.up_pv, SyncJournal.EXISTS)
+            ebuild.release()
+            return
+
+        if ebuild.write(overwrite=options.overwrite):
+            if self.config.mirror_dir:
+                self.pypi.fetch(options.uri)
+            distfile = os.path.basename(urlparse.urlsplit(options.uri).path)
+            # distfiles already in DISTDIR (or linked from the mirror) aren't downloaded
+            downloaded = not os.path.exists(os.path.join(PortageUtils.get_distdir(), distfile))
+            PortageUtils.unpack_ebuild(ebuild.ebuild_path, phases="digest")
+            if downloaded:
+                sizes = PortageUtils.manifest_dist_sizes(os.path.dirname(ebuild.ebuild_path))
+                metrics.inc('gpypi_download_bytes_total', sizes.get(distfile, 0))
+            yield ebuild
+        else:
+            self.record(options.up_pn, options.up_pv, SyncJournal.EXISTS)
+            ebuild.release()
+
+    def unpack(self, ebuild):
+        from gpypi.portage_utils import PortageUtils
+
+        PortageUtils.unpack_ebuild(ebuild.ebuild_path, phases="setup clean unpack")
+        ebuild.analyze()
+        yield ebuild
+
+    def render(self, ebuild):
+        ebuild.write(overwrite=True)
+        ebuild.record_dependencies()
+        yield ebuild
+
+    def workflows(self, ebuild):
+        ebuild.run_workflows()
+        self.record(ebuild.options.up_pn, ebuild.options.up_pv, SyncJournal.CREATED)
+        log.info("Your ebuild is here: %s", ebuild.ebuild_path)
+        ebuild.release()
@@ -5,37 +5,571 @@
 
 Various functions dealing with portage
 
+Portage configuration and gentoolkit are loaded on first use and
+shared by the whole process, so importing this module is cheap.
+
 """
 
 import sys
 import os
+import re
+import time
 import commands
 import logging
+import threading
+from abc import ABCMeta, abstractmethod
+from UserDict import DictMixin
+from ConfigParser import SafeConfigParser
 
-from portage import config as portage_config
-from portage import settings as portage_settings
-try:
-    # portage >= 2.2
-    from portage import dep as portage_dep
-except ImportError:
-    # portage <= 2.1
-    from portage import portage_dep
-
-# TODO: find more clean way
-sys.path.insert(0, "/usr/lib/gentoolkit/pym")
-import gentoolkit
-import gentoolkit.query
-
+from gpypi.utils import memoize
+from gpypi.atom import pkgsplit, vercmp, isvalidatom
 from gpypi.exc import *
+from gpypi.profiling import traced
 
 
 log = logging.getLogger(__name__)
-CONFIG = portage_config(clone=portage_settings)
-ENV = CONFIG.environ()
+_lock = threading.Lock()
+_portage = None  # (config, environment)
+
+
+def _load_portage():
+    """Clone portage settings once per process"""
+    global _portage
+    if _portage is None:
+        with _lock:
+            if _portage is None:
+                from portage import config as portage_config
+                from portage import settings as portage_settings
+                config = portage_config(clone=portage_settings)
+                _portage = (config, config.environ())
+                log.debug("Initialized portage configuration")
+    return _portage
+
+
+def get_config():
+    """Return portage config, cloned from portage settings on first call.
+
+    :rtype: :class:`portage.config`
+
+    """
+    return _load_portage()[0]
+
+
+def get_env():
+    """Return portage environment (``make.conf`` and friends)
+
+    :rtype: dict
+
+    """
+    return _load_portage()[1]
+
+
+def get_gentoolkit():
+    """Return :mod:`gentoolkit` with :mod:`gentoolkit.query` loaded"""
+    if "/usr/lib/gentoolkit/pym" not in sys.path:
+        # TODO: find more clean way
+        sys.path.insert(0, "/usr/lib/gentoolkit/pym")
+    import gentoolkit
+    import gentoolkit.query
+    return gentoolkit
+
+
+class LazyEnvironment(DictMixin):
+    """Mapping proxy to :func:`get_env`, portage is not touched
+    until an item is accessed.
+    """
+
+    def __repr__(self):
+        return "<LazyEnvironment %s>" % ("loaded" if _portage else "not loaded")
+
+    def __getitem__(self, key):
+        return get_env()[key]
+
+    def __setitem__(self, key, value):
+        get_env()[key] = value
+
+    def __delitem__(self, key):
+        del get_env()[key]
+
+    def __contains__(self, key):
+        return key in get_env()
+
+    def __iter__(self):
+        return iter(get_env())
+
+    def keys(self):
+        return get_env().keys()
+
+
+ENV = LazyEnvironment()
+
+
+def get_mtime(path):
+    """Return modification time of `path` or None if it does not exist"""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class FileBackedIndex(object):
+    """Base class for in-memory indexes built from files on disk.
+
+    Subclasses implement :meth:`signature` (cheap description of files
+    the index was built from, usually their modification times) and
+    :meth:`load`. The index is rebuilt when signature changes, signature
+    is computed at most every :attr:`CHECK_INTERVAL` seconds.
+
+    """
+    __metaclass__ = ABCMeta
+    CHECK_INTERVAL = 1.0
+
+    def __init__(self):
+        self._signature = None
+        self._checked = 0
+        self._lock = threading.RLock()
+
+    @abstractmethod
+    def signature(self):
+        """Return value that changes when the index must be rebuilt"""
+
+    @abstractmethod
+    def load(self, signature):
+        """(Re)build the index"""
+
+    def is_outdated(self):
+        """Cheap check run on every access, return True to
+        compute the signature before :attr:`CHECK_INTERVAL` passes.
+        """
+        return False
+
+    def refresh(self, force=False):
+        """Rebuild the index if files it was built from changed.
+
+        :param force: Check signature even if
+            :attr:`CHECK_INTERVAL` did not pass yet
+        :type force: bool
+
+        """
+        now = time.time()
+        if not force and self._signature is not None \
+                and now - self._checked < self.CHECK_INTERVAL \
+                and not self.is_outdated():
+            return
+
+        with self._lock:
+            self._checked = now
+            signature = self.signature()
+            if signature != self._signature:
+                self.load(signature)
+                self._signature = signature
+
+
+class LicenseRegistry(FileBackedIndex):
+    """Index of license names found in ``licenses`` directory of
+    portage trees. Directory listings are read once and reread only
+    when modification time of a directory changes, so lookups during
+    bulk runs are in-memory.
+
+    :param trees: Paths to portage trees, defaults to paths
+        of :class:`OverlayRegistry`
+    :type trees: list of strings
+
+    """
+
+    def __init__(self, trees=None):
+        super(LicenseRegistry, self).__init__()
+        self._trees = trees
+        self._licenses = frozenset()
+
+    def __repr__(self):
+        return "<LicenseRegistry licenses(%d)>" % len(self._licenses)
+
+    def __contains__(self, license):
+        self.refresh()
+        return license in self._licenses
+
+    def __iter__(self):
+        self.refresh()
+        return iter(self._licenses)
+
+    def __len__(self):
+        self.refresh()
+        return len(self._licenses)
+
+    @property
+    def directories(self):
+        """``licenses`` directories of all trees"""
+        trees = self._trees
+        if trees is None:
+            trees = PortageUtils.get_overlay_registry().paths()
+        return [os.path.join(tree, 'licenses') for tree in trees]
+
+    def has_directory(self):
+        """Return True if any of the trees has a ``licenses`` directory"""
+        self.refresh()
+        return any(mtime is not None for path, mtime in self._signature)
+
+    def signature(self):
+        return [(path, get_mtime(path)) for path in self.directories]
+
+    def load(self, signature):
+        licenses = set()
+        for path, mtime in signature:
+            if mtime is not None:
+                licenses.update(os.listdir(path))
+        log.debug("LicenseRegistry: loaded %d licenses from %s",
+            len(licenses), [path for path, mtime in signature])
+        self._licenses = frozenset(licenses)
+
+
+class Overlay(object):
+    """Portage tree (main tree or an overlay) and its metadata.
+
+    :param name: Repository name
+    :type name: string
+    :param path: Absolute path to the tree
+    :type path: string
+    :param layout: Parsed ``metadata/layout.conf``
+    :type layout: dict
+
+    """
+
+    def __init__(self, name, path, layout=None):
+        self.name = name
+        self.path = path
+        self.layout = layout or {}
+
+    def __repr__(self):
+        return "<Overlay %s (%s)>" % (self.name, self.path)
+
+    @property
+    def masters(self):
+        """Names of master repositories from layout.conf"""
+        return self.layout.get('masters', '').split()
+
+    @property
+    def manifest_hashes(self):
+        """Manifest hash functions from layout.conf"""
+        return self.layout.get('manifest-hashes', '').split()
+
+    @property
+    def thin_manifests(self):
+        """True if Manifests contain only DIST entries"""
+        return self.layout.get('thin-manifests', 'false').strip().lower() == 'true'
+
+    @classmethod
+    def read_repo_name(cls, path):
+        """Return repository name from profiles/repo_name or None"""
+        try:
+            with open(os.path.join(path, 'profiles/repo_name')) as f:
+                return f.readline().strip()
+        except (OSError, IOError):
+            return None
+
+    @classmethod
+    def read_layout(cls, path):
+        """Parse ``key = value`` lines of metadata/layout.conf
+
+        :returns: layout.conf settings, empty if file is missing
+        :rtype: dict
+
+        """
+        layout = {}
+        try:
+            f = open(os.path.join(path, 'metadata/layout.conf'))
+        except (OSError, IOError):
+            return layout
+        with f:
+            for line in f:
+                line = line.split('#', 1)[0]
+                if '=' in line:
+                    key, value = line.split('=', 1)
+                    layout[key.strip()] = value.strip().strip('"\'')
+        return layout
+
+
+class OverlayRegistry(FileBackedIndex):
+    """Mapping of repository names to :class:`Overlay` instances,
+    built from ``PORTDIR``, ``PORTDIR_OVERLAY`` and ``repos.conf``.
+
+    Rebuilt when the environment variables change or when any of
+    repos.conf, profiles/repo_name or metadata/layout.conf files
+    is modified. Trees from the environment take precedence over
+    repos.conf entries of the same name.
+
+    :param repos_conf: Path to repos.conf file or directory, defaults
+        to ``${PORTAGE_CONFIGROOT}/etc/portage/repos.conf``
+    :type repos_conf: string
+
+    """
+    TREE_FILES = ['profiles/repo_name', 'metadata/layout.conf']
+
+    def __init__(self, repos_conf=None):
+        super(OverlayRegistry, self).__init__()
+        self._repos_conf = repos_conf
+        self._overlays = {}
+        self._environ = None
+
+    def __repr__(self):
+        return "<OverlayRegistry %s>" % " ".join(sorted(self._overlays))
+
+    def __contains__(self, name):
+        self.refresh()
+        return name in self._overlays
+
+    def __getitem__(self, name):
+        self.refresh()
+        return self._overlays[name]
+
+    def names(self):
+        """Return names of all repositories"""
+        self.refresh()
+        return self._overlays.keys()
+
+    def paths(self):
+        """Return paths of all repositories"""
+        self.refresh()
+        return [overlay.path for overlay in self._overlays.itervalues()]
+
+    def as_dict(self):
+        """Return dict of repository names with their paths"""
+        self.refresh()
+        return dict((name, overlay.path) for name, overlay in self._overlays.iteritems())
+
+    @property
+    def repos_conf(self):
+        """Path to repos.conf file or directory"""
+        if self._repos_conf is None:
+            return os.path.join(ENV.get('PORTAGE_CONFIGROOT', '/'), 'etc/portage/repos.conf')
+        return self._repos_conf
+
+    def repos_conf_files(self):
+        """Return repos.conf files in order of parsing"""
+        path = self.repos_conf
+        if os.path.isdir(path):
+            return [os.path.join(path, f) for f in sorted(os.listdir(path))
+                if not f.startswith('.')]
+        elif os.path.exists(path):
+            return [path]
+        return []
+
+    def environ(self):
+        """Return environment variables the registry depends on"""
+        return ENV['PORTDIR'], ENV.get('PORTDIR_OVERLAY', '')
+
+    def is_outdated(self):
+        return self.environ() != self._environ
+
+    def read_repos_conf(self):
+        """Return (name, location) pairs from repos.conf"""
+        config = SafeConfigParser()
+        config.read(self.repos_conf_files())
+        repos = []
+        for section in config.sections():
+            if config.has_option(section, 'location'):
+                repos.append((section, config.get(section, 'location')))
+        return repos
+
+    def signature(self):
+        portdir, portdir_overlay = environ = self.environ()
+        trees = [location for name, location in self.read_repos_conf()]
+        trees += [portdir] + [os.path.realpath(t) for t in portdir_overlay.split()]
+        files = self.repos_conf_files() + [self.repos_conf]
+        for tree in trees:
+            files.extend(os.path.join(tree, f) for f in self.TREE_FILES)
+        return environ, [(path, get_mtime(path)) for path in files]
+
+    def load(self, signature):
+        self._environ, mtimes = signature
+        portdir, portdir_overlay = self._environ
+        overlays = {}
+
+        for name, location in self.read_repos_conf():
+            name = Overlay.read_repo_name(location) or name
+            overlays[name] = Overlay(name, location, Overlay.read_layout(location))
+
+        for path in [portdir] + [os.path.realpath(t) for t in portdir_overlay.split()]:
+            repo_name = Overlay.read_repo_name(path)
+            if repo_name is None:
+                log.warn("No '%s', skipping" % os.path.join(path, 'profiles/repo_name'))
+                continue
+            overlays[repo_name] = Overlay(repo_name, path, Overlay.read_layout(path))
+
+        log.debug("OverlayRegistry: loaded %r", overlays)
+        self._overlays = overlays
+
+
+class InstalledPackagesIndex(FileBackedIndex):
+    """Index of installed packages in portage's package database
+    (``/var/db/pkg``), mapping ``category/pn`` to installed
+    versions and slots.
+
+    Rebuilt when portage's merge counter, the database directory or
+    any of its category directories changes.
+
+    :param vdb_path: Path to the package database, defaults to
+        ``${ROOT}/var/db/pkg``
+    :type vdb_path: string
+    :param counter_path: Path to portage's merge counter, defaults to
+        ``${ROOT}/var/cache/edb/counter``
+    :type counter_path: string
+
+    """
+    CPN_RE = re.compile(r'([A-Za-z0-9+_][A-Za-z0-9+_.-]*/[A-Za-z0-9+_][A-Za-z0-9+_-]*)')
+
+    def __init__(self, vdb_path=None, counter_path=None):
+        super(InstalledPackagesIndex, self).__init__()
+        self._vdb_path = vdb_path
+        self._counter_path = counter_path
+        self._packages = {}
+
+    def __repr__(self):
+        return "<InstalledPackagesIndex packages(%d)>" % len(self._packages)
+
+    def __contains__(self, cpn):
+        return bool(self.versions(cpn))
+
+    @property
+    def vdb_path(self):
+        """Path to the package database"""
+        if self._vdb_path is None:
+            return os.path.join(ENV.get('ROOT', '/'), 'var/db/pkg')
+        return self._vdb_path
+
+    @property
+    def counter_path(self):
+        """Path to portage's merge counter"""
+        if self._counter_path is None:
+            return os.path.join(ENV.get('ROOT', '/'), 'var/cache/edb/counter')
+        return self._counter_path
+
+    def signature(self):
+        counter = None
+        try:
+            with open(self.counter_path) as f:
+                counter = f.read().strip()
+        except (OSError, IOError):
+            pass
+
+        vdb = self.vdb_path
+        try:
+            categories = sorted(os.listdir(vdb))
+        except OSError:
+            categories = []
+        return counter, get_mtime(vdb), \
+            [(c, get_mtime(os.path.join(vdb, c))) for c in categories]
+
+    def load(self, signature):
+        packages = {}
+        for category, mtime in signature[2]:
+            category_path = os.path.join(self.vdb_path, category)
+            if mtime is None or not os.path.isdir(category_path):
+                continue
+            for pf in os.listdir(category_path):
+                if pf.startswith('-MERGING-'):
+                    continue
+                parts = pkgsplit(pf)
+                if not parts:
+                    continue
+                pn, pv, rev = parts
+                if rev != 'r0':
+                    pv = '%s-%s' % (pv, rev)
+                try:
+                    with open(os.path.join(category_path, pf, 'SLOT')) as f:
+                        slot = f.read().strip()
+                except (OSError, IOError):
+                    slot = '0'
+                packages.setdefault('%s/%s' % (category, pn), []).append((pv, slot))
+
+        for installed in packages.itervalues():
+            installed.sort(cmp=lambda a, b: vercmp(a[0], b[0]), reverse=True)
+        log.debug("InstalledPackagesIndex: loaded %d packages", len(packages))
+        self._packages = packages
+
+    @classmethod
+    def get_cpn(cls, atom):
+        """Extract ``category/pn`` from an unversioned atom,
+        USE dependencies and conditionals are ignored.
+
+        :param atom: Portage atom without version
+        :type atom: string
+        :returns: category/pn or None
+
+        **Example:**
+
+        >>> InstalledPackagesIndex.get_cpn('test? ( dev-python/foo[bar] )')
+        'dev-python/foo'
+
+        """
+        match = cls.CPN_RE.search(atom)
+        if match:
+            return match.group(1)
+
+    def versions(self, cpn):
+        """Return installed (version, slot) pairs, highest version first
+
+        :param cpn: category/pn or an atom
+        :type cpn: string
+        :rtype: list
+
+        """
+        self.refresh()
+        installed = self._packages.get(cpn)
+        if installed is None:
+            installed = self._packages.get(self.get_cpn(cpn), [])
+        return list(installed)
+
+    def get_versions(self, cpns):
+        """Batch lookup of highest installed versions.
+
+        :param cpns: category/pn strings or atoms
+        :type cpns: iterable
+        :returns: cpn -> version or None if not installed
+        :rtype: dict
+
+        """
+        self.refresh()
+        result = {}
+        for cpn in cpns:
+            installed = self.versions(cpn)
+            result[cpn] = installed[0][0] if installed else None
+        return result
 
 
 class PortageUtils(object):
     """"""
+    _license_registry = None
+    _overlay_registry = None
+    _installed_index = None
+
+    @classmethod
+    def get_porttrees(cls):
+        """Return PORTDIR and PORTDIR_OVERLAY paths
+
+        :returns: list of paths, PORTDIR first
+        :rtype: list
+
+        """
+        return [ENV['PORTDIR']] + \
+            [os.path.realpath(t) for t in ENV["PORTDIR_OVERLAY"].split()]
+
+    @classmethod
+    def get_license_registry(cls):
+        """Return process-wide :class:`LicenseRegistry`
+        of PORTDIR and overlays.
+
+        """
+        if cls._license_registry is None:
+            cls._license_registry = LicenseRegistry()
+        return cls._license_registry
+
+    @classmethod
+    def get_overlay_registry(cls):
+        """Return process-wide :class:`OverlayRegistry`"""
+        if cls._overlay_registry is None:
+            cls._overlay_registry = OverlayRegistry()
+        return cls._overlay_registry
 
     @classmethod
     def get_all_overlays(cls):
@@ -47,17 +581,22 @@ class PortageUtils(object):
         :returns: dict with repoman/paths
 
         """
-        porttrees = [ENV['PORTDIR']] + \
-            [os.path.realpath(t) for t in ENV["PORTDIR_OVERLAY"].split()]
-        treemap = {}
-        for path in porttrees:
-            repo_name_path = os.path.join(path, 'profiles/repo_name')
-            try:
-                repo_name = open(repo_name_path, 'r').readline().strip()
-                treemap[repo_name] = path
-            except (OSError, IOError):
-                log.warn("No '%s', skipping" % os.path.join(path, 'profiles/repo_name'))
-        return treemap
+        return cls.get_overlay_registry().as_dict()
+
+    @classmethod
+    def get_overlay(cls, overlay_name):
+        """Return :class:`Overlay` with metadata for overlay name.
+
+        :param overlay_name: Name of the overlay
+        :rtype: :class:`Overlay`
+        :raises: :exc:`gpypi.exc.GPyPiOverlayDoesNotExist`
+
+        """
+        registry = cls.get_overlay_registry()
+        if overlay_name not in registry:
+            raise GPyPiOverlayDoesNotExist('"%s". Available: %s' \
+                % (overlay_name, " ".join(registry.names())))
+        return registry[overlay_name]
 
     @classmethod
     def get_overlay_path(cls, overlay_name):
@@ -72,33 +611,62 @@ class PortageUtils(object):
         """
         # TODO: example for local, main and third party overlay
 
-        overlays = cls.get_all_overlays()
-        if overlay_name in overlays:
-            overlay_path = overlays[overlay_name]
-        else:
-            raise GPyPiOverlayDoesNotExist('"%s". Available: %s' \
-                % (overlay_name, " ".join(overlays.keys())))
-        return overlay_path
+        return cls.get_overlay(overlay_name).path
+
+    @classmethod
+    def package_overlays(cls, cpn):
+        """Return names of repositories with ebuilds of a package
+
+        :param cpn: category/pn
+        :type cpn: string
+        :rtype: list
+
+        """
+        names = []
+        for name, path in sorted(cls.get_all_overlays().iteritems()):
+            try:
+                files = os.listdir(os.path.join(path, cpn))
+            except OSError:
+                continue
+            if any(f.endswith('.ebuild') for f in files):
+                names.append(name)
+        return names
+
+    @classmethod
+    def get_installed_index(cls):
+        """Return process-wide :class:`InstalledPackagesIndex`"""
+        if cls._installed_index is None:
+            cls._installed_index = InstalledPackagesIndex()
+        return cls._installed_index
 
     @classmethod
     def get_installed_ver(cls, cpn):
         """
         Return PV for installed version of package
 
-        :param cpn: cat/pkg-ver
+        :param cpn: cat/pkg, optionally with USE dependencies or conditional
         :type cpn: string
         :returns: string version or None if not pkg installed
 
         """
-        try:
-            #Return first version installed
-            #XXX Log warning if more than one installed (SLOT)?
-            pkg = gentoolkit.find_installed_packages(cpn, masked=True)[0]
-            return pkg.get_version()
-        except:
-            return
+        #Return highest version installed
+        #XXX Log warning if more than one installed (SLOT)?
+        return cls.get_installed_vers([cpn])[cpn]
 
     @classmethod
+    def get_installed_vers(cls, cpns):
+        """
+        Return PV for installed versions of many packages
+
+        :param cpns: cat/pkg strings
+        :type cpns: iterable
+        :returns: dict of cpn -> string version or None if not pkg installed
+
+        """
+        return cls.get_installed_index().get_versions(cpns)
+
+    @classmethod
+    @memoize(10000)
     def is_valid_atom(cls, atom):
         """
         Return True if atom is valid portage =category/pn-pv.
@@ -115,7 +683,7 @@ class PortageUtils(object):
         False
 
         """
-        return bool(portage_dep.isvalidatom(atom))
+        return isvalidatom(atom)
 
     @classmethod
     def ebuild_exists(cls, cat_pkg):
@@ -132,19 +700,23 @@ class PortageUtils(object):
         True
 
         """
-        pkgs = gentoolkit.query.Query(cat_pkg).find()
+        pkgs = get_gentoolkit().query.Query(cat_pkg).find()
         if len(pkgs):
             return True
         else:
             return False
 
     @classmethod
-    def unpack_ebuild(cls, ebuild_path):
+    @traced('ebuild.unpack')
+    def unpack_ebuild(cls, ebuild_path, phases="digest setup clean unpack"):
         """
         Use portage to unpack an ebuild.
 
         :param ebuild_path: full path to ebuild
         :type ebuild_path: string
+        :param phases: ebuild phases to run, fetching and unpacking
+            can be run separately (``digest`` and ``setup clean unpack``)
+        :type phases: string
         :returns: None if succeed, raises OSError if fails to unpack
         :raises: :exc:`gpypi.exc.GPyPiCouldNotUnpackEbuild`
 
@@ -154,7 +726,7 @@ class PortageUtils(object):
             use Python API.
 
         """
-        (status, output) = commands.getstatusoutput("ebuild %s digest setup clean unpack" % ebuild_path)
+        (status, output) = commands.getstatusoutput("ebuild %s %s" % (ebuild_path, phases))
         if status:
             # Portage's error message, sometimes.
             # Couldn't determine PN or PV so we misnamed ebuild
@@ -164,6 +736,28 @@ class PortageUtils(object):
                 os.unlink(ebuild_path)
             raise GPyPiCouldNotUnpackEbuild(output)
 
+    @classmethod
+    def manifest_dist_sizes(cls, ebuild_dir):
+        """
+        Read sizes of distfiles from Manifest of a package.
+
+        :param ebuild_dir: directory with ebuilds and Manifest
+        :type ebuild_dir: string
+        :returns: file name -> size in bytes, empty if there is no Manifest
+        :rtype: dict
+
+        """
+        sizes = {}
+        try:
+            with open(os.path.join(ebuild_dir, 'Manifest')) as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) > 2 and fields[0] == 'DIST' and fields[2].isdigit():
+                        sizes[fields[1]] = int(fields[2])
+        except (OSError, IOError):
+            pass
+        return sizes
+
     @classmethod
     def find_s_dir(cls, p, cat):
         """
@@ -251,6 +845,12 @@ class PortageUtils(object):
         """
         return ENV["PORTDIR"]
 
+    @classmethod
+    def get_distdir(cls):
+        """Return DISTDIR from /etc/make.conf
+        """
+        return ENV["DISTDIR"]
+
     @classmethod
     def get_keyword(cls):
         """Return ARCH from portage environment or None
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Timing spans
+============
+
+Lightweight tracing of where time goes while creating ebuilds
+(``gpypi --profile``). Code marks interesting parts with :func:`span`
+or :func:`traced`, spans nest and are attributed to the package
+of the outermost span. When profiling is disabled a span is a shared
+no-op context manager, so instrumentation costs a function call.
+
+Example::
+
+    >>> profiler.enable()
+    >>> with span('do_ebuild', package='foobar'):
+    ...     with span('pypi.versions'):
+    ...         pass
+    >>> print profiler.report()[1]
+    foobar:
+    >>> profiler.disable()
+
+"""
+
+import time
+import logging
+import functools
+import threading
+from collections import OrderedDict
+
+log = logging.getLogger(__name__)
+
+
+class _NullSpan(object):
+    """Span used when profiling is disabled"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def exclude(self, seconds):
+        pass
+
+
+class Span(object):
+    """Measures time between entering and exiting the context.
+
+    :param profiler: Where to record elapsed time
+    :type profiler: :class:`Profiler`
+    :param name: Name of the span
+    :type name: string
+    :param package: Package the span belongs to, defaults
+        to the package of enclosing span
+    :type package: string
+
+    """
+
+    def __init__(self, profiler, name, package=None):
+        self.profiler = profiler
+        self.name = name
+        self.package = package
+        self.path = name
+        self.start = None
+        self.excluded = 0.0
+
+    def __enter__(self):
+        stack = self.profiler.stack()
+        if stack:
+            parent = stack[-1]
+            self.package = self.package or parent.package
+            self.path = parent.path + '/' + self.name
+        stack.append(self)
+        self.profiler.register(self.package, self.path)
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.time() - self.start - self.excluded
+        self.profiler.stack().pop()
+        self.profiler.record(self.package, self.path, elapsed)
+        return False
+
+    def exclude(self, seconds):
+        """Don't count `seconds` spent outside of the measured code,
+        e.g. while a generator waits for its consumer"""
+        self.excluded += seconds
+
+
+class Profiler(object):
+    """Collects timings of spans per package.
+
+    :attr:`timings` -- (package, path) -> [count, total, max] where path
+    is names of enclosing spans joined by ``/``
+
+    """
+    NULL_SPAN = _NullSpan()
+
+    def __init__(self):
+        self.enabled = False
+        self.timings = OrderedDict()
+        self.dump_path = None
+        self._cprofile = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def __repr__(self):
+        return "<Profiler enabled(%s) spans(%d)>" % (self.enabled, len(self.timings))
+
+    def enable(self, dump_path=None):
+        """Start collecting spans.
+
+        :param dump_path: Also run :mod:`cProfile` and dump
+            :mod:`pstats` data to this file in :meth:`finish`
+        :type dump_path: string
+
+        """
+        self.enabled = True
+        self.dump_path = dump_path
+        if dump_path:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def disable(self):
+        """Stop collecting spans and forget collected timings"""
+        self.enabled = False
+        self.timings.clear()
+
+    def finish(self):
+        """Stop profiling, dump :mod:`cProfile` stats if requested.
+        Collected timings are kept until :meth:`disable`.
+
+        :returns: :meth:`report` lines
+        :rtype: list of strings
+
+        """
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.dump_path)
+            self._cprofile = None
+            log.info("cProfile stats written to %s (python -m pstats %s)",
+                self.dump_path, self.dump_path)
+        self.enabled = False
+        return self.report()
+
+    def span(self, name, package=None):
+        """Return context manager measuring time spent in it"""
+        if not self.enabled:
+            return self.NULL_SPAN
+        return Span(self, name, package)
+
+    def stack(self):
+        """Return spans entered in current thread"""
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def register(self, package, path):
+        """Reserve place for a span, so reports list
+        parents before their children"""
+        with self._lock:
+            self.timings.setdefault((package, path), [0, 0.0, 0.0])
+
+    def record(self, package, path, elapsed):
+        """Add time spent in a span"""
+        with self._lock:
+            timing = self.timings.setdefault((package, path), [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+    def aggregate(self):
+        """Sum timings of all packages.
+
+        :returns: path -> [count, total, max]
+        :rtype: :class:`collections.OrderedDict`
+
+        """
+        aggregated = OrderedDict()
+        with self._lock:
+            for (package, path), (count, total, maximum) in self.timings.items():
+                timing = aggregated.setdefault(path, [0, 0.0, 0.0])
+                timing[0] += count
+                timing[1] += total
+                timing[2] = max(timing[2], maximum)
+        return aggregated
+
+    def report(self):
+        """Return per package and aggregated timings
+
+        :rtype: list of strings
+
+        """
+        lines = ["Profile per package:"]
+        current = object()
+        with self._lock:
+            timings = self.timings.items()
+        for (package, path), (count, total, maximum) in timings:
+            if package != current:
+                current = package
+                lines.append("%s:" % (package or "(no package)"))
+            depth = path.count('/')
+            lines.append("  %-40s %8.3fs" % ("  " * depth + path.rsplit('/', 1)[-1], total))
+
+        lines.append("Aggregate:")
+        lines.append("  %-40s %6s %9s %9s %9s" % ("span", "count", "total", "mean", "max"))
+        for path, (count, total, maximum) in self.aggregate().items():
+            lines.append("  %-40s %6d %8.3fs %8.3fs %8.3fs" % (path, count, total,
+                total / (count or 1), maximum))
+        return lines
+
+
+#: process-wide profiler, enabled by ``gpypi --profile``
+profiler = Profiler()
+
+
+def span(name, package=None):
+    """Measure a block with the process-wide :data:`profiler`.
+
+    :param name: Name of the span
+    :type name: string
+    :param package: Package the span belongs to, defaults
+        to the package of enclosing span
+    :type package: string
+
+    """
+    return profiler.span(name, package)
+
+
+def traced(name):
+    """Decorator measuring each call of a function as a span"""
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            with profiler.span(name):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Reverse dependency index
+========================
+
+Each time gpypi writes an analyzed ebuild to an overlay, its DEPEND
+and RDEPEND atoms are recorded in a sqlite database (``rdeps.db`` in
+``cache_dir``). ``gpypi rdeps PKG`` then lists generated
+ebuilds depending on a package without reading the overlay, and
+``--regenerate`` writes just those ebuilds again.
+
+Entries of ebuilds that were removed from the overlay are dropped
+when they are looked up.
+
+"""
+
+import os
+import logging
+import sqlite3
+import threading
+
+from gpypi.atom import pkgsplit
+from gpypi.exc import *
+
+log = logging.getLogger(__name__)
+_local = threading.local()
+
+INDEX_NAME = 'rdeps.db'
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ebuilds (
+    path TEXT PRIMARY KEY,
+    cpn TEXT NOT NULL,
+    pf TEXT NOT NULL,
+    up_pn TEXT NOT NULL,
+    up_pv TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dependencies (
+    path TEXT NOT NULL,
+    dependency TEXT NOT NULL,
+    pn TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    atom TEXT NOT NULL,
+    PRIMARY KEY (path, kind, atom)
+);
+CREATE INDEX IF NOT EXISTS dependencies_dependency ON dependencies (dependency);
+CREATE INDEX IF NOT EXISTS dependencies_pn ON dependencies (pn);
+"""
+
+
+def atom_cpn(atom):
+    """Return ``category/pn`` of a dependency atom, None if
+    it has none
+
+    **Example:**
+
+    >>> atom_cpn('>=dev-python/foo-bar-1.0_rc1')
+    'dev-python/foo-bar'
+    >>> atom_cpn('test? ( dev-python/nose[coverage] )')
+    'dev-python/nose'
+
+    """
+    from gpypi.portage_utils import InstalledPackagesIndex
+
+    cpn = InstalledPackagesIndex.get_cpn(atom)
+    if cpn is None:
+        return None
+    category, pn = cpn.split('/', 1)
+    parts = pkgsplit(pn)
+    if parts:
+        pn = parts[0]
+    return '%s/%s' % (category, pn)
+
+
+class ReverseDependencyIndex(object):
+    """Dependencies of written ebuilds, searchable by dependency.
+
+    :param path: sqlite database, created if missing
+    :type path: string
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.db = sqlite3.connect(path, timeout=30)
+            self.db.executescript(SCHEMA)
+        except (OSError, sqlite3.Error), e:
+            raise GPyPiConfigurationError("Could not open reverse dependency index %s: %s"
+                % (path, e))
+        self.db.text_factory = str
+
+    def __repr__(self):
+        return "<ReverseDependencyIndex %s>" % self.path
+
+    @classmethod
+    def from_config(cls, config):
+        """Return index in ``cache_dir`` of `config`"""
+        return cls(os.path.join(config.cache_dir, INDEX_NAME))
+
+    @classmethod
+    def shared(cls, path):
+        """Return index at `path` opened once per thread, sqlite
+        connections can't be shared between threads"""
+        indexes = _local.__dict__.setdefault('indexes', {})
+        if path not in indexes:
+            indexes[path] = cls(path)
+        return indexes[path]
+
+    def close(self):
+        self.db.close()
+
+    def update(self, ebuild):
+        """Replace recorded dependencies of written `ebuild`
+
+        :type ebuild: :class:`gpypi.ebuild.Ebuild`
+
+        """
+        path = os.path.abspath(ebuild.ebuild_path)
+        ebuild_dir, filename = os.path.split(path)
+        category_dir, pn = os.path.split(ebuild_dir)
+        cpn = '%s/%s' % (os.path.basename(category_dir), pn)
+        rows = []
+        for kind in ('depend', 'rdepend'):
+            for atom in ebuild[kind]:
+                dependency = atom_cpn(atom)
+                if dependency is not None:
+                    rows.append((path, dependency, dependency.split('/', 1)[1], kind, atom))
+
+        with self.db:
+            self.forget(path)
+            self.db.execute("INSERT INTO ebuilds VALUES (?, ?, ?, ?, ?)", (path, cpn,
+                os.path.splitext(filename)[0], ebuild.options.up_pn, ebuild.options.up_pv))
+            self.db.executemany("INSERT OR IGNORE INTO dependencies VALUES (?, ?, ?, ?, ?)", rows)
+
+    def forget(self, path):
+        """Drop entries of ebuild `path`"""
+        self.db.execute("DELETE FROM ebuilds WHERE path = ?", (path,))
+        self.db.execute("DELETE FROM dependencies WHERE path = ?", (path,))
+
+    def dependants(self, package, recursive=False):
+        """Return ebuilds depending on `package`
+
+        :param package: ``category/pn`` or ``pn`` in any category
+        :type package: string
+        :param recursive: Include ebuilds depending on them, and so on
+        :type recursive: bool
+        :returns: dicts with ``path``, ``cpn``, ``pf``, ``up_pn``,
+            ``up_pv`` and ``atoms`` (dependency atoms on package),
+            ordered by package and file name
+        :rtype: list
+
+        """
+        found = {}
+        queue = [package]
+        seen = set(queue)
+        while queue:
+            package = queue.pop(0)
+            if '/' in package:
+                where, value = "d.dependency = ?", package
+            else:
+                where, value = "d.pn = ?", package
+            rows = self.db.execute("SELECT e.path, e.cpn, e.pf, e.up_pn, e.up_pv, d.atom "
+                "FROM dependencies AS d JOIN ebuilds AS e ON e.path = d.path "
+                "WHERE " + where, (value,)).fetchall()
+            for path, cpn, pf, up_pn, up_pv, atom in rows:
+                if not os.path.exists(path):
+                    with self.db:
+                        self.forget(path)
+                    continue
+                entry = found.setdefault(path, {'path': path, 'cpn': cpn, 'pf': pf,
+                    'up_pn': up_pn, 'up_pv': up_pv, 'atoms': []})
+                if atom not in entry['atoms']:
+                    # same atom may be in both DEPEND and RDEPEND
+                    entry['atoms'].append(atom)
+                if recursive and cpn not in seen:
+                    seen.add(cpn)
+                    queue.append(cpn)
+        return sorted(found.values(), key=lambda entry: (entry['cpn'], entry['pf']))
+
+
+def record_ebuild(ebuild):
+    """Record dependencies of written `ebuild` in the index of
+    its configuration (:meth:`ReverseDependencyIndex.shared`),
+    failures are only logged"""
+    try:
+        path = os.path.join(ebuild.options.cache_dir, INDEX_NAME)
+        ReverseDependencyIndex.shared(path).update(ebuild)
+    except (GPyPiException, sqlite3.Error), e:
+        log.warn("Reverse dependency index not updated: %s", e)
@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local package search
+====================
+
+``gpypi search QUERY`` finds :term:`PyPi` projects offline, using an
+inverted index over metadata in :class:`gpypi.store.MetadataStore`:
+project name, summary, keywords and classifiers of the highest
+version. The index lives in the same sqlite database and is updated
+before each search with projects imported since the last one.
+
+Hits are ranked by number of matched query terms, then by weight of
+the fields they matched in (:data:`WEIGHTS`), exact project name
+first.
+
+"""
+
+import re
+import json
+import logging
+
+from gpypi.mirror import normalize
+
+log = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_terms (
+    term TEXT NOT NULL,
+    key TEXT NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (term, key)
+);
+CREATE INDEX IF NOT EXISTS search_terms_key ON search_terms (key);
+CREATE INDEX IF NOT EXISTS search_terms_weight ON search_terms (term, weight);
+CREATE TABLE IF NOT EXISTS search_docs (
+    key TEXT PRIMARY KEY,
+    summary TEXT NOT NULL
+);
+"""
+#: weight of a term in each indexed field
+WEIGHTS = {
+    'name': 10,
+    'keywords': 4,
+    'summary': 2,
+    'classifiers': 1,
+}
+#: weight of normalized project name matching normalized query
+EXACT_NAME_WEIGHT = 50
+#: postings of each query term considered, highest weight first,
+#: so terms common to most projects don't slow searches down
+CANDIDATES = 1000
+STOP_WORDS = frozenset('a an and for in is of on or the to with'.split())
+
+
+def tokenize(text):
+    """Return search terms of `text`
+
+    **Example:**
+
+    >>> tokenize('Zope.Interface for Python 2.x')
+    ['zope', 'interface', 'python']
+
+    """
+    return [term for term in re.findall(r'[a-z0-9]+', (text or '').lower())
+        if len(term) > 1 and term not in STOP_WORDS]
+
+
+class SearchIndex(object):
+    """Inverted index over projects of a metadata store.
+
+    :param store: Store to index and search
+    :type store: :class:`gpypi.store.MetadataStore`
+
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.db = store.db
+        self.db.executescript(SCHEMA)
+
+    def __repr__(self):
+        return "<SearchIndex %s>" % self.store.path
+
+    @classmethod
+    def document(cls, name, release_data):
+        """Return weight of each term of a project
+
+        **Example:**
+
+        >>> sorted(SearchIndex.document('Foo.Bar', {'summary': 'Bar tool',
+        ...     'keywords': 'tool', 'classifiers': ['Topic :: Utilities']}).items())
+        [('bar', 12), ('foo', 10), ('foo-bar', 50), ('tool', 6), ('topic', 1), ('utilities', 1)]
+
+        """
+        keywords = release_data.get('keywords') or ''
+        if not isinstance(keywords, basestring):
+            keywords = " ".join(keywords)
+        fields = {
+            'name': name,
+            'keywords': keywords,
+            'summary': release_data.get('summary') or '',
+            'classifiers': " ".join(release_data.get('classifiers') or []),
+        }
+        terms = {}
+        for field, text in fields.iteritems():
+            for term in set(tokenize(text)):
+                terms[term] = terms.get(term, 0) + WEIGHTS[field]
+        exact = normalize(name)
+        terms[exact] = terms.get(exact, 0) + EXACT_NAME_WEIGHT
+        return terms
+
+    def latest_release_data(self, key):
+        """Return release data of the highest version of project `key`"""
+        from gpypi.versions import highest_version
+
+        releases = dict(self.db.execute("SELECT version, release_data FROM releases "
+            "WHERE key = ?", (key,)))
+        version = highest_version(releases.keys())
+        return json.loads(releases[version]) if version else {}
+
+    def category(self, name):
+        """Return Portage category gpypi would give project `name`,
+        from classifiers of its highest version"""
+        from gpypi.classifiers import ClassifierIndex
+
+        release_data = self.latest_release_data(normalize(name))
+        info = ClassifierIndex.default().resolve(release_data.get('classifiers') or [])
+        return info['category'] or 'dev-python'
+
+    def update(self, full=False):
+        """Index projects imported since last update.
+
+        :param full: Rebuild the whole index
+        :type full: bool
+        :returns: number of indexed projects
+        :rtype: int
+
+        """
+        with self.db:
+            if full:
+                self.db.execute("DELETE FROM search_terms")
+                self.db.execute("DELETE FROM search_docs")
+                self.db.execute("DELETE FROM changes")
+                keys = [key for (key,) in self.db.execute("SELECT key FROM projects")]
+            else:
+                keys = [key for (key,) in self.db.execute("SELECT key FROM changes")]
+
+            for key in keys:
+                self.db.execute("DELETE FROM search_terms WHERE key = ?", (key,))
+                self.db.execute("DELETE FROM search_docs WHERE key = ?", (key,))
+                row = self.db.execute("SELECT name FROM projects WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    continue
+                release_data = self.latest_release_data(key)
+                terms = self.document(row[0].decode('utf-8'), release_data)
+                self.db.executemany("INSERT INTO search_terms VALUES (?, ?, ?)",
+                    [(term, key, weight) for term, weight in terms.iteritems()])
+                self.db.execute("INSERT INTO search_docs VALUES (?, ?)",
+                    (key, release_data.get('summary') or ''))
+            if not full:
+                self.db.executemany("DELETE FROM changes WHERE key = ?", [(key,) for key in keys])
+        if keys:
+            log.debug("Search index: indexed %d projects", len(keys))
+        return len(keys)
+
+    def search(self, query, limit=20):
+        """Return best matching projects
+
+        :param query: Words to search for
+        :type query: string
+        :param limit: Maximum number of hits
+        :type limit: int
+        :returns: (name, summary) pairs, best match first
+        :rtype: list
+
+        """
+        terms = tokenize(query)
+        exact = normalize(query.strip())
+        if exact and exact not in terms:
+            terms.append(exact)
+        if not terms:
+            return []
+        postings = " UNION ALL ".join(["SELECT * FROM (SELECT key, weight FROM search_terms "
+            "WHERE term = ? ORDER BY weight DESC LIMIT %d)" % CANDIDATES] * len(terms))
+        rows = self.db.execute("""
+            SELECT p.name, d.summary FROM (
+                SELECT key, COUNT(*) AS matched, SUM(weight) AS score
+                FROM (%s) GROUP BY key
+                ORDER BY matched DESC, score DESC, key LIMIT ?
+            ) AS hits
+            JOIN projects AS p ON p.key = hits.key
+            JOIN search_docs AS d ON d.key = hits.key
+            ORDER BY hits.matched DESC, hits.score DESC, hits.key
+            """ % postings, terms + [limit])
+        return rows.fetchall()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+setup.py probe
+==============
+
+:meth:`gpypi.ebuild.Ebuild.post_unpack` runs *setup.py* of a package
+with :func:`run` in its own Python process, started in the unpacked
+sources. The directory change, :data:`sys.path` entry and modules the
+package ships never reach the gpypi process, so other threads of
+``gpypi sync`` are not affected.
+
+The child (``python -m gpypi.setup_probe SETUP_PY RESULT``) imports
+*setup.py* with ``setup()`` of setuptools and distutils replaced and
+writes its keyword arguments to RESULT as JSON, dropping values that
+can't be represented (see :func:`gpypi.lockfile.to_json`).
+
+"""
+
+import os
+import sys
+import json
+import logging
+import tempfile
+from subprocess import Popen, PIPE, STDOUT
+
+from gpypi.exc import *
+
+log = logging.getLogger(__name__)
+
+
+def run(setup_file):
+    """Return keyword arguments *setup.py* passes to ``setup()``
+
+    :param setup_file: *setup.py* in unpacked sources
+    :type setup_file: string
+    :rtype: dict
+    :raises: :exc:`gpypi.exc.GPyPiSetupError` if *setup.py* fails
+
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [root, env.get('PYTHONPATH')]))
+    fd, result = tempfile.mkstemp(prefix='gpypi-setup-', suffix='.json')
+    os.close(fd)
+    try:
+        p = Popen([sys.executable, '-m', 'gpypi.setup_probe', os.path.abspath(setup_file), result],
+            cwd=os.path.dirname(os.path.abspath(setup_file)), env=env, stdout=PIPE, stderr=STDOUT)
+        output = p.communicate()[0]
+        if output:
+            log.debug("Output of %s:\n%s", setup_file, output)
+        if p.returncode != 0:
+            last = output.strip().splitlines()[-1:] or ["exit status %d" % p.returncode]
+            raise GPyPiSetupError("%s failed: %s" % (setup_file, last[0]))
+        with open(result) as f:
+            keywords = json.load(f)
+    finally:
+        os.unlink(result)
+    return dict((str(key), value) for key, value in keywords.iteritems())
+
+
+def main(argv=None):
+    """Entry point of the child process"""
+    import distutils.core
+    import setuptools
+    from gpypi import utils
+    from gpypi.lockfile import to_json
+
+    setup_file, result = (argv or sys.argv[1:])[:2]
+    keywords = {}
+
+    def setup(**kw):
+        keywords.update(kw)
+
+    setuptools.setup = distutils.core.setup = setup
+    utils.import_path(setup_file)
+    with open(result, 'w') as f:
+        json.dump(to_json(keywords), f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Local metadata store
+====================
+
+:class:`MetadataStore` keeps :term:`PyPi` metadata in a sqlite database
+(``metadata.db`` in ``cache_dir``), indexed by :pep:`503` normalized
+project name. ``gpypi metadata import FILE`` loads a dump in one bulk
+operation and ``--offline`` makes ``create``, ``echo`` and ``sync`` read
+versions, download URLs and release data from the store only, without
+any metadata network calls. ``gpypi metadata export FILE`` writes the
+store back out as a dump.
+
+Online ``create``, ``echo`` and ``sync`` write what they get from
+:term:`PyPi` through to the store (:class:`RecordingPyPI`), so packages
+of previous runs are available offline and to ``gpypi search`` without
+importing a dump.
+
+A dump is JSON lines, one project per line::
+
+    {"name": "Foo.Bar", "versions": ["1.0", "1.1"],
+     "releases": {"1.1": {"release_data": {"summary": "..."},
+                          "urls": ["http://pypi.python.org/packages/source/..."],
+                          "requires_dist": ["baz (>=1.0)"]}}}
+
+``requires_dist`` may also be part of ``release_data``.
+
+"""
+
+import os
+import sys
+import json
+import logging
+import sqlite3
+import urlparse
+from contextlib import closing
+
+from gpypi.exc import *
+from gpypi.mirror import normalize, SDIST_EXTENSIONS
+
+log = logging.getLogger(__name__)
+
+STORE_NAME = 'metadata.db'
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    key TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    versions TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS releases (
+    key TEXT NOT NULL,
+    version TEXT NOT NULL,
+    release_data TEXT NOT NULL,
+    urls TEXT NOT NULL,
+    PRIMARY KEY (key, version)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    key TEXT PRIMARY KEY
+);
+"""
+
+
+class MetadataStore(object):
+    """:term:`PyPi` client answering from the local store.
+
+    Offers the part of :class:`yolk.pypi.CheeseShop` gpypi uses.
+    Connections can't be shared between threads, use one store
+    per thread.
+
+    :param path: sqlite database, created if missing
+    :type path: string
+    :param batch_size: rows written at once during :meth:`import_dump`
+    :type batch_size: int
+
+    """
+
+    def __init__(self, path, batch_size=1000):
+        self.path = path
+        self.batch_size = batch_size
+        directory = os.path.dirname(path)
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.db = sqlite3.connect(path)
+            self.db.executescript(SCHEMA)
+        except (OSError, sqlite3.Error), e:
+            raise GPyPiConfigurationError("Could not open metadata store %s: %s" % (path, e))
+        self.db.text_factory = str
+
+    def __repr__(self):
+        return "<MetadataStore %s>" % self.path
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM projects").fetchone()[0]
+
+    @classmethod
+    def from_config(cls, config):
+        """Return store in ``cache_dir`` of `config`"""
+        return cls(os.path.join(config.cache_dir, STORE_NAME))
+
+    def close(self):
+        self.db.close()
+
+    def list_packages(self):
+        """Return names of all projects in the store"""
+        return [name for (name,) in self.db.execute("SELECT name FROM projects ORDER BY key")]
+
+    def query_versions_pypi(self, package_name):
+        """Return (project name, versions) like
+        :meth:`yolk.pypi.CheeseShop.query_versions_pypi`"""
+        row = self.db.execute("SELECT name, versions FROM projects WHERE key = ?",
+            (normalize(package_name),)).fetchone()
+        if row is None:
+            return package_name, []
+        return row[0], json.loads(row[1])
+
+    def _release(self, package_name, version, column):
+        row = self.db.execute("SELECT %s FROM releases WHERE key = ? AND version = ?" % column,
+            (normalize(package_name), version)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def get_download_urls(self, package_name, version="", pkg_type="all"):
+        """Return download URLs of `version`, only sdists
+        if `pkg_type` is ``source``"""
+        urls = self._release(package_name, version, 'urls') or []
+        if pkg_type == 'source':
+            urls = [url for url in urls if urlparse.urlparse(url).path.endswith(tuple(SDIST_EXTENSIONS))]
+        return urls
+
+    def release_data(self, package_name, version):
+        """Return metadata of a release like
+        :meth:`yolk.pypi.CheeseShop.release_data`"""
+        return self._release(package_name, version, 'release_data') or {}
+
+    def record_versions(self, name, versions):
+        """Store versions of project `name`, keeping its releases"""
+        key = normalize(name)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO projects VALUES (?, ?, ?)",
+                (key, name, json.dumps(versions)))
+            self.db.execute("INSERT OR IGNORE INTO changes VALUES (?)", (key,))
+
+    def record_release(self, name, version, release_data=None, urls=None):
+        """Store release data and/or download URLs of a release"""
+        key = normalize(name)
+        with self.db:
+            self.db.execute("INSERT OR IGNORE INTO releases VALUES (?, ?, '{}', '[]')", (key, version))
+            if release_data is not None:
+                self.db.execute("UPDATE releases SET release_data = ? WHERE key = ? AND version = ?",
+                    (json.dumps(release_data), key, version))
+            if urls is not None:
+                self.db.execute("UPDATE releases SET urls = ? WHERE key = ? AND version = ?",
+                    (json.dumps(urls), key, version))
+            self.db.execute("INSERT OR IGNORE INTO changes VALUES (?)", (key,))
+
+    @classmethod
+    def parse_line(cls, line):
+        """Return (project row, release rows) of a dump line
+
+        **Example:**
+
+        >>> project, releases = MetadataStore.parse_line('{"name": "Foo.Bar", '
+        ...     '"versions": ["1.0"], "releases": {"1.0": {"urls": ["http://x"], '
+        ...     '"requires_dist": ["baz"]}}}')
+        >>> project
+        (u'foo-bar', u'Foo.Bar', '["1.0"]')
+        >>> releases
+        [(u'foo-bar', u'1.0', '{"requires_dist": ["baz"]}', '["http://x"]')]
+
+        """
+        entry = json.loads(line)
+        name = entry['name']
+        key = normalize(name)
+        releases = entry.get('releases') or {}
+        versions = entry.get('versions') or releases.keys()
+        rows = []
+        for version, release in releases.iteritems():
+            data = dict(release.get('release_data') or {})
+            if release.get('requires_dist') is not None:
+                data['requires_dist'] = release['requires_dist']
+            rows.append((key, version, json.dumps(data), json.dumps(release.get('urls') or [])))
+        return (key, name, json.dumps(versions)), rows
+
+    def import_dump(self, stream):
+        """Load dump lines from `stream` in one transaction, replacing
+        projects that are in the store already. Lines are parsed and
+        written in batches, the dump is never loaded whole. Imported
+        projects are recorded in ``changes`` table until
+        :meth:`gpypi.search.SearchIndex.update` indexes them.
+
+        :returns: number of imported projects
+        :rtype: int
+
+        """
+        projects, releases = [], []
+        count = 0
+
+        def flush():
+            keys = [(project[0],) for project in projects]
+            self.db.executemany("DELETE FROM releases WHERE key = ?", keys)
+            self.db.executemany("INSERT OR IGNORE INTO changes VALUES (?)", keys)
+            self.db.executemany("INSERT OR REPLACE INTO projects VALUES (?, ?, ?)", projects)
+            self.db.executemany("INSERT OR REPLACE INTO releases VALUES (?, ?, ?, ?)", releases)
+            del projects[:], releases[:]
+
+        self.db.execute("PRAGMA synchronous = OFF")
+        try:
+            with self.db:
+                for number, line in enumerate(stream, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        project, rows = self.parse_line(line)
+                    except (ValueError, KeyError, TypeError, AttributeError), e:
+                        log.warn("Skipping line %d of metadata dump: %s", number, e)
+                        continue
+                    projects.append(project)
+                    releases.extend(rows)
+                    count += 1
+                    if len(projects) >= self.batch_size:
+                        flush()
+                flush()
+        except sqlite3.Error, e:
+            raise GPyPiException("Could not import metadata to %s: %s" % (self.path, e))
+        finally:
+            self.db.execute("PRAGMA synchronous = FULL")
+        log.info("Imported metadata of %d projects to %s", count, self.path)
+        return count
+
+    def export_dump(self, stream):
+        """Write all projects to `stream` as dump lines
+
+        :returns: number of exported projects
+        :rtype: int
+
+        """
+        count = 0
+        with closing(self.db.cursor()) as releases:
+            for key, name, versions in self.db.execute("SELECT * FROM projects ORDER BY key"):
+                entry = {'name': name.decode('utf-8'), 'versions': json.loads(versions), 'releases': {}}
+                for version, data, urls in releases.execute("SELECT version, release_data, urls "
+                        "FROM releases WHERE key = ?", (key,)):
+                    entry['releases'][version.decode('utf-8')] = {
+                        'release_data': json.loads(data), 'urls': json.loads(urls)}
+                stream.write(json.dumps(entry, sort_keys=True) + '\n')
+                count += 1
+        log.info("Exported metadata of %d projects from %s", count, self.path)
+        return count
+
+    def transfer(self, action, path):
+        """Run ``import`` or ``export`` of dump `path`, ``-`` is
+        stdin or stdout"""
+        if path == '-':
+            stream = sys.stdin if action == 'import' else sys.stdout
+            return getattr(self, '%s_dump' % action)(stream)
+        try:
+            with open(path, 'r' if action == 'import' else 'w') as stream:
+                return getattr(self, '%s_dump' % action)(stream)
+        except IOError, e:
+            raise GPyPiInvalidParameter("Could not %s metadata dump %s: %s" % (action, path, e))
+
+
+class RecordingPyPI(object):
+    """:term:`PyPi` client writing answers of `pypi` through to `store`.
+    Failures to write are only logged.
+
+    :param pypi: Client to query
+    :type pypi: :class:`yolk.pypi.CheeseShop`
+    :param store: Store to write to, used by one thread only
+    :type store: :class:`MetadataStore`
+
+    """
+
+    def __init__(self, pypi, store):
+        self.pypi = pypi
+        self.store = store
+
+    def __repr__(self):
+        return "<RecordingPyPI %s>" % self.store.path
+
+    def __getattr__(self, name):
+        return getattr(self.pypi, name)
+
+    @classmethod
+    def wrap(cls, pypi, config):
+        """Return `pypi` recording to store of `config`, or `pypi`
+        itself if the store can't be opened (e.g. ``cache_dir`` is
+        not writable)"""
+        try:
+            return cls(pypi, MetadataStore.from_config(config))
+        except GPyPiConfigurationError, e:
+            log.debug("Not recording PyPI metadata: %s", e)
+            return pypi
+
+    def record(self, method, *args, **kwargs):
+        try:
+            getattr(self.store, method)(*args, **kwargs)
+        except sqlite3.Error, e:
+            log.debug("Could not record PyPI metadata to %s: %s", self.store.path, e)
+
+    def query_versions_pypi(self, package_name):
+        (name, versions) = self.pypi.query_versions_pypi(package_name)
+        if versions:
+            self.record('record_versions', name, versions)
+        return name, versions
+
+    def get_download_urls(self, package_name, version="", pkg_type="all"):
+        urls = self.pypi.get_download_urls(package_name, version, pkg_type)
+        if version and pkg_type in ('all', 'source'):
+            self.record('record_release', package_name, version, urls=urls)
+        return urls
+
+    def release_data(self, package_name, version):
+        data = self.pypi.release_data(package_name, version)
+        if data:
+            self.record('record_release', package_name, version, release_data=data)
+        return data
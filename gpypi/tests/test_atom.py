@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import itertools
+
+import unittest2
+
+from gpypi.atom import *
+from gpypi.tests import *
+
+try:
+    import portage
+    from portage.versions import vercmp as portage_vercmp
+    try:
+        from portage.dep import isvalidatom as portage_isvalidatom
+    except ImportError:
+        from portage.portage_dep import isvalidatom as portage_isvalidatom
+except ImportError:
+    portage = None
+
+
+NAMES = ['foo', 'foo-bar', 'foo_bar', 'foo+', 'Foo', 'foo2', 'foo-2', 'foo-2a', 'foo-1.0',
+    'foo-bar-1.0-r1', 'foo.bar', '-foo', '+foo', '_foo', 'foo-r1', 'foo-1_p']
+VERSIONS = ['1', '1.0', '1.0.0', '1.02', '1.1', '1.0a', '1.0z', '1.0_alpha', '1.0_beta1',
+    '1.0_pre2', '1.0_rc3', '1.0_p', '1.0_p1', '1.0_beta1_p2', '1.0-r1', '1.0-r01', 'cvs.1.0',
+    '2009.12.01', '1.0_foo', '1.0b1', '1..0', '.1', '1.0-r', 'a1', '1.0-r1-r2', '0001']
+ATOMS = ['dev-python/foo', '=dev-python/foo-1.0', 'dev-python/foo-1.0', '>=dev-python/foo-1.0',
+    '<dev-python/foo-1.0-r1', '~dev-python/foo-1.0', '=dev-python/foo-1.0*', '>dev-python/foo-1.0*',
+    '=dev-python/foo', 'foo', '=foo-1.0', '!dev-python/foo', '!!<dev-python/foo-1.0',
+    'dev-python/foo:2', 'dev-python/foo:2/2.1=', 'dev-python/foo:=', 'dev-python/foo:*',
+    'dev-python/foo::gentoo', 'dev-python/foo[bar]', 'dev-python/foo[bar,-baz,qux?,!quux=]',
+    'dev-python/foo[bar(+)]', 'dev-python/foo[]', 'dev-python/foo[-bar?]', 'dev-python/foo[!bar]',
+    '=dev-python/foo-bar-1.0-2.0', '=dev-python/foo-1.0:2[bar]', 'dev-python//foo',
+    'dev-python/foo/bar', '<=dev-python/foo-1.0_rc1-r2', '=dev-python/foo-1.0_beta',
+    '==dev-python/foo-1.0', 'dev-python/+foo', '.dev/foo']
+
+
+class TestPkgsplit(BaseTestCase):
+    """Unittests for splitting package names"""
+
+    def test_pkgsplit(self):
+        self.assertEqual(('foo', '1.0', 'r0'), pkgsplit('foo-1.0'))
+        self.assertEqual(('foo-bar', '1.0_beta1', 'r2'), pkgsplit('foo-bar-1.0_beta1-r2'))
+        self.assertEqual(('dev-python/foo', '1.0', 'r0'), pkgsplit('dev-python/foo-1.0'))
+        self.assertEqual(('foo2', 'cvs.1.0', 'r0'), pkgsplit('foo2-cvs.1.0'))
+
+    def test_pkgsplit_invalid(self):
+        for p in ['foo', 'foo-1.0-2.0', 'foo-1.0-r', 'foo-1.0_foo', 'cat/sub/foo-1.0',
+                '-foo-1.0', 'foo-', '.cat/foo-1.0']:
+            self.assertEqual(None, pkgsplit(p), p)
+
+    def test_catpkgsplit(self):
+        self.assertEqual(('dev-python', 'foo', '1.0', 'r1'), catpkgsplit('dev-python/foo-1.0-r1'))
+        self.assertEqual((None, 'foo', '1.0', 'r0'), catpkgsplit('foo-1.0'))
+        self.assertEqual(None, catpkgsplit('dev-python/foo'))
+
+
+class TestIsValidAtom(BaseTestCase):
+    """Unittests for atom validation"""
+
+    def test_valid(self):
+        for atom in ['dev-python/foo', '=dev-python/foo-1.0', '>=dev-python/foo-1.0_rc1-r2',
+                '~dev-python/foo-1.0', '=dev-python/foo-1.0*', 'dev-python/foo:2/2.1=',
+                '=dev-python/foo-1.0:2[bar,-baz,qux?,!quux=]', 'dev-python/foo[bar(+)]']:
+            self.assertTrue(isvalidatom(atom), atom)
+
+    def test_invalid(self):
+        for atom in ['foo', '=foo-1.0', 'dev-python/foo-1.0', '=dev-python/foo',
+                '>dev-python/foo-1.0*', '=dev-python/foo-bar-1.0-2.0', 'dev-python/foo[]',
+                'dev-python/foo[!bar]', 'dev-python/foo[-bar?]', '==dev-python/foo-1.0',
+                'dev-python/foo/bar', '!dev-python/foo', 'dev-python/foo::gentoo']:
+            self.assertFalse(isvalidatom(atom), atom)
+
+    def test_blockers_and_repo(self):
+        self.assertTrue(isvalidatom('!dev-python/foo', allow_blockers=True))
+        self.assertTrue(isvalidatom('!!<dev-python/foo-1.0', allow_blockers=True))
+        self.assertTrue(isvalidatom('dev-python/foo::gentoo', allow_repo=True))
+
+
+class TestVercmp(BaseTestCase):
+    """Unittests for version comparison"""
+
+    def test_ordering(self):
+        ordered = ['0.9', '1', '1.0_alpha', '1.0_beta', '1.0_beta1', '1.0_pre', '1.0_rc1',
+            '1.0', '1.0-r1', '1.0_p', '1.0_p1', '1.0a', '1.0z', '1.0.0', '1.02', '1.1_beta1_p1',
+            '1.1', '1.1.1', '2009.12.01', 'cvs.0.1']
+        for lower, higher in zip(ordered, ordered[1:]):
+            self.assertTrue(vercmp(lower, higher) < 0, (lower, higher))
+            self.assertTrue(vercmp(higher, lower) > 0, (lower, higher))
+
+    def test_equal(self):
+        self.assertEqual(0, vercmp('1.0', '1.0'))
+        self.assertEqual(0, vercmp('1.0-r0', '1.0'))
+        self.assertEqual(0, vercmp('1.0_p0', '1.0_p'))
+
+    def test_invalid(self):
+        self.assertEqual(None, vercmp('1.0', 'foo'))
+        self.assertEqual(None, vercmp('1..0', '1.0'))
+
+
+@unittest2.skipIf(portage is None, "portage is not installed")
+class TestPortageCompatibility(BaseTestCase):
+    """Compare results with portage on a generated corpus"""
+
+    def test_pkgsplit(self):
+        for name, version in itertools.product(NAMES, VERSIONS):
+            for p in ['%s-%s' % (name, version), 'dev-python/%s-%s' % (name, version)]:
+                self.assertEqual(portage.pkgsplit(p), pkgsplit(p), p)
+
+    def test_isvalidatom(self):
+        for atom in ATOMS:
+            self.assertEqual(bool(portage_isvalidatom(atom)), isvalidatom(atom), atom)
+
+    def test_vercmp(self):
+        sign = lambda n: n and (n > 0) - (n < 0)
+        valid = [v for v in VERSIONS if pkgsplit('foo-%s' % v)]
+        for ver1, ver2 in itertools.product(valid, repeat=2):
+            self.assertEqual(sign(portage_vercmp(ver1, ver2)), sign(vercmp(ver1, ver2)),
+                (ver1, ver2))
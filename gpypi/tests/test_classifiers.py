@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from gpypi.classifiers import *
+from gpypi.tests import *
+
+
+class TestClassifierIndex(BaseTestCase):
+    """Unittests for classifier index"""
+
+    def setUp(self):
+        self.index = ClassifierIndex.default()
+
+    def test_category_most_detailed(self):
+        info = self.index.resolve([
+            'Topic :: Text Processing',
+            'Topic :: Communications :: Chat :: Internet Relay Chat',
+            'Topic :: Communications :: Email :: Filters',
+        ])
+        self.assertEqual('net-irc', info['category'])
+
+    def test_category_longest_prefix(self):
+        info = self.index.resolve(['Topic :: Terminals :: Something New'])
+        self.assertEqual('x11-terms', info['category'])
+
+    def test_category_unknown(self):
+        info = self.index.resolve(['Topic :: Foobar', 'License :: Foobar'])
+        self.assertEqual(None, info['category'])
+        self.assertEqual(None, info['license'])
+
+    def test_license(self):
+        info = self.index.resolve(['License :: OSI Approved :: BSD License'])
+        self.assertEqual('BSD-2', info['license'])
+
+    def test_python_os_languages(self):
+        info = self.index.resolve([
+            'Programming Language :: Python :: 2.6',
+            'Programming Language :: Python :: 2.7',
+            'Programming Language :: C',
+            'Operating System :: POSIX :: Linux',
+        ])
+        self.assertEqual(set(['2.6', '2.7']), info['python'])
+        self.assertEqual(set(['Python', 'C']), info['languages'])
+        self.assertEqual(set(['POSIX :: Linux']), info['os'])
+
+    def test_use(self):
+        info = self.index.resolve(['Environment :: X11 Applications :: GTK',
+            'Environment :: Console'])
+        self.assertEqual(set(['gtk']), info['use'])
+
+    def test_custom_tables(self):
+        index = ClassifierIndex({'category': {'Topic :: Foo': 'app-foo'}})
+        self.assertEqual({'category': (2, 'app-foo')}, index.match('Topic :: Foo :: Bar'))
+        self.assertEqual({}, index.match('Topic :: Bar'))
+        self.assertEqual(2, index.count_nodes())
@@ -4,6 +4,11 @@
 
 """
 
+import os
+import sys
+import time
+import subprocess
+
 import unittest2
 import mock
 from pkg_resources import parse_requirements
@@ -21,6 +26,9 @@ class TestGPyPI(BaseTestCase):
             overwrite = False
             category = False
             uri = None
+            mirror_dir = ''
+            offline = False
+            cache_dir = '/dev/null/gpypi'
 
         self.gpypi = GPyPI('foobar', '1.0', Options())
         self.packages = []
@@ -41,6 +49,76 @@ class TestGPyPI(BaseTestCase):
         self.assertEqual([['foobar', '1.0'], ['sphinx', None], ['foobar2', None]], self.packages)
 
 
+class TestGPyPIRequirements(BaseTestCase):
+    """Creating packages from requirements file"""
+
+    def setUp(self):
+        class Options:
+            no_deps = False
+            command = 'create'
+            mirror_dir = ''
+            offline = False
+
+            def snapshot(self, **kw):
+                self.__dict__.update(kw)
+                return self
+
+        self.options = Options()
+        patcher = mock.patch.object(GPyPI, 'get_pypi')
+        self.pypi = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def test_roots(self):
+        requirements = list(parse_requirements(['foo==1.0', 'bar>=2.0', 'Foo', 'baz']))
+        gpypi = GPyPI('qux', None, self.options, requirements)
+
+        self.assertEqual([('qux', None), ('foo', '1.0'), ('bar', requirements[1]),
+            ('baz', None)], gpypi.tree)
+
+    def test_shared_dependencies(self):
+        requires = {
+            'foo': parse_requirements(['shared', 'Foo-Only']),
+            'bar': parse_requirements(['Shared>=1.0', 'foo']),
+            'shared': [],
+            'foo-only': [],
+        }
+        packages = []
+
+        def do_ebuild():
+            packages.append(gpypi.package_name)
+            if gpypi.package_name == 'Foo-Only':
+                raise GPyPiException('broken')
+            if gpypi.package_name == 'shared':
+                raise SystemExit('setup.py exited')
+            if gpypi.package_name == 'baz':
+                raise ImportError('No module named qux')
+            gpypi.results[gpypi.package_name] = 'created'
+            return requires[gpypi.package_name.lower()]
+
+        gpypi = GPyPI(None, None, self.options, parse_requirements(['foo', 'baz', 'bar']))
+        with mock.patch.object(gpypi, 'do_ebuild', side_effect=do_ebuild):
+            with mock.patch('gpypi.cli.log'):
+                gpypi.create_ebuilds()
+
+        self.assertEqual(['foo', 'baz', 'bar', 'shared', 'Foo-Only'], packages)
+        self.assertEqual(['2 created, 0 skipped, 3 failed, 0 not found',
+            'Created: foo bar', 'Failed: baz shared Foo-Only'], gpypi.summary())
+
+    def test_version_from_requirement(self):
+        self.pypi.query_versions_pypi.side_effect = lambda name: (name.capitalize(),
+            ['1.0', '2.0', '2.5', '3.0'])
+        gpypi = GPyPI(None, None, self.options, parse_requirements(['foo>=2.0,<3', 'bar>4']))
+        gpypi.find_uri = mock.Mock()
+        gpypi.query_metadata = mock.Mock()
+
+        with mock.patch('gpypi.ebuild.Ebuild') as Ebuild:
+            Ebuild.return_value.created = False
+            gpypi.create_ebuilds()
+
+        self.assertEqual({'Foo': 'skipped', 'Bar': 'not found'}, gpypi.results)
+        self.assertEqual('2.5', self.options.up_pv)
+
+
 class TestCLI(BaseTestCase):
     """"""
 
@@ -52,3 +130,48 @@ class TestMain(BaseTestCase):
     def test_help(self):
         """docstring for test_help"""
         self.assertRaises(SystemExit, main, ['--help'])
+
+
+class TestStartup(BaseTestCase):
+    """Import-time regression tests. gpypi is invoked from scripts
+    many times, heavy modules must be imported only when needed.
+
+    Budget (seconds over bare interpreter startup) can be set with
+    ``GPYPI_STARTUP_BUDGET`` environment variable.
+    """
+    HEAVY_MODULES = ['portage', 'gentoolkit', 'yolk', 'jinja2', 'pygments',
+        'metagen', 'setuptools']
+    BUDGET = float(os.environ.get('GPYPI_STARTUP_BUDGET', 0.5))
+    CODE = """
+import sys
+from gpypi.cli import main
+try:
+    main(%r)
+except SystemExit:
+    pass
+sys.stderr.write(repr(sorted(set(m.split('.')[0] for m in sys.modules))))
+"""
+
+    def run_python(self, code):
+        """Return wall time and stderr of `code` run in a new interpreter"""
+        start = time.time()
+        p = subprocess.Popen([sys.executable, '-c', code],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stderr = p.communicate()[1]
+        return time.time() - start, stderr
+
+    def assertStartup(self, argv):
+        baseline = min(self.run_python('pass')[0] for i in range(3))
+        runs = [self.run_python(self.CODE % argv) for i in range(3)]
+        elapsed = min(run[0] for run in runs)
+        modules = eval(runs[0][1].splitlines()[-1])
+
+        self.assertEqual([], [m for m in self.HEAVY_MODULES if m in modules])
+        self.assertLess(elapsed - baseline, self.BUDGET,
+            "gpypi %s startup took %.3fs over budget" % (" ".join(argv), elapsed - baseline))
+
+    def test_help_startup(self):
+        self.assertStartup(['--help'])
+
+    def test_echo_startup(self):
+        self.assertStartup(['echo', '--help'])
@@ -61,6 +61,10 @@ category = dev-python
         self.assertEqual(True, Config.validate('overwrite', 'y'))
         self.assertRaises(GPyPiValidationError, Config.validate, 'overwrite', 'foobar')
 
+    def test_validate_int(self):
+        self.assertEqual(5, Config.validate('newest', '5'))
+        self.assertRaises(GPyPiValidationError, Config.validate, 'newest', 'foobar')
+
     def test_validate_str(self):
         self.assertEqual(u'foobar', Config.validate('uri', 'foobar'))
         self.assertEqual(u'foobar', Config.validate('uri', u'foobar'))
@@ -115,6 +119,88 @@ class TestConfigManager(BaseTestCase):
         self.assertEqual([('ask', ('category',), {})], self.mgr.q.method_calls)
         self.assertEqual(1, self.mgr.q.ask.call_count)
 
+    def test_resolved_view(self):
+        self.mgr.configs['pypi'] = Config.from_pypi({'overlay': 'foo'})
+        self.mgr.configs['setup_py'] = {'overlay': 'bar', 'overwrite': 'y'}
+
+        self.assertEqual('foo', self.mgr.overlay)
+        self.assertEqual(True, self.mgr.overwrite)
+        self.assertTrue(isinstance(self.mgr.overlay, unicode))
+        self.assertTrue(isinstance(self.mgr.configs['setup_py'], Config))
+
+    def test_resolved_view_invalidation(self):
+        self.mgr.configs['pypi'] = Config.from_pypi({'overlay': 'foo'})
+        self.mgr.configs['setup_py'] = Config.from_setup_py({})
+        self.assertEqual('foo', self.mgr.overlay)
+
+        self.mgr.configs['pypi']['overlay'] = 'bar'
+        self.assertEqual('bar', self.mgr.overlay)
+
+        self.mgr.configs['setup_py'].update({'overlay': 'baz'})
+        self.mgr.use = ['setup_py', 'pypi']
+        self.assertEqual('baz', self.mgr.overlay)
+
+        self.mgr.configs['setup_py'] = Config.from_setup_py({})
+        self.assertEqual('bar', self.mgr.overlay)
+
+        del self.mgr.configs['pypi']['overlay']
+        self.assertEqual(Config.allowed_options['overlay'][2], self.mgr.overlay)
+
+    def test_resolved_view_cached(self):
+        self.mgr.configs['pypi'] = Config.from_pypi({'overlay': 'foo'})
+        self.mgr.overlay
+        view = self.mgr._view
+
+        self.mgr.configs['pypi']['summary'] = 'not an option'
+        self.mgr.overlay
+        self.assertTrue(view is self.mgr._view)
+
+    def test_resolved_view_invalidated_while_resolving(self):
+        self.mgr.configs['pypi'] = Config.from_pypi({'overlay': 'foo'})
+        validate = Config.validate
+
+        def change_overlay(name, value):
+            if name == 'overlay' and value == 'foo':
+                self.mgr.configs['pypi']['overlay'] = 'bar'
+            return validate(name, value)
+
+        with mock.patch.object(Config, 'validate', side_effect=change_overlay):
+            self.assertEqual('foo', self.mgr.overlay)
+        self.assertEqual(None, self.mgr._view)
+        self.assertEqual('bar', self.mgr.overlay)
+
+    def test_snapshot(self):
+        self.mgr.configs['pypi'] = Config.from_pypi({'overlay': 'foo'})
+        self.mgr.configs['setup_py'] = Config.from_setup_py({})
+        snap = self.mgr.snapshot(up_pn='bar')
+
+        self.assertEqual('foo', snap.overlay)
+        self.assertEqual('bar', snap.up_pn)
+        self.assertEqual('', self.mgr.up_pn)
+        self.assertTrue(snap.configs.get('pypi') is self.mgr.configs.get('pypi'))
+
+        snap.configs['pypi']['overlay'] = 'baz'
+        snap.configs['setup_py'] = Config.from_setup_py({'pn': 'foobar'})
+        snap.category = 'dev-lang'
+        self.assertEqual('baz', snap.overlay)
+        self.assertEqual('foo', self.mgr.overlay)
+        self.assertEqual('', self.mgr.pn)
+        self.assertEqual('foobar', snap.pn)
+        self.assertFalse('category' in self.mgr.__dict__)
+
+    def test_snapshot_sees_shared_changes(self):
+        self.mgr.configs['pypi'] = Config.from_pypi({'overlay': 'foo'})
+        snap = self.mgr.snapshot()
+        self.assertEqual('foo', snap.overlay)
+
+        self.mgr.configs['pypi']['overlay'] = 'bar'
+        self.mgr.configs['questionnaire']['pn'] = 'foobar'
+        self.assertEqual('bar', snap.overlay)
+        self.assertEqual('foobar', snap.pn)
+
+        snap.configs['questionnaire']['pv'] = '1.0'
+        self.assertEqual('1.0', self.mgr.pv)
+
     def test_non_existent_option(self):
         self.mgr.configs['pypi'] = Config.from_pypi({})
 
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import shutil
+import logging
+import tempfile
+import threading
+from StringIO import StringIO
+
+import mock
+
+from gpypi.daemon import *
+from gpypi.exc import *
+from gpypi.tests import *
+
+
+class TestDaemon(BaseTestCase):
+    """Unittests for gpypi serve"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'run', 'gpypi.sock')
+        self.config_file = os.path.join(self.tmp_dir, 'gpypi.ini')
+
+    def serve(self, requests=1):
+        server = Server(self.path)
+        self.addCleanup(server.close)
+
+        def run():
+            for i in range(requests):
+                server.handle_request()
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+        return server
+
+    def make_stale_socket(self):
+        os.makedirs(os.path.dirname(self.path))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.path)
+        sock.close()
+
+    def test_forward_without_daemon(self):
+        self.assertEqual(None, forward(self.path, ['echo', 'foo']))
+        self.make_stale_socket()
+        self.assertEqual(None, forward(self.path, ['echo', 'foo']))
+
+    def test_forward(self):
+        response = {'status': 3, 'output': u'Generating ebuild: foo 1.0\n'}
+        with mock.patch.object(Server, 'execute', return_value=response) as execute:
+            self.serve()
+            stream = StringIO()
+            self.assertEqual(3, forward(self.path, ['echo', 'foo'], stream))
+
+        self.assertEqual('Generating ebuild: foo 1.0\n', stream.getvalue())
+        execute.assert_called_once_with({'argv': ['echo', 'foo'], 'cwd': os.getcwd(),
+            'env': environment()})
+
+    def test_forward_refused(self):
+        server = self.serve()
+        with mock.patch('gpypi.cli.CLI') as cli:
+            with mock.patch('gpypi.daemon.os.getuid', return_value=os.getuid() + 1):
+                self.assertEqual(None, forward(self.path, ['echo', 'foo'], StringIO()))
+            self.assertEqual(None, server.execute({'argv': ['echo', 'foo'],
+                'env': dict(environment(), ECHANGELOG_USER='foo <foo@bar.org>')})['status'])
+        self.assertFalse(cli.called)
+
+    def test_server_socket(self):
+        self.make_stale_socket()
+        self.serve(requests=0)
+        self.assertEqual(0600, os.stat(self.path).st_mode & 0777)
+        self.assertTrue(is_listening(self.path))
+        self.assertRaises(GPyPiDaemonError, Server, self.path)
+
+    def test_execute(self):
+        def cli(config):
+            logging.getLogger('gpypi.cli').warn('created %s', config.up_pn)
+            print 'ebuild'
+            os.system('echo repoman')
+            self.assertEqual([], config.questionnaire_options)
+
+        server = self.serve(requests=0)
+        cwd = os.getcwd()
+        handlers = logging.getLogger().handlers[:]
+        with mock.patch('gpypi.cli.CLI', side_effect=cli):
+            response = server.execute({'argv': ['echo', '--nocolors', '--config-file',
+                'gpypi.ini', 'foobar'], 'cwd': self.tmp_dir, 'env': environment()})
+
+        self.assertEqual({'status': 0, 'output': u'Config was generated at gpypi.ini\n'
+            'created foobar\nebuild\nrepoman\n'}, response)
+        self.assertTrue(os.path.exists(self.config_file))
+        self.assertEqual(cwd, os.getcwd())
+        self.assertEqual(handlers, logging.getLogger().handlers)
+
+    def test_execute_errors(self):
+        server = self.serve(requests=0)
+
+        response = server.execute({'argv': ['sync', '--config-file', self.config_file],
+            'env': environment()})
+        self.assertEqual(1, response['status'])
+        self.assertIn('GPyPiDaemonError', response['output'])
+
+        response = server.execute({'argv': ['echo', 'foobar', '--foobar'], 'env': environment()})
+        self.assertEqual(2, response['status'])
+        self.assertIn('unrecognized arguments', response['output'])
+
+
+class TestMainForwarding(BaseTestCase):
+    """gpypi commands are forwarded to running daemon"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.argv = ['echo', '--config-file', os.path.join(self.tmp_dir, 'gpypi.ini'),
+            '--socket', os.path.join(self.tmp_dir, 'gpypi.sock'), 'foobar']
+        patcher = mock.patch('gpypi.cli.setup_logging')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_forwarded(self):
+        from gpypi.cli import main
+
+        with mock.patch('gpypi.daemon.forward', return_value=0) as forward:
+            main(self.argv)
+        forward.assert_called_once_with(os.path.join(self.tmp_dir, 'gpypi.sock'), self.argv)
+
+        with mock.patch('gpypi.daemon.forward', return_value=2):
+            self.assertRaises(SystemExit, main, self.argv)
+
+    def test_not_forwarded(self):
+        from gpypi.cli import main
+
+        with mock.patch('gpypi.daemon.forward') as forward:
+            with mock.patch('gpypi.cli.CLI'):
+                try:
+                    main(self.argv + ['--no-daemon'])
+                except ImportError:
+                    # portage is needed to run locally
+                    pass
+        self.assertFalse(forward.called)
@@ -209,4 +209,23 @@ class TestEbuild(BaseTestCase):
         self.assertEqual(set(['dev-python/setuptools']), self.ebuild['depend'])
         self.assertEqual(set(), self.ebuild['use'])
 
+    def test_replay(self):
+        os.mkdir(os.path.join(self.s, 'docs'))
+        os.mkdir(os.path.join(self.s, 'tests'))
+        self.ebuild.setup_keywords = {'install_requires': ['foobar>=0.1'], 'tests_require': ['nose']}
+        self.ebuild.probe = {'setuptools': True}
+        self.ebuild.set_setup_keywords()
+        self.ebuild.discover_docs_and_examples()
+        self.ebuild.discover_tests()
+
+        config = ConfigManager(['pypi', 'ini'])
+        config.configs['ini'] = dict(overwrite=False, overlay='gpypi-tests', up_pn='foobar', up_pv='1.0')
+        ebuild = Ebuild(config)
+        ebuild.replay(self.ebuild.setup_keywords, self.ebuild.probe)
+
+        self.assertEqual({'setuptools': True, 'docs_dir': 'docs', 'tests_dir': True}, ebuild.probe)
+        for key in ['rdepend', 'depend', 'use', 'tests_method', 'docs_dir']:
+            self.assertEqual(self.ebuild[key], ebuild[key])
+        self.assertIn('>=dev-python/foobar-0.1', ebuild['rdepend'])
+
     # TODO: ebuild with echo command and no overlay
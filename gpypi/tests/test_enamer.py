@@ -13,6 +13,7 @@ Test ``get_vars`` with all types of URI's we can come up with.
 """
 
 import unittest2
+import mock
 
 from gpypi.enamer import *
 from gpypi.tests import *
@@ -67,6 +68,7 @@ class TestEnamer(BaseTestCase):
         self.assertEqual(Enamer.convert_license(["License :: OSI Approved :: GNU Library or Lesser General Public License (LGPL)"]),  "LGPL-2.1")
         self.assertEqual(Enamer.convert_license(["License :: Public Domain"]), "public-domain")
         self.assertEqual(Enamer.convert_license([]), "")
+        self.assertEqual(Enamer.convert_license([], 'LGPL v3'), 'LGPL-2.1')
         self.assertEqual(Enamer.convert_license([], 'GPL alike'), 'GPL-2')
 
     def test_is_valid_license(self):
@@ -74,6 +76,35 @@ class TestEnamer(BaseTestCase):
         self.assertFalse(Enamer.is_valid_portage_license("GPL"))
         self.assertTrue(Enamer.is_valid_portage_license("GPL-2"))
 
+    def test_get_vars_batch(self):
+        entries = [
+            ("http://www.foo.com/pkgfoo-1.0.tbz2", "pkgfoo", "1.0"),
+            ("http://www.foo.com/pkg.foo-1.0b1.tbz2", "pkg.foo", "1.0b1"),
+            ("http://www.foo.com/pkgfoo-1.0.tbz2", "pkgfoo", "1.0"),
+        ]
+        results = Enamer.get_vars_batch(entries)
+        self.assertEqual([Enamer.get_vars(*entry) for entry in entries], results)
+        self.assertEqual(results[0], results[2])
+
+    def test_get_vars_batch_ignore_errors(self):
+        entries = [("http://www.foo.com/pkgfoo-1.0.tbz2", "pkgfoo", "1.0")] * 2
+        get_vars = mock.Mock(side_effect=[{'p': 'pkgfoo-1.0'}, GPyPiInvalidAtom()])
+        with mock.patch.object(Enamer, 'get_vars', get_vars):
+            results = Enamer.get_vars_batch(entries, ignore_errors=True)
+        self.assertEqual([{'p': 'pkgfoo-1.0'}, None], results)
+
+        get_vars = mock.Mock(side_effect=GPyPiInvalidAtom())
+        with mock.patch.object(Enamer, 'get_vars', get_vars):
+            self.assertRaises(GPyPiInvalidAtom, Enamer.get_vars_batch, entries)
+
+    def test_get_vars_cached_copy(self):
+        uri = "http://www.foo.com/pkg.foo-1.0b1.tbz2"
+        Enamer.get_vars(uri, "pkg.foo", "1.0b1")['my_pn'].append('foobar')
+        self.assertEqual(['${PN/-/.}'], Enamer.get_vars(uri, "pkg.foo", "1.0b1")['my_pn'])
+
+        Enamer.parse_pn('Test-Me')[1].append('foobar')
+        self.assertEqual(('test-me', ['Test-Me']), Enamer.parse_pn('Test-Me'))
+
     def test_get_vars1(self):
         """
         Absolute best-case scenario determines $P from up_pn, up_pv
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+
+import mock
+
+from gpypi.config import Config, ConfigManager
+from gpypi.exc import *
+from gpypi.journal import *
+from gpypi.tests import *
+
+
+class TestSyncJournal(BaseTestCase):
+    """Unittests for sync journal"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'cache', 'sync.journal')
+
+    def test_record(self):
+        journal = SyncJournal(self.path)
+        journal.record('Foo', '1.0', SyncJournal.CREATED)
+        journal.record('Foo', '1.1', SyncJournal.FAILED, error='GPyPiException: foo')
+        journal.close()
+
+        lines = [json.loads(line) for line in open(self.path)]
+        self.assertEqual(['1.0', '1.1'], [line['version'] for line in lines])
+        self.assertEqual('GPyPiException: foo', lines[1]['error'])
+        self.assertFalse('error' in lines[0])
+
+    def test_resume(self):
+        journal = SyncJournal(self.path)
+        journal.record('Foo', '1.0', SyncJournal.CREATED)
+        journal.record('Foo', '1.1', SyncJournal.FAILED)
+        journal.record('Bar', '2.0', SyncJournal.NO_URL)
+        journal.close()
+
+        journal = SyncJournal(self.path, resume=True)
+        self.assertFalse(journal.should_process('foo', '1.0'))
+        self.assertFalse(journal.should_process('Bar', '2.0'))
+        self.assertTrue(journal.should_process('Foo', '1.1'))
+        self.assertTrue(journal.should_process('Foo', '1.2'))
+        self.assertEqual((2, 1), (journal.skipped, journal.retried))
+
+    def test_no_resume_starts_over(self):
+        journal = SyncJournal(self.path)
+        journal.record('Foo', '1.0', SyncJournal.CREATED)
+        journal.close()
+
+        journal = SyncJournal(self.path)
+        self.assertTrue(journal.should_process('Foo', '1.0'))
+        journal.close()
+        self.assertEqual('', open(self.path).read())
+
+    def test_retries(self):
+        for attempt in range(3):
+            journal = SyncJournal(self.path, resume=True, retries=1)
+            journal.record('Foo', '1.0', SyncJournal.FAILED)
+            journal.close()
+
+        self.assertEqual(3, journal.entries[('foo', '1.0')]['attempts'])
+        self.assertFalse(SyncJournal(self.path, resume=True, retries=2).should_process('Foo', '1.0'))
+        self.assertTrue(SyncJournal(self.path, resume=True, retries=3).should_process('Foo', '1.0'))
+        self.assertTrue(SyncJournal(self.path, resume=True, retries=0).should_process('Bar', '1.0'))
+
+    def test_broken_last_line(self):
+        journal = SyncJournal(self.path)
+        journal.record('Foo', '1.0', SyncJournal.CREATED)
+        journal.close()
+        with open(self.path, 'a') as f:
+            f.write('{"project": "Foo", "vers')
+
+        journal = SyncJournal(self.path, resume=True)
+        self.assertEqual(1, len(journal.entries))
+        journal.record('Foo', '1.1', SyncJournal.CREATED)
+        journal.close()
+
+        journal = SyncJournal(self.path, resume=True)
+        self.assertEqual(2, len(journal.entries))
+
+    def test_unwritable(self):
+        self.assertRaises(GPyPiConfigurationError, SyncJournal, '/dev/null/sync.journal')
+
+    def test_sync_without_journal(self):
+        from gpypi.cli import CLI
+
+        config = ConfigManager(['argparse'])
+        config.configs['argparse'] = Config(command='sync', cache_dir='/dev/null/gpypi')
+        with mock.patch('gpypi.pipeline.SyncPipeline') as SyncPipeline:
+            CLI(config)
+        self.assertEqual(1, SyncPipeline.call_count)
+        self.assertEqual('/dev/null/gpypi', SyncPipeline.call_args[0][0].cache_dir)
+        self.assertEqual(None, SyncPipeline.call_args[0][1])
+        self.assertTrue(SyncPipeline.return_value.run.called)
+
+        config.configs['argparse']['resume'] = True
+        with mock.patch('gpypi.pipeline.SyncPipeline') as SyncPipeline:
+            CLI(config)
+        self.assertFalse(SyncPipeline.called)
+
+    def test_sync_absolute_paths(self):
+        from gpypi.cli import CLI
+
+        config = ConfigManager(['argparse'])
+        config.configs['argparse'] = Config(command='sync', cache_dir='cache',
+            metrics_file='metrics.prom')
+        with mock.patch('gpypi.journal.SyncJournal') as journal:
+            with mock.patch('gpypi.metrics.MetricsWriter') as writer:
+                with mock.patch('gpypi.pipeline.SyncPipeline') as SyncPipeline:
+                    CLI(config)
+        journal.assert_called_once_with(os.path.abspath(os.path.join('cache', 'sync.journal')),
+            resume=False, retries=config.sync_retries)
+        self.assertEqual(os.path.abspath('metrics.prom'), writer.call_args[0][1])
+        options = SyncPipeline.call_args[0][0]
+        self.assertEqual(os.path.abspath('cache'), options.cache_dir)
+        self.assertEqual('', options.mirror_dir)
+        self.assertEqual('cache', config.cache_dir)
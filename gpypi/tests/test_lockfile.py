@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import mock
+
+from gpypi.exc import *
+from gpypi.lockfile import *
+from gpypi.tests import *
+
+
+class TestLockfile(BaseTestCase):
+    """Unittests for create --lock and --from-lock"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'gpypi.lock')
+        with open(os.path.join(self.tmp_dir, 'foo-1.0.tar.gz'), 'w') as f:
+            f.write('sdist')
+        patcher = mock.patch('gpypi.portage_utils.PortageUtils.get_distdir',
+            return_value=self.tmp_dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_ebuild(self):
+        ebuild = mock.Mock()
+        ebuild.options.up_pn = 'Foo'
+        ebuild.options.up_pv = '1.0'
+        ebuild.options.uri = 'http://pypi.python.org/packages/source/F/Foo/foo-1.0.tar.gz'
+        ebuild.options.category = 'dev-python'
+        ebuild.metadata = {'summary': 'Foo', 'classifiers': ['Topic :: Utilities']}
+        ebuild.setup_keywords = {'install_requires': ('bar>=1.0',), 'cmdclass': {'x': object},
+            'ext_modules': [object()]}
+        ebuild.probe = {'setuptools': True, 's': '${WORKDIR}'}
+        return ebuild
+
+    def test_distfile_sha256(self):
+        self.assertEqual(hashlib.sha256('sdist').hexdigest(),
+            distfile_sha256('http://example.com/foo-1.0.tar.gz#md5=123'))
+        self.assertEqual(None, distfile_sha256('http://example.com/foo-2.0.tar.gz'))
+        self.assertEqual(None, distfile_sha256(None))
+
+    def test_write_load(self):
+        lock = Lockfile(self.path)
+        lock.add(self.make_ebuild())
+        lock.add(self.make_ebuild())
+        lock.write()
+
+        lock = Lockfile.load(self.path)
+        self.assertEqual(1, len(lock))
+        entry = list(lock)[0]
+        self.assertEqual(hashlib.sha256('sdist').hexdigest(), entry['sha256'])
+        self.assertEqual('dev-python', entry['category'])
+        self.assertEqual({'install_requires': ['bar>=1.0'], 'cmdclass': {}, 'ext_modules': []},
+            entry['setup_keywords'])
+        self.assertTrue(all(isinstance(key, str) for key in entry['setup_keywords']))
+        self.assertEqual({'setuptools': True, 's': '${WORKDIR}'}, entry['probe'])
+        self.assertTrue(entry['analyzed'])
+
+    def test_open_merges(self):
+        lock = Lockfile.open(self.path)
+        lock.add(self.make_ebuild())
+        lock.write()
+
+        # ebuild existed in the second run, it wasn't analyzed
+        skipped = self.make_ebuild()
+        skipped.probe = {}
+        bar = self.make_ebuild()
+        bar.options.up_pn = 'Bar'
+        lock = Lockfile.open(self.path)
+        lock.add(skipped)
+        lock.add(bar)
+        lock.write()
+
+        lock = Lockfile.load(self.path)
+        self.assertEqual(['foo', 'bar'], sorted(lock.packages, reverse=True))
+        self.assertTrue(lock.packages['foo']['analyzed'])
+
+        skipped.options.up_pv = '2.0'
+        lock.add(skipped)
+        self.assertFalse(lock.packages['foo']['analyzed'])
+
+    def test_load_errors(self):
+        self.assertRaises(GPyPiInvalidParameter, Lockfile.load, self.path)
+        with open(self.path, 'w') as f:
+            json.dump({'format': 0, 'packages': []}, f)
+        self.assertRaises(GPyPiInvalidParameter, Lockfile.load, self.path)
+
+    def test_regenerate(self):
+        lock = Lockfile(self.path)
+        lock.add(self.make_ebuild())
+        entry = lock.packages['foo']
+        lock.packages['bar'] = dict(entry, name='bar')
+        options = mock.Mock()
+
+        with mock.patch('gpypi.ebuild.Ebuild') as Ebuild:
+            Ebuild.return_value.write.side_effect = [True, GPyPiCouldNotCreateEbuildPath('x')]
+            Ebuild.return_value.options.command = 'create'
+            results = lock.regenerate(options)
+
+        self.assertEqual([('Foo', 'created'), ('bar', 'failed')], results.items())
+        options.snapshot.assert_any_call(uri=entry['url'], up_pn='Foo', up_pv='1.0',
+            category='dev-python')
+        Ebuild.return_value.set_metadata.assert_any_call(entry['metadata'])
+        Ebuild.return_value.replay.assert_any_call(entry['setup_keywords'], entry['probe'])
+        self.assertEqual(1, Ebuild.return_value.run_workflows.call_count)
+
+    def test_regenerate_not_analyzed(self):
+        lock = Lockfile(self.path)
+        ebuild = self.make_ebuild()
+        ebuild.probe = {}
+        lock.add(ebuild)
+
+        with mock.patch('gpypi.ebuild.Ebuild') as Ebuild:
+            Ebuild.return_value.created = True
+            results = lock.regenerate(mock.Mock())
+
+        self.assertEqual([('Foo', 'created')], results.items())
+        self.assertTrue(Ebuild.return_value.create.called)
+        self.assertFalse(Ebuild.return_value.replay.called)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+
+from gpypi.metrics import *
+from gpypi.utils import LRUCache
+from gpypi.tests import *
+
+
+class TestMetrics(BaseTestCase):
+    """Unittests for metrics export"""
+
+    def setUp(self):
+        self.metrics = Metrics()
+        self.cache = LRUCache()
+        self.cache['a'] = 1
+        self.cache.get('a')
+        self.cache.get('b')
+        self.cache.get('c')
+        self.caches = {'gpypi.enamer.parse_pv': self.cache}
+
+    def test_counters(self):
+        self.metrics.inc('foo_total', outcome='created')
+        self.metrics.inc('foo_total', 2, outcome='created')
+        self.metrics.inc('foo_total', outcome='failed')
+
+        self.assertEqual(3, self.metrics.get('foo_total', outcome='created'))
+        self.assertEqual(0, self.metrics.get('foo_total', outcome='exists'))
+        self.metrics.reset()
+        self.assertEqual(0, self.metrics.get('foo_total', outcome='created'))
+
+    def test_histogram(self):
+        histogram = Histogram((1, 5))
+        for value in (0.5, 2, 10):
+            histogram.observe(value)
+
+        self.assertEqual([1, 2], histogram.counts)
+        self.assertEqual((3, 12.5), (histogram.count, histogram.sum))
+
+    def test_prometheus(self):
+        self.metrics.inc('gpypi_sync_failures_total', stage='unpack', exception='GPyPiNoSetupFile')
+        self.metrics.observe('gpypi_stage_seconds', 3, buckets=(1, 5), stage='unpack')
+
+        lines = self.metrics.to_prometheus(self.caches).splitlines()
+
+        self.assertEqual([
+            '# TYPE gpypi_sync_failures_total counter',
+            'gpypi_sync_failures_total{exception="GPyPiNoSetupFile",stage="unpack"} 1',
+            '# TYPE gpypi_cache_hits_total counter',
+            'gpypi_cache_hits_total{cache="gpypi.enamer.parse_pv"} 1',
+            '# TYPE gpypi_cache_misses_total counter',
+            'gpypi_cache_misses_total{cache="gpypi.enamer.parse_pv"} 2',
+            '# TYPE gpypi_stage_seconds histogram',
+            'gpypi_stage_seconds_bucket{stage="unpack",le="1"} 0',
+            'gpypi_stage_seconds_bucket{stage="unpack",le="5"} 1',
+            'gpypi_stage_seconds_bucket{stage="unpack",le="+Inf"} 1',
+            'gpypi_stage_seconds_sum{stage="unpack"} 3.000000',
+            'gpypi_stage_seconds_count{stage="unpack"} 1',
+        ], lines)
+
+    def test_label_escaping(self):
+        self.metrics.inc('foo_total', project='a"b')
+        self.assertTrue('foo_total{project="a\\"b"} 1' in self.metrics.to_prometheus({}))
+
+    def test_json(self):
+        self.metrics.inc('gpypi_sync_packages_total', outcome='exists')
+        self.metrics.observe('gpypi_stage_seconds', 2, stage='render')
+        self.metrics.observe('gpypi_stage_seconds', 4, stage='render')
+
+        data = self.metrics.to_dict(self.caches)
+
+        self.assertEqual([{'name': 'gpypi_sync_packages_total', 'labels': {'outcome': 'exists'},
+            'value': 1}], data['counters'])
+        self.assertEqual(3.0, data['histograms'][0]['mean'])
+        self.assertAlmostEqual(1 / 3.0, data['caches']['gpypi.enamer.parse_pv']['hit_rate'])
+
+    def test_write(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.metrics.inc('foo_total')
+
+        self.metrics.write(os.path.join(tmp_dir, 'stats', 'gpypi.json'))
+        self.metrics.write(os.path.join(tmp_dir, 'gpypi.prom'))
+
+        data = json.load(open(os.path.join(tmp_dir, 'stats', 'gpypi.json')))
+        self.assertEqual(1, data['counters'][0]['value'])
+        self.assertTrue('foo_total 1\n' in open(os.path.join(tmp_dir, 'gpypi.prom')).read())
+        self.assertEqual(['gpypi.json'], os.listdir(os.path.join(tmp_dir, 'stats')))
+
+    def test_writer(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'gpypi.prom')
+
+        writer = MetricsWriter(self.metrics, path, interval=0.01)
+        writer.start()
+        self.metrics.inc('foo_total')
+        writer.stop()
+
+        self.assertFalse(writer.is_alive())
+        self.assertTrue('foo_total 1\n' in open(path).read())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tarfile
+import tempfile
+from StringIO import StringIO
+
+import mock
+
+from gpypi.cli import GPyPI
+from gpypi.exc import *
+from gpypi.mirror import *
+from gpypi.tests import *
+
+PKG_INFO = """Metadata-Version: 1.1
+Name: Foo.Bar
+Version: 1.0
+Summary: Foo bar
+Home-page: http://foo.example.com
+Classifier: Programming Language :: Python
+Classifier: Topic :: Utilities
+"""
+
+
+class TestLocalMirror(BaseTestCase):
+    """Unittests for bandersnatch mirror as package source"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.web = os.path.join(self.tmp_dir, 'mirror', 'web')
+        self.distdir = os.path.join(self.tmp_dir, 'distfiles')
+        os.makedirs(self.distdir)
+
+        self.make_project('foo-bar', [
+            ('../../packages/source/F/Foo.Bar/Foo.Bar-1.0.tar.gz#md5=123', 'Foo.Bar-1.0.tar.gz'),
+            ('../../packages/2.7/F/Foo.Bar/Foo.Bar-1.0-py2.7.egg', 'Foo.Bar-1.0-py2.7.egg'),
+            ('http://pypi.python.org/packages/source/F/Foo.Bar/Foo.Bar-1.1.zip', 'Foo.Bar-1.1.zip'),
+        ])
+        self.sdist = os.path.join(self.web, 'packages', 'source', 'F', 'Foo.Bar', 'Foo.Bar-1.0.tar.gz')
+        os.makedirs(os.path.dirname(self.sdist))
+        with tarfile.open(self.sdist, 'w:gz') as archive:
+            info = tarfile.TarInfo('Foo.Bar-1.0/PKG-INFO')
+            info.size = len(PKG_INFO)
+            archive.addfile(info, StringIO(PKG_INFO))
+
+        self.make_project('baz', [('../../packages/source/b/baz/baz-2.0.tar.gz', 'baz-2.0.tar.gz')])
+        os.makedirs(os.path.join(self.web, 'json'))
+        with open(os.path.join(self.web, 'json', 'baz'), 'w') as f:
+            json.dump({'info': {'name': 'Baz', 'version': '2.0', 'summary': 'Baz'}}, f)
+
+        self.mirror = LocalMirror(os.path.join(self.tmp_dir, 'mirror'))
+
+        patcher = mock.patch('gpypi.portage_utils.PortageUtils.get_distdir',
+            return_value=self.distdir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_project(self, name, links):
+        directory = os.path.join(self.web, 'simple', name)
+        os.makedirs(directory)
+        with open(os.path.join(directory, 'index.html'), 'w') as f:
+            f.write('<html><body><h1>Links for %s</h1>\n' % name)
+            for href, text in links:
+                f.write('<a href="%s">%s</a><br/>\n' % (href, text))
+            f.write('</body></html>')
+
+    def test_layouts(self):
+        simple = os.path.join(self.web, 'simple')
+        self.assertEqual(simple, LocalMirror(self.web).simple_dir)
+        self.assertEqual(simple, LocalMirror(simple).simple_dir)
+        self.assertEqual(self.web, LocalMirror(simple).web_dir)
+        self.assertRaises(GPyPiConfigurationError, LocalMirror, os.path.join(self.tmp_dir, 'foo'))
+
+    def test_versions(self):
+        self.assertEqual(['baz', 'foo-bar'], self.mirror.list_packages())
+        self.assertEqual(('Foo.Bar', ['1.0', '1.1']), self.mirror.query_versions_pypi('foo_bar'))
+        self.assertEqual(('Baz', ['2.0']), self.mirror.query_versions_pypi('baz'))
+        self.assertEqual(('qux', []), self.mirror.query_versions_pypi('qux'))
+
+    def test_download_urls(self):
+        url = 'http://pypi.python.org/packages/source/F/Foo.Bar/Foo.Bar-1.0.tar.gz'
+        self.assertEqual([url], self.mirror.get_download_urls('Foo.Bar', '1.0', pkg_type='source'))
+        self.assertEqual(self.sdist, self.mirror.local_path(url))
+        # 1.1 is in the index, but the mirror doesn't have the file
+        url = self.mirror.get_download_urls('Foo.Bar', '1.1')[0]
+        self.assertEqual(None, self.mirror.local_path(url))
+
+    def test_release_data(self):
+        data = self.mirror.release_data('Foo.Bar', '1.0')
+        self.assertEqual('Foo bar', data['summary'])
+        self.assertEqual('http://foo.example.com', data['home_page'])
+        self.assertEqual(['Programming Language :: Python', 'Topic :: Utilities'],
+            data['classifiers'])
+        self.assertEqual('Baz', self.mirror.release_data('baz', '2.0')['summary'])
+        self.assertEqual({}, self.mirror.release_data('Foo.Bar', '1.1'))
+
+    def test_fetch(self):
+        url = self.mirror.get_download_urls('Foo.Bar', '1.0')[0]
+        dest = os.path.join(self.distdir, 'Foo.Bar-1.0.tar.gz')
+        self.assertEqual(dest, self.mirror.fetch(url))
+        self.assertEqual(PKG_INFO, LocalMirror.read_pkg_info(dest))
+        self.assertEqual(dest, self.mirror.fetch(url))
+        self.assertEqual(None, self.mirror.fetch(self.mirror.get_download_urls('Foo.Bar', '1.1')[0]))
+
+    def test_gpypi(self):
+        class Options:
+            mirror_dir = os.path.join(self.tmp_dir, 'mirror')
+
+        gpypi = GPyPI('foo.bar', '1.1', Options())
+        self.assertTrue(isinstance(gpypi.pypi, LocalMirror))
+        with mock.patch.object(gpypi, 'url_from_setuptools') as url_from_setuptools:
+            self.assertEqual('http://pypi.python.org/packages/source/F/Foo.Bar/Foo.Bar-1.1.zip',
+                gpypi.find_uri())
+            gpypi.version = '2.0'
+            self.assertEqual(None, gpypi.find_uri())
+        self.assertFalse(url_from_setuptools.called)
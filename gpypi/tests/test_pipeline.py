@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import gc
+import time
+import logging
+import shutil
+import tempfile
+import threading
+
+import mock
+
+from gpypi.pipeline import *
+from gpypi.journal import SyncJournal
+from gpypi.metrics import metrics
+from gpypi.config import Config, ConfigManager
+from gpypi.exc import *
+from gpypi.tests import *
+
+
+class TestPipeline(BaseTestCase):
+    """Unittests for staged processing"""
+
+    def test_run(self):
+        results = []
+
+        def split(i):
+            yield i
+            yield -i
+
+        def odd(i):
+            if i % 2:
+                yield i
+
+        pipeline = Pipeline([Stage('split', split, workers=3), Stage('odd', odd, workers=2),
+            Stage('collect', results.append)])
+        pipeline.run(xrange(10))
+
+        self.assertEqual([-9, -7, -5, -3, -1, 1, 3, 5, 7, 9], sorted(results))
+        self.assertEqual(10, pipeline.fed)
+        self.assertEqual([10, 20, 10], [stage.processed for stage in pipeline.stages])
+        self.assertEqual([20, 10, 0], [stage.produced for stage in pipeline.stages])
+
+    def test_failures(self):
+        def fail(i):
+            if i == 3:
+                raise GPyPiException('foobar')
+            return [i]
+
+        results = []
+        pipeline = Pipeline([Stage('fail', fail), Stage('collect', results.append)])
+        with mock.patch('gpypi.pipeline.log') as log:
+            pipeline.run(xrange(5))
+
+        self.assertEqual([0, 1, 2, 4], sorted(results))
+        self.assertEqual(1, pipeline.stages[0].failed)
+        self.assertEqual(1, log.exception.call_count)
+
+    def test_backpressure(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def produce(i):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            return [i]
+
+        def consume(i):
+            time.sleep(0.001)
+            with lock:
+                in_flight[0] -= 1
+
+        pipeline = Pipeline([Stage('produce', produce, workers=4), Stage('consume', consume)],
+            queue_size=5)
+        pipeline.run(xrange(200))
+
+        # queue + item being put by each producer + item being consumed
+        self.assertTrue(in_flight[1] <= 5 + 4 + 1, in_flight[1])
+        self.assertEqual(200, pipeline.stages[1].processed)
+
+    def test_report(self):
+        pipeline = Pipeline([Stage('foo', lambda i: [i]), Stage('bar', lambda i: None)])
+        pipeline.run(xrange(3))
+
+        report = pipeline.report()
+        self.assertEqual(3, len(report))
+        self.assertTrue(report[0].startswith('input: 3 items'))
+        self.assertTrue(report[1].startswith('foo: 3 processed (0 failed), 3 passed on'))
+
+    def test_stage_workers(self):
+        self.assertRaises(GPyPiConfigurationError, Stage, 'foo', None, 0)
+
+
+class TestSyncPipeline(BaseTestCase):
+    """Unittests for sync stages"""
+
+    def setUp(self):
+        self.config = ConfigManager(['argparse'])
+        self.config.configs['argparse'] = Config(sync_jobs='metadata=3', newest=2)
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_parse_jobs(self):
+        self.assertEqual({}, SyncPipeline.parse_jobs(''))
+        self.assertEqual({'unpack': 1, 'render': 3}, SyncPipeline.parse_jobs('unpack=1,render=3'))
+        self.assertRaises(GPyPiConfigurationError, SyncPipeline.parse_jobs, 'foobar=1')
+        self.assertRaises(GPyPiConfigurationError, SyncPipeline.parse_jobs, 'unpack=all')
+
+    def test_stages(self):
+        pipeline = SyncPipeline(self.config)
+
+        self.assertEqual(['metadata', 'download', 'unpack', 'render', 'workflows'],
+            [stage.name for stage in pipeline.stages])
+        self.assertEqual(3, pipeline.stages[0].workers)
+        self.assertEqual(100, pipeline.queue_size)
+
+    def test_metadata(self):
+        pipeline = SyncPipeline(self.config)
+        pypi = pipeline._local.pypi = mock.Mock()
+        pypi.query_versions_pypi.return_value = ('Foo', ['0.9', '1.0', '1.1'])
+        pypi.get_download_urls.side_effect = lambda pn, v, pkg_type: [] if v == '1.0' else ['uri']
+        pypi.release_data.return_value = {'name': 'Foo'}
+
+        with mock.patch('gpypi.pipeline.log'):
+            jobs = list(pipeline.metadata('foo'))
+
+        self.assertEqual(1, len(jobs))
+        options, metadata = jobs[0]
+        self.assertEqual(('Foo', '1.1', 'uri'), (options.up_pn, options.up_pv, options.uri))
+        self.assertEqual({'name': 'Foo'}, metadata)
+        self.assertEqual('', self.config.up_pn)
+
+    def test_download_bytes(self):
+        from gpypi.portage_utils import PortageUtils
+
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        pipeline = SyncPipeline(self.config)
+        options = self.config.snapshot(uri='http://pypi.python.org/packages/source/f/foo/foo-1.0.tar.gz',
+            up_pn='foo', up_pv='1.0')
+
+        def unpack_ebuild(path, phases):
+            open(os.path.join(tmp_dir, 'foo-1.0.tar.gz'), 'w').close()
+
+        with mock.patch('gpypi.ebuild.Ebuild') as Ebuild:
+            Ebuild.return_value.__getitem__ = lambda self, key: {'pn': 'foo', 'pv': '1.0'}[key]
+            Ebuild.return_value.ebuild_path = os.path.join(tmp_dir, 'foo-1.0.ebuild')
+            with mock.patch.multiple(PortageUtils, ebuild_exists=mock.DEFAULT,
+                    get_distdir=mock.DEFAULT, unpack_ebuild=mock.DEFAULT, manifest_dist_sizes=mock.DEFAULT) as patched:
+                patched['ebuild_exists'].return_value = False
+                patched['get_distdir'].return_value = tmp_dir
+                patched['unpack_ebuild'].side_effect = unpack_ebuild
+                patched['manifest_dist_sizes'].return_value = {'foo-1.0.tar.gz': 100}
+                self.assertEqual(1, len(list(pipeline.download((options, {})))))
+                self.assertEqual(1, len(list(pipeline.download((options, {})))))
+
+        self.assertEqual(100, metrics.get('gpypi_download_bytes_total'))
+
+    def test_journal(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        journal = SyncJournal(os.path.join(tmp_dir, 'sync.journal'))
+        journal.record('Foo', '1.1', SyncJournal.CREATED)
+        pipeline = SyncPipeline(self.config, journal)
+        pypi = pipeline._local.pypi = mock.Mock()
+        pypi.query_versions_pypi.return_value = ('Foo', ['1.0', '1.1'])
+        pypi.get_download_urls.return_value = []
+
+        with mock.patch('gpypi.pipeline.log'):
+            self.assertEqual([], list(pipeline.stages[0].func('foo')))
+            pypi.query_versions_pypi.side_effect = IOError('timeout')
+            self.assertRaises(IOError, list, pipeline.stages[0].func('bar'))
+
+        self.assertEqual(SyncJournal.NO_URL, journal.entries[('foo', '1.0')]['outcome'])
+        self.assertEqual(SyncJournal.COMPLETE, journal.entries[('foo', None)]['outcome'])
+        self.assertEqual(SyncJournal.FAILED, journal.entries[('bar', None)]['outcome'])
+        self.assertEqual(1, journal.skipped)
+        self.assertEqual(1, metrics.get('gpypi_sync_packages_total', outcome='skipped'))
+        self.assertEqual(1, metrics.get('gpypi_sync_packages_total', outcome=SyncJournal.NO_URL))
+        self.assertEqual(1, metrics.get('gpypi_sync_failures_total', stage='metadata', exception='IOError'))
+
+    def test_journal_resume_complete(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'sync.journal')
+        pypi = mock.Mock()
+        pypi.query_versions_pypi.side_effect = lambda name: (name.capitalize(), ['1.0', '1.1'])
+        pypi.get_download_urls.return_value = ['uri']
+        pypi.release_data.return_value = {}
+
+        journal = SyncJournal(path)
+        pipeline = SyncPipeline(self.config, journal)
+        pipeline._local.pypi = pypi
+        self.assertEqual(2, len(list(pipeline.stages[0].func('foo'))))
+        self.assertEqual(2, len(list(pipeline.stages[0].func('bar'))))
+        journal.record('Foo', '1.0', SyncJournal.CREATED)
+        self.assertFalse(('foo', None) in journal.entries)
+        journal.record('Foo', '1.1', SyncJournal.EXISTS)
+        journal.record('Bar', '1.1', SyncJournal.FAILED)
+        journal.close()
+
+        pypi.reset_mock()
+        journal = SyncJournal(path, resume=True)
+        self.addCleanup(journal.close)
+        pipeline = SyncPipeline(self.config, journal)
+        pipeline._local.pypi = pypi
+        self.assertEqual([], list(pipeline.stages[0].func('foo')))
+        self.assertEqual([], pypi.query_versions_pypi.call_args_list)
+        self.assertEqual(['1.1', '1.0'], [options.up_pv for options, metadata
+            in pipeline.stages[0].func('bar')])
+        pypi.query_versions_pypi.assert_called_once_with('bar')
+
+    def test_journal_project_retries(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'sync.journal')
+        pypi = mock.Mock()
+        pypi.query_versions_pypi.side_effect = IOError('timeout')
+
+        for attempt in range(3):
+            journal = SyncJournal(path, resume=True, retries=1)
+            pipeline = SyncPipeline(self.config, journal)
+            pipeline._local.pypi = pypi
+            with mock.patch('gpypi.pipeline.log'):
+                try:
+                    list(pipeline.stages[0].func('bar'))
+                except IOError:
+                    pass
+            journal.close()
+
+        # failed twice, then skipped without querying
+        self.assertEqual(2, pypi.query_versions_pypi.call_count)
+        self.assertEqual((1, 0), (journal.skipped, journal.retried))
+
+    def test_streaming(self):
+        produced = []
+
+        def metadata(package):
+            for i in range(3):
+                produced.append(i)
+                yield i
+
+        pipeline = SyncPipeline(self.config)
+        stream = pipeline.journaled(metadata)('foo')
+        self.assertEqual(0, next(stream))
+        self.assertEqual([0], produced)
+
+        packages = ['foo', 'bar']
+        self.assertEqual('foo', next(pipeline.consume(packages)))
+        self.assertEqual(['bar'], packages)
+
+
+class FakePyPI(object):
+    """XML-RPC client of a big index with long descriptions"""
+
+    def __init__(self, size):
+        self.size = size
+
+    def list_packages(self):
+        return ['project%05d' % i for i in xrange(self.size)]
+
+    def query_versions_pypi(self, package):
+        return package, ['1.0']
+
+    def get_download_urls(self, pn, version, pkg_type):
+        return ['http://pypi.python.org/packages/source/p/%s/%s-%s.tar.gz' % (pn, pn, version)]
+
+    def release_data(self, pn, version):
+        return {'name': pn, 'version': version, 'summary': 'Project %s' % pn,
+            'description': ('%s\n' % pn) * 2000, 'license': 'BSD',
+            'classifiers': ['Topic :: Utilities', 'License :: OSI Approved :: BSD License']}
+
+
+class TestSyncMemory(BaseTestCase):
+    """Resident memory of sync doesn't grow with number of packages"""
+    PROJECTS = 10000
+    STATM = '/proc/self/statm'
+
+    def setUp(self):
+        if not os.path.exists(self.STATM):
+            self.skipTest("needs %s" % self.STATM)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.config = ConfigManager(['argparse', 'pypi'])
+        self.config.configs['argparse'] = Config(category='dev-python', overwrite=True,
+            sync_jobs='render=2')
+        self.config.configs['pypi'] = Config()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+        def analyze(ebuild):
+            ebuild.setup_keywords = {'name': ebuild.options.up_pn, 'long_description': 'x' * 20000}
+            ebuild.probe = {'s': '${WORKDIR}'}
+
+        def write(ebuild, overwrite=False):
+            ebuild.ebuild_path = os.path.join(self.tmp_dir, ebuild['p'] + '.ebuild')
+            return True
+
+        def returning(value):
+            # mocks would remember every call
+            return classmethod(lambda cls, *args, **kw: value)
+
+        from gpypi.ebuild import Ebuild
+        from gpypi.enamer import Enamer
+        from gpypi.portage_utils import PortageUtils
+        from gpypi.utils import CACHES
+        patches = [
+            mock.patch.object(PortageUtils, 'get_keyword', returning('~amd64')),
+            mock.patch.object(PortageUtils, 'ebuild_exists', returning(False)),
+            mock.patch.object(PortageUtils, 'unpack_ebuild', returning(None)),
+            mock.patch.object(PortageUtils, 'manifest_dist_sizes', returning({})),
+            mock.patch.object(PortageUtils, 'get_distdir', returning(self.tmp_dir)),
+            mock.patch.object(Enamer, 'is_valid_portage_license', returning(True)),
+            mock.patch.object(Ebuild, 'analyze', analyze),
+            mock.patch.object(Ebuild, 'write', write),
+            mock.patch.object(Ebuild, 'run_workflows', lambda ebuild: None),
+            mock.patch.object(Ebuild, 'record_dependencies', lambda ebuild: None),
+        ]
+        # caches are bounded on their own, see TestUtils
+        for cache in CACHES.values():
+            patches.append(mock.patch.object(cache, 'maxsize', 100))
+            cache.clear()
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def rss(self):
+        with open(self.STATM) as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    def sync(self, size):
+        pipeline = SyncPipeline(self.config)
+        # shared by all worker threads
+        with mock.patch.object(SyncPipeline, 'pypi', FakePyPI(size)):
+            pipeline.run()
+        self.assertEqual(size, metrics.get('gpypi_sync_packages_total', outcome=SyncJournal.CREATED))
+        metrics.reset()
+
+    def test_flat_rss(self):
+        # warm up caches, templates and allocator
+        self.sync(self.PROJECTS // 10)
+        gc.collect()
+        before = self.rss()
+
+        self.sync(self.PROJECTS)
+        growth = self.rss() - before
+        self.assertTrue(growth < 20 * 1024 * 1024, "RSS grew by %d kB" % (growth // 1024))
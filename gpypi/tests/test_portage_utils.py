@@ -9,6 +9,7 @@ from gpypi.portage_utils import *
 from gpypi.tests import *
 from gpypi.exc import *
 
+import mock
 import mocker
 
 
@@ -29,9 +30,24 @@ class TestPortageUtils(BaseTestCase):
         d = PortageUtils.get_all_overlays()
         # TODO: mock overlays locations
 
+    def test_lazy_environment(self):
+        env = {'PORTDIR': '/foo/portage', 'PORTDIR_OVERLAY': ''}
+        with mock.patch('gpypi.portage_utils._portage', (None, env)):
+            self.assertEqual('/foo/portage', ENV['PORTDIR'])
+            self.assertEqual('/foo/portage', PortageUtils.get_portdir())
+            self.assertEqual(['/foo/portage'], PortageUtils.get_porttrees())
+            ENV['PORTDIR_OVERLAY'] += ' %s' % self.overlay
+            self.assertEqual(' %s' % self.overlay, env['PORTDIR_OVERLAY'])
+            self.assertIn('PORTDIR', ENV)
+            self.assertEqual(None, ENV.get('ARCH'))
+
     def test_installed_ver(self):
         """"""
-        pass
+        index = mock.Mock()
+        index.get_versions.return_value = {'dev-python/foo': '1.0'}
+        with mock.patch.object(PortageUtils, '_installed_index', index):
+            self.assertEqual('1.0', PortageUtils.get_installed_ver('dev-python/foo'))
+        index.get_versions.assert_called_once_with(['dev-python/foo'])
 
     def test_is_valid_atom(self):
         """"""
@@ -46,6 +62,13 @@ class TestPortageUtils(BaseTestCase):
         """"""
         pass
 
+    def test_manifest_dist_sizes(self):
+        with open(os.path.join(self.overlay, 'Manifest'), 'w') as f:
+            f.write("DIST foobar-1.0.tar.gz 12345 SHA256 abc\n"
+                "EBUILD foobar-1.0.ebuild 678 SHA256 def\n")
+        self.assertEqual({'foobar-1.0.tar.gz': 12345}, PortageUtils.manifest_dist_sizes(self.overlay))
+        self.assertEqual({}, PortageUtils.manifest_dist_sizes('/dev/null'))
+
     def test_find_s_dir(self):
         """"""
         pass
@@ -78,3 +101,160 @@ class TestPortageUtils(BaseTestCase):
 
         with self.assertRaises(GPyPiCouldNotCreateEbuildPath):
             PortageUtils.make_ebuild_dir('dev-python', 'foobar', '/dev/null')
+
+
+class TestFileBackedIndex(BaseTestCase):
+    """Unittests for base class of file backed indexes"""
+
+    def test_abstract(self):
+        class NoLoad(FileBackedIndex):
+            def signature(self):
+                return None
+
+        self.assertRaises(TypeError, NoLoad)
+        self.assertRaises(TypeError, FileBackedIndex)
+
+
+class TestLicenseRegistry(BaseTestCase):
+    """Unittests for licenses index"""
+
+    def setUp(self):
+        self.portdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.portdir)
+        self.overlay = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.overlay)
+        os.mkdir(os.path.join(self.portdir, 'licenses'))
+        open(os.path.join(self.portdir, 'licenses', 'GPL-2'), 'w').close()
+        self.registry = LicenseRegistry([self.portdir, self.overlay])
+
+    def test_contains(self):
+        self.assertIn('GPL-2', self.registry)
+        self.assertNotIn('GPL', self.registry)
+        self.assertEqual(['GPL-2'], list(self.registry))
+        self.assertTrue(self.registry.has_directory())
+
+    def test_refresh_on_change(self):
+        self.assertNotIn('foobar', self.registry)
+        os.mkdir(os.path.join(self.overlay, 'licenses'))
+        open(os.path.join(self.overlay, 'licenses', 'foobar'), 'w').close()
+
+        # modification times are not checked within CHECK_INTERVAL
+        self.assertNotIn('foobar', self.registry)
+        self.registry.refresh(force=True)
+        self.assertIn('foobar', self.registry)
+        self.assertEqual(2, len(self.registry))
+
+    def test_no_licenses_directory(self):
+        registry = LicenseRegistry([self.overlay])
+        self.assertEqual(0, len(registry))
+        self.assertFalse(registry.has_directory())
+
+
+class TestOverlayRegistry(BaseTestCase):
+    """Unittests for overlays index"""
+
+    def make_tree(self, name, layout=""):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        os.mkdir(os.path.join(path, 'profiles'))
+        os.mkdir(os.path.join(path, 'metadata'))
+        open(os.path.join(path, 'profiles', 'repo_name'), 'w').write(name + '\n')
+        open(os.path.join(path, 'metadata', 'layout.conf'), 'w').write(layout)
+        return path
+
+    def setUp(self):
+        self.portdir = self.make_tree('gentoo')
+        self.overlay = self.make_tree('local',
+            'masters = gentoo\nmanifest-hashes = SHA256 SHA512 # comment\nthin-manifests = true\n')
+        self.repos_conf = os.path.join(self.portdir, 'repos.conf')
+        self.env = {'PORTDIR': self.portdir, 'PORTDIR_OVERLAY': self.overlay}
+        patcher = mock.patch('gpypi.portage_utils._portage', (None, self.env))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.registry = OverlayRegistry(self.repos_conf)
+
+    def test_environment(self):
+        self.assertEqual({'gentoo': self.portdir, 'local': self.overlay},
+            self.registry.as_dict())
+        self.assertIn('local', self.registry)
+
+    def test_layout(self):
+        overlay = self.registry['local']
+        self.assertEqual(['gentoo'], overlay.masters)
+        self.assertEqual(['SHA256', 'SHA512'], overlay.manifest_hashes)
+        self.assertTrue(overlay.thin_manifests)
+        self.assertEqual([], self.registry['gentoo'].masters)
+
+    def test_repos_conf(self):
+        extra = self.make_tree('extra')
+        open(self.repos_conf, 'w').write('[extra]\nlocation = %s\n' % extra)
+        self.registry.refresh(force=True)
+        self.assertEqual(extra, self.registry['extra'].path)
+
+    def test_environment_change(self):
+        self.assertNotIn('other', self.registry)
+        self.env['PORTDIR_OVERLAY'] += ' %s' % self.make_tree('other')
+        self.assertIn('other', self.registry)
+
+    def test_repo_name_change(self):
+        self.registry.refresh()
+        open(os.path.join(self.overlay, 'profiles', 'repo_name'), 'w').write('renamed')
+        os.utime(os.path.join(self.overlay, 'profiles', 'repo_name'), (0, 0))
+        self.registry.refresh(force=True)
+        self.assertIn('renamed', self.registry)
+        self.assertNotIn('local', self.registry)
+
+    def test_get_overlay_path(self):
+        with mock.patch.object(PortageUtils, '_overlay_registry', self.registry):
+            self.assertEqual(self.overlay, PortageUtils.get_overlay_path('local'))
+            self.assertRaises(GPyPiOverlayDoesNotExist, PortageUtils.get_overlay_path, 'foobar')
+
+    def test_package_overlays(self):
+        for tree in (self.portdir, self.overlay):
+            os.makedirs(os.path.join(tree, 'dev-python', 'foo'))
+        open(os.path.join(self.overlay, 'dev-python', 'foo', 'foo-1.0.ebuild'), 'w').close()
+        with mock.patch.object(PortageUtils, '_overlay_registry', self.registry):
+            self.assertEqual(['local'], PortageUtils.package_overlays('dev-python/foo'))
+            self.assertEqual([], PortageUtils.package_overlays('dev-python/bar'))
+
+
+class TestInstalledPackagesIndex(BaseTestCase):
+    """Unittests for installed packages index"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.vdb = os.path.join(self.root, 'pkg')
+        self.counter = os.path.join(self.root, 'counter')
+        self.install('dev-python', 'foo-1.0')
+        self.install('dev-python', 'foo-1.2-r1', slot='1')
+        self.set_counter(1)
+        self.index = InstalledPackagesIndex(self.vdb, self.counter)
+
+    def install(self, category, pf, slot='0'):
+        path = os.path.join(self.vdb, category, pf)
+        os.makedirs(path)
+        open(os.path.join(path, 'SLOT'), 'w').write(slot + '\n')
+
+    def set_counter(self, counter):
+        open(self.counter, 'w').write(str(counter))
+
+    def test_versions(self):
+        self.assertEqual([('1.2-r1', '1'), ('1.0', '0')], self.index.versions('dev-python/foo'))
+        self.assertEqual([], self.index.versions('dev-python/bar'))
+        self.assertIn('test? ( dev-python/foo[bar] )', self.index)
+
+    def test_get_versions(self):
+        self.assertEqual({'dev-python/foo': '1.2-r1', 'dev-python/bar': None},
+            self.index.get_versions(['dev-python/foo', 'dev-python/bar']))
+
+    def test_refresh_on_counter(self):
+        self.assertNotIn('dev-python/bar', self.index)
+        self.install('dev-python', 'bar-0.1')
+        self.set_counter(2)
+        self.index.refresh(force=True)
+        self.assertIn('dev-python/bar', self.index)
+
+    def test_missing_vdb(self):
+        index = InstalledPackagesIndex('/dev/null/foobar', '/dev/null/foobar')
+        self.assertEqual([], index.versions('dev-python/foo'))
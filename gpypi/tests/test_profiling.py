@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+
+from gpypi.profiling import *
+from gpypi.tests import *
+
+
+class TestProfiler(BaseTestCase):
+    """Unittests for timing spans"""
+
+    def setUp(self):
+        self.profiler = Profiler()
+        self.profiler.enable()
+
+    def test_disabled(self):
+        self.profiler.disable()
+        with self.profiler.span('foo', package='bar'):
+            pass
+
+        self.assertTrue(self.profiler.span('foo') is Profiler.NULL_SPAN)
+        self.assertEqual({}, self.profiler.timings)
+
+    def test_nested(self):
+        with self.profiler.span('package', package='foo'):
+            for i in range(2):
+                with self.profiler.span('unpack'):
+                    pass
+        with self.profiler.span('package', package='bar'):
+            with self.profiler.span('unpack'):
+                pass
+
+        self.assertEqual([('foo', 'package'), ('foo', 'package/unpack'),
+            ('bar', 'package'), ('bar', 'package/unpack')], self.profiler.timings.keys())
+        self.assertEqual(2, self.profiler.timings[('foo', 'package/unpack')][0])
+        self.assertEqual(3, self.profiler.aggregate()['package/unpack'][0])
+        self.assertEqual([], self.profiler.stack())
+
+    def test_exclude(self):
+        with self.profiler.span('metadata', package='foo') as current:
+            current.exclude(10)
+        self.assertTrue(self.profiler.timings[('foo', 'metadata')][1] < -9)
+
+        self.profiler.disable()
+        with self.profiler.span('metadata') as current:
+            current.exclude(10)
+        self.assertEqual({}, self.profiler.timings)
+
+    def test_exception(self):
+        def fail():
+            with self.profiler.span('fail', package='foo'):
+                raise ValueError
+
+        self.assertRaises(ValueError, fail)
+        self.assertEqual(1, self.profiler.timings[('foo', 'fail')][0])
+        self.assertEqual([], self.profiler.stack())
+
+    def test_threads(self):
+        def work(name):
+            with self.profiler.span('package', package=name):
+                with self.profiler.span('write'):
+                    pass
+
+        threads = [threading.Thread(target=work, args=(str(i),)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(8, len(self.profiler.timings))
+        self.assertEqual(4, self.profiler.aggregate()['package/write'][0])
+
+    def test_report(self):
+        with self.profiler.span('package', package='foo'):
+            with self.profiler.span('write'):
+                pass
+        with self.profiler.span('cleanup'):
+            pass
+
+        report = self.profiler.report()
+        self.assertEqual(['Profile per package:', 'foo:'], report[:2])
+        self.assertTrue(report[3].startswith('    write'))
+        self.assertEqual('(no package):', report[4])
+        self.assertTrue(report[9].startswith('  package/write'))
+
+    def test_finish_dumps_stats(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'gpypi.pstats')
+        profiler = Profiler()
+        profiler.enable(path)
+        with profiler.span('foo'):
+            pass
+
+        report = profiler.finish()
+
+        self.assertTrue(report[2].startswith('  foo'))
+        self.assertFalse(profiler.enabled)
+        self.assertTrue(pstats.Stats(path).total_calls > 0)
+
+    def test_traced(self):
+        @traced('foo')
+        def foo(a, b=1):
+            return a + b
+
+        profiler.enable()
+        self.addCleanup(profiler.disable)
+        self.assertEqual(3, foo(1, b=2))
+        self.assertEqual(1, profiler.timings[(None, 'foo')][0])
+        self.assertEqual('foo', foo.__name__)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+import tempfile
+import threading
+
+import mock
+
+from gpypi.cli import CLI, GPyPI
+from gpypi.config import Config, ConfigManager
+from gpypi.rdeps import *
+from gpypi.tests import *
+
+
+class FakeEbuild(dict):
+
+    def __init__(self, path, up_pn, up_pv, depend=(), rdepend=()):
+        super(FakeEbuild, self).__init__(depend=set(depend), rdepend=set(rdepend))
+        self.ebuild_path = path
+        self.options = mock.Mock(up_pn=up_pn, up_pv=up_pv)
+
+
+class TestReverseDependencyIndex(BaseTestCase):
+    """Unittests for reverse dependency index and gpypi rdeps"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.index = ReverseDependencyIndex(os.path.join(self.tmp_dir, 'cache', INDEX_NAME))
+        self.addCleanup(self.index.close)
+
+    def write(self, pn, pv, up_pn, **deps):
+        path = os.path.join(self.tmp_dir, 'overlay', 'dev-python', pn, '%s-%s.ebuild' % (pn, pv))
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+        ebuild = FakeEbuild(path, up_pn, pv, **deps)
+        self.index.update(ebuild)
+        return ebuild
+
+    def test_dependants(self):
+        self.write('bar', '1.0', 'Bar', depend=['dev-python/setuptools'],
+            rdepend=['>=dev-python/foo-1.0', 'test? ( dev-python/nose )'])
+        self.write('baz', '2.0', 'baz', rdepend=['dev-python/bar'])
+
+        dependants = self.index.dependants('dev-python/foo')
+        self.assertEqual([('dev-python/bar', 'bar-1.0', 'Bar', '1.0', ['>=dev-python/foo-1.0'])],
+            [(e['cpn'], e['pf'], e['up_pn'], e['up_pv'], e['atoms']) for e in dependants])
+        self.assertEqual(['bar-1.0'], [e['pf'] for e in self.index.dependants('nose')])
+        self.assertEqual(['bar-1.0', 'baz-2.0'],
+            [e['pf'] for e in self.index.dependants('foo', recursive=True)])
+        self.assertEqual([], self.index.dependants('dev-python/baz'))
+        self.assertEqual([], self.index.dependants('Foo'))
+        self.assertEqual([], self.index.dependants('%'))
+        self.assertEqual([], self.index.dependants('fo_'))
+
+    def test_dependants_dedupes_atoms(self):
+        self.write('bar', '1.0', 'Bar', depend=['dev-python/foo'], rdepend=['dev-python/foo'])
+        self.assertEqual([['dev-python/foo']], [e['atoms'] for e in self.index.dependants('foo')])
+
+    def test_update_replaces(self):
+        ebuild = self.write('bar', '1.0', 'Bar', rdepend=['dev-python/foo'])
+        ebuild['rdepend'] = set(['dev-python/qux'])
+        self.index.update(ebuild)
+        self.assertEqual([], self.index.dependants('dev-python/foo'))
+        self.assertEqual(['bar-1.0'], [e['pf'] for e in self.index.dependants('dev-python/qux')])
+
+        os.remove(ebuild.ebuild_path)
+        self.assertEqual([], self.index.dependants('dev-python/qux'))
+        self.assertEqual(0, self.index.db.execute("SELECT COUNT(*) FROM ebuilds").fetchone()[0])
+
+    def test_record_ebuild(self):
+        ebuild = FakeEbuild(os.path.join(self.tmp_dir, 'dev-python', 'bar', 'bar-1.0.ebuild'),
+            'bar', '1.0', rdepend=['dev-python/foo'])
+        ebuild.options.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        record_ebuild(ebuild)
+        self.assertEqual(1, len(self.index.db.execute("SELECT * FROM dependencies").fetchall()))
+
+        ebuild.options.cache_dir = '/dev/null/gpypi'
+        record_ebuild(ebuild)
+
+    def test_shared(self):
+        path = os.path.join(self.tmp_dir, 'cache', INDEX_NAME)
+        index = ReverseDependencyIndex.shared(path)
+        self.addCleanup(index.close)
+        self.assertTrue(index is ReverseDependencyIndex.shared(path))
+
+        indexes = []
+        thread = threading.Thread(target=lambda: indexes.append(ReverseDependencyIndex.shared(path)))
+        thread.start()
+        thread.join()
+        self.assertFalse(indexes[0] is index)
+
+    def test_regenerate(self):
+        self.write('bar', '1.0', 'Bar', rdepend=['dev-python/foo'])
+        self.write('bar', '2.0', 'Bar', depend=['dev-python/foo'], rdepend=['dev-python/foo'])
+        config = ConfigManager(['argparse'])
+        config.configs['argparse'] = Config(command='rdeps', rdeps_package='foo', regenerate=True,
+            cache_dir=os.path.join(self.tmp_dir, 'cache'))
+
+        with mock.patch.object(GPyPI, 'get_pypi'):
+            with mock.patch.object(GPyPI, 'create_ebuilds', autospec=True) as create_ebuilds:
+                CLI(config)
+
+        gpypi = create_ebuilds.call_args[0][0]
+        self.assertEqual([('Bar', '1.0'), ('Bar', '2.0')], gpypi.tree)
+        self.assertTrue(gpypi.options.overwrite)
+        self.assertTrue(gpypi.options.no_deps)
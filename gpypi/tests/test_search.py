@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+from gpypi.search import *
+from gpypi.store import MetadataStore
+from gpypi.tests import *
+
+
+def dump(*entries):
+    return StringIO("".join(json.dumps(entry) + "\n" for entry in entries))
+
+
+def project(name, summary, keywords='', classifiers=()):
+    return {'name': name, 'versions': ['0.1', '1.0'], 'releases': {
+        '0.1': {'release_data': {'summary': 'Old'}},
+        '1.0': {'release_data': {'summary': summary, 'keywords': keywords,
+            'classifiers': list(classifiers)}}}}
+
+
+class TestSearchIndex(BaseTestCase):
+    """Unittests for gpypi search"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.store = MetadataStore(os.path.join(self.tmp_dir, 'metadata.db'))
+        self.addCleanup(self.store.close)
+        self.store.import_dump(dump(
+            project('Zope.Interface', 'Interfaces for Python'),
+            project('zope.component', 'Zope Component Architecture', 'zope interface'),
+            project('Flask', 'Web microframework', classifiers=['Framework :: Flask']),
+        ))
+        self.index = SearchIndex(self.store)
+
+    def names(self, query, limit=20):
+        return [name for name, summary in self.index.search(query, limit)]
+
+    def test_search(self):
+        self.assertEqual(3, self.index.update())
+        self.assertEqual(['Zope.Interface', 'zope.component'], self.names('zope.interface'))
+        self.assertEqual(['zope.component', 'Zope.Interface'], self.names('zope component'))
+        self.assertEqual(['Flask'], self.names('flask'))
+        self.assertEqual(['zope.component'], self.names('zope', limit=1))
+        self.assertEqual([], self.names('django'))
+        self.assertEqual([], self.names('Old'))
+        self.assertEqual([('Flask', 'Web microframework')], self.index.search('microframework'))
+
+    def test_incremental_update(self):
+        self.index.update()
+        self.assertEqual(0, self.index.update())
+
+        self.store.import_dump(dump(project('Flask', 'Micro web framework'),
+            project('Django', 'Web framework')))
+        self.assertEqual(2, self.index.update())
+        self.assertEqual(['Django', 'Flask'], self.names('framework'))
+        self.assertEqual([], self.names('microframework'))
+
+        self.assertEqual(4, self.index.update(full=True))
+        self.assertEqual(['Django', 'Flask'], self.names('framework'))
+
+    def test_category(self):
+        self.store.import_dump(dump(project('irc-bot', 'IRC bot',
+            classifiers=['Topic :: Communications :: Chat'])))
+        self.assertEqual('net-misc', self.index.category('IRC_Bot'))
+        self.assertEqual('dev-python', self.index.category('Flask'))
+        self.assertEqual('dev-python', self.index.category('missing'))
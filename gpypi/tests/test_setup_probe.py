@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import shutil
+import tempfile
+
+from gpypi.exc import *
+from gpypi.setup_probe import *
+from gpypi.tests import *
+
+
+class TestSetupProbe(BaseTestCase):
+    """Unittests for running setup.py in a child process"""
+
+    def setUp(self):
+        self.s = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.s)
+        self.setup_file = os.path.join(self.s, 'setup.py')
+
+    def write(self, name, contents):
+        with open(os.path.join(self.s, name), 'w') as f:
+            f.write(contents)
+
+    def test_run(self):
+        self.write('version.py', "VERSION = '1.0'\n")
+        self.write('setup.py', "import os\n"
+            "from setuptools import setup, Command\n"
+            "from version import VERSION\n"
+            "open('cwd', 'w').write(os.getcwd())\n"
+            "print 'running setup.py'\n"
+            "setup(name='foo', version=VERSION, packages=('foo',), cmdclass={'test': Command},\n"
+            "    install_requires=['bar>=1.0'], extras_require={'baz': ['baz']})\n")
+        cwd, path, modules = os.getcwd(), sys.path[:], set(sys.modules)
+
+        keywords = run(self.setup_file)
+
+        self.assertEqual({'name': 'foo', 'version': '1.0', 'packages': ['foo'], 'cmdclass': {},
+            'install_requires': ['bar>=1.0'], 'extras_require': {'baz': ['baz']}}, keywords)
+        self.assertTrue(all(isinstance(key, str) for key in keywords))
+        self.assertEqual(os.path.realpath(self.s), os.path.realpath(open(os.path.join(self.s, 'cwd')).read()))
+        self.assertEqual((cwd, path), (os.getcwd(), sys.path))
+        self.assertFalse('version' in set(sys.modules) - modules)
+
+    def test_run_fails(self):
+        self.write('setup.py', "import missing_module\n")
+        with self.assertRaises(GPyPiSetupError) as cm:
+            run(self.setup_file)
+        self.assertIn('No module named missing_module', str(cm.exception))
+
+        self.write('setup.py', "import sys\nsys.exit(3)\n")
+        self.assertRaises(GPyPiSetupError, run, self.setup_file)
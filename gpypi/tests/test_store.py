@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+import mock
+
+from gpypi.cli import GPyPI
+from gpypi.exc import *
+from gpypi.store import *
+from gpypi.tests import *
+
+
+def dump(*entries):
+    return StringIO("".join(json.dumps(entry) + "\n" for entry in entries))
+
+
+class TestMetadataStore(BaseTestCase):
+    """Unittests for bulk metadata import and offline queries"""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.store = MetadataStore(os.path.join(self.tmp_dir, 'cache', STORE_NAME), batch_size=2)
+        self.addCleanup(self.store.close)
+        self.foo = {'name': 'Foo.Bar', 'versions': ['1.0', '1.1'], 'releases': {
+            '1.1': {'release_data': {'summary': 'Foo'}, 'requires_dist': ['baz (>=1.0)'],
+                'urls': ['http://pypi.python.org/packages/2.7/F/Foo.Bar/Foo.Bar-1.1-py2-none-any.whl',
+                    'http://pypi.python.org/packages/source/F/Foo.Bar/Foo.Bar-1.1.tar.gz#md5=123']}}}
+
+    def test_import(self):
+        count = self.store.import_dump(dump(self.foo, {'name': 'baz'}, {'name': 'Qux', 'versions': ['2']}))
+
+        self.assertEqual(3, count)
+        self.assertEqual(3, len(self.store))
+        self.assertEqual(['baz', 'Foo.Bar', 'Qux'], self.store.list_packages())
+        self.assertEqual(('Foo.Bar', ['1.0', '1.1']), self.store.query_versions_pypi('foo_bar'))
+        self.assertEqual(('missing', []), self.store.query_versions_pypi('missing'))
+        self.assertEqual({'summary': 'Foo', 'requires_dist': ['baz (>=1.0)']},
+            self.store.release_data('FOO.BAR', '1.1'))
+        self.assertEqual(self.foo['releases']['1.1']['urls'],
+            self.store.get_download_urls('Foo.Bar', '1.1'))
+        self.assertEqual(self.foo['releases']['1.1']['urls'][1:],
+            self.store.get_download_urls('Foo.Bar', '1.1', pkg_type='source'))
+        self.assertEqual([], self.store.get_download_urls('Foo.Bar', '1.0'))
+        self.assertEqual({}, self.store.release_data('Foo.Bar', '1.0'))
+
+    def test_import_replaces(self):
+        self.store.import_dump(dump(self.foo))
+        self.store.import_dump(StringIO('{"name": "foo-bar", "versions": ["2.0"]}\nnot json\n\n'))
+
+        self.assertEqual(1, len(self.store))
+        self.assertEqual(('foo-bar', ['2.0']), self.store.query_versions_pypi('Foo.Bar'))
+        self.assertEqual([], self.store.get_download_urls('Foo.Bar', '1.1'))
+
+    def test_export(self):
+        self.store.import_dump(dump(self.foo, {'name': 'baz'}))
+        stream = StringIO()
+        self.assertEqual(2, self.store.export_dump(stream))
+
+        store = MetadataStore(os.path.join(self.tmp_dir, 'copy.db'))
+        self.addCleanup(store.close)
+        store.import_dump(StringIO(stream.getvalue()))
+        self.assertEqual(self.store.list_packages(), store.list_packages())
+        self.assertEqual(self.store.release_data('Foo.Bar', '1.1'), store.release_data('Foo.Bar', '1.1'))
+
+        self.assertRaises(GPyPiInvalidParameter, self.store.transfer, 'import',
+            os.path.join(self.tmp_dir, 'missing.jsonl'))
+
+    def test_offline_gpypi(self):
+        self.store.import_dump(dump(self.foo))
+
+        class Options:
+            mirror_dir = ''
+            offline = True
+            cache_dir = os.path.join(self.tmp_dir, 'cache')
+
+        gpypi = GPyPI('foo.bar', '1.1', Options())
+        self.assertTrue(isinstance(gpypi.pypi, MetadataStore))
+        with mock.patch.object(gpypi, 'url_from_setuptools') as url_from_setuptools:
+            self.assertEqual(self.foo['releases']['1.1']['urls'][1], gpypi.find_uri())
+            gpypi.version = '1.0'
+            self.assertEqual(None, gpypi.find_uri())
+        self.assertFalse(url_from_setuptools.called)
+
+    def test_recording(self):
+        pypi = mock.Mock()
+        pypi.query_versions_pypi.return_value = ('Foo.Bar', ['1.0', '1.1'])
+        pypi.get_download_urls.return_value = self.foo['releases']['1.1']['urls'][1:]
+        pypi.release_data.side_effect = lambda name, version: {'summary': 'Foo'} if version == '1.1' else None
+
+        class Options:
+            cache_dir = os.path.join(self.tmp_dir, 'cache')
+
+        recording = RecordingPyPI.wrap(pypi, Options())
+        self.addCleanup(recording.store.close)
+        self.assertEqual(('Foo.Bar', ['1.0', '1.1']), recording.query_versions_pypi('foo.bar'))
+        self.assertEqual(pypi.get_download_urls.return_value,
+            recording.get_download_urls('foo.bar', '1.1', pkg_type='source'))
+        self.assertEqual({'summary': 'Foo'}, recording.release_data('foo.bar', '1.1'))
+        self.assertEqual(None, recording.release_data('foo.bar', '1.0'))
+        self.assertEqual(pypi.list_packages.return_value, recording.list_packages())
+
+        self.assertEqual(('Foo.Bar', ['1.0', '1.1']), self.store.query_versions_pypi('foo-bar'))
+        self.assertEqual(self.foo['releases']['1.1']['urls'][1:],
+            self.store.get_download_urls('Foo.Bar', '1.1', pkg_type='source'))
+        self.assertEqual({'summary': 'Foo'}, self.store.release_data('Foo.Bar', '1.1'))
+        self.assertEqual({}, self.store.release_data('Foo.Bar', '1.0'))
+        self.assertEqual(['foo-bar'], [key for (key,) in self.store.db.execute("SELECT key FROM changes")])
+
+        Options.cache_dir = '/dev/null/gpypi'
+        self.assertTrue(RecordingPyPI.wrap(pypi, Options()) is pypi)
@@ -2,8 +2,15 @@
 # -*- coding: utf-8 -*-
 
 import os
+import sys
+import shutil
+import tempfile
+from StringIO import StringIO
+
+import mock
 
 import gpypi
+from gpypi.exc import *
 from gpypi.utils import *
 from gpypi.tests import *
 from gpypi.tests import test_ebuild
@@ -19,6 +26,21 @@ class TestUtils(BaseTestCase):
         module = import_path(os.path.join(self.HERE, 'test_ebuild.py'))
         self.assertTrue(module.TestEbuild)
 
+    def test_import_path_forget(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        with open(os.path.join(tmp_dir, 'gpypi_setup_sample.py'), 'w') as f:
+            f.write("import gpypi_sample_package\nimport json\nNAME = 'foo'\n")
+        with open(os.path.join(tmp_dir, 'gpypi_sample_package.py'), 'w') as f:
+            f.write("")
+
+        module = import_path(os.path.join(tmp_dir, 'gpypi_setup_sample.py'), forget=True)
+        self.assertEqual('foo', module.NAME)
+        self.assertNotIn('gpypi_setup_sample', sys.modules)
+        self.assertNotIn('gpypi_sample_package', sys.modules)
+        self.assertIn('json', sys.modules)
+        self.assertNotIn(tmp_dir, sys.path)
+
     def test_asbool(self):
         self.assertTrue(asbool('y'))
         self.assertTrue(asbool('Y'))
@@ -34,3 +56,64 @@ class TestUtils(BaseTestCase):
         file_ = recursivley_find_file(os.path.dirname(
             os.path.abspath(gpypi.__file__)), 'test_pypi.py')
         self.assertRegexpMatches(file_, '.+gpypi/tests/test_pypi.py$')
+
+    def test_lru_cache_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache['a'] = 1
+        cache['b'] = 2
+        self.assertEqual(1, cache.get('a'))
+        cache['c'] = 3
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertEqual(2, len(cache))
+
+    def test_lru_cache_stats(self):
+        cache = LRUCache()
+        cache['a'] = 1
+        cache.get('a')
+        cache.get('b')
+        self.assertEqual((1, 1), (cache.hits, cache.misses))
+        cache.clear()
+        self.assertEqual((0, 0, 0), (len(cache), cache.hits, cache.misses))
+
+    def test_memoize(self):
+        calls = []
+
+        @memoize(maxsize=10, copy=list)
+        def f(x, y=None):
+            calls.append(x)
+            return [x]
+
+        self.assertEqual([1], f(1))
+        f(1).append(2)
+        self.assertEqual([1], f(1))
+        self.assertEqual([1], calls)
+
+        # unhashable arguments bypass the cache
+        f([1])
+        f([1])
+        self.assertEqual([1, [1], [1]], calls)
+        self.assertTrue(CACHES['%s.f' % __name__] is f.cache)
+
+    def test_read_requirements(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        with open(os.path.join(tmp_dir, 'base.txt'), 'w') as f:
+            f.write("# base\nsix>=1.0\n")
+        path = os.path.join(tmp_dir, 'requirements.txt')
+        with open(path, 'w') as f:
+            f.write("-r base.txt\n\nFoo==1.0  # pinned\n--index-url http://example.com\n"
+                "-e git+https://example.com/bar.git#egg=bar\n"
+                "bar>=2.0,\\\n  <3.0\nbaz; python_version < '2.0'\n")
+
+        requirements = read_requirements(path)
+        self.assertEqual(['six>=1.0', 'Foo==1.0', 'bar<3.0,>=2.0'],
+            [str(req) for req in requirements])
+
+        with mock.patch('sys.stdin', StringIO("foo\n")):
+            self.assertEqual(['foo'], [str(req) for req in read_requirements('-')])
+
+        with open(path, 'w') as f:
+            f.write("foo bar\n")
+        self.assertRaises(GPyPiInvalidParameter, read_requirements, path)
+        self.assertRaises(GPyPiInvalidParameter, read_requirements, os.path.join(tmp_dir, 'x'))
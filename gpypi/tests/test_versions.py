@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from gpypi.versions import *
+from gpypi.tests import *
+
+
+class TestVersions(BaseTestCase):
+    """Unittests for upstream version ordering"""
+
+    VERSIONS = ['1.0', '0.9', '1.1b1', '1.0.post1', '1.0rc1', '0.10', '1.1.dev1']
+
+    def test_sort_versions(self):
+        self.assertEqual(['0.9', '0.10', '1.0rc1', '1.0', '1.0.post1', '1.1.dev1', '1.1b1'],
+            sort_versions(self.VERSIONS))
+        self.assertEqual('1.1b1', sort_versions(self.VERSIONS, reverse=True)[0])
+
+    def test_version_key_cached(self):
+        version_key.cache.clear()
+        version_key('1.0')
+        version_key('1.0')
+        self.assertEqual(1, version_key.cache.hits)
+
+    def test_is_prerelease(self):
+        self.assertTrue(is_prerelease('1.0rc1'))
+        self.assertTrue(is_prerelease('1.1.dev1'))
+        self.assertFalse(is_prerelease('1.0'))
+        self.assertFalse(is_prerelease('1.0.post1'))
+
+    def test_highest_version(self):
+        self.assertEqual('1.1b1', highest_version(self.VERSIONS))
+        self.assertEqual('1.0.post1', highest_version(self.VERSIONS, stable=True))
+        self.assertEqual('1.0b1', highest_version(['0.9b1', '1.0b1'], stable=True))
+        self.assertEqual(None, highest_version([]))
+
+    def test_highest_matching(self):
+        self.assertEqual('1.0rc1', highest_matching(self.VERSIONS, 'foo<=1.0rc1'))
+        self.assertEqual('1.0', highest_matching(self.VERSIONS, 'foo==1.0'))
+        self.assertEqual(None, highest_matching(self.VERSIONS, 'foo>2.0'))
+
+    def test_newest_versions(self):
+        self.assertEqual(['1.1b1', '1.1.dev1'], newest_versions(self.VERSIONS, 2))
+        self.assertEqual(['1.0.post1', '1.0'], newest_versions(self.VERSIONS, 2, stable=True))
+        self.assertEqual(7, len(newest_versions(self.VERSIONS)))
@@ -12,10 +12,10 @@ misc_dict = {
 
 env_dict = {
 'Environment :: Console': None,
-'Environment :: Console :: Curses': None,
-'Environment :: Console :: Framebuffer': None,
+'Environment :: Console :: Curses': 'ncurses',
+'Environment :: Console :: Framebuffer': 'fbcon',
 'Environment :: Console :: Newt': None,
-'Environment :: Console :: svgalib': None,
+'Environment :: Console :: svgalib': 'svga',
 'Environment :: Handhelds/PDAs': None,
 'Environment :: MacOS X': None,
 'Environment :: MacOS X :: Aqua': None,
@@ -29,11 +29,11 @@ env_dict = {
 'Environment :: Web Environment :: Mozilla': None,
 'Environment :: Web Environment :: ToscaWidgets': None,
 'Environment :: Win32 (MS Windows)': None,
-'Environment :: X11 Applications': None,
-'Environment :: X11 Applications :: Gnome': None,
-'Environment :: X11 Applications :: GTK': None,
-'Environment :: X11 Applications :: KDE': None,
-'Environment :: X11 Applications :: Qt': None,
+'Environment :: X11 Applications': 'X',
+'Environment :: X11 Applications :: Gnome': 'gnome',
+'Environment :: X11 Applications :: GTK': 'gtk',
+'Environment :: X11 Applications :: KDE': 'kde',
+'Environment :: X11 Applications :: Qt': 'qt4',
 'Framework :: Buildout': None,
 'Framework :: Chandler': None,
 'Framework :: CubicWeb': None,
@@ -7,9 +7,13 @@ import os
 import sys
 import types
 import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
 
-from portage.output import EOutput
-from pkg_resources import EntryPoint
+from gpypi.exc import GPyPiInvalidParameter
+
+log = logging.getLogger(__name__)
 
 
 def load_model(dotted_name):
@@ -22,31 +26,59 @@ def load_model(dotted_name):
 
     """
     if isinstance(dotted_name, basestring):
+        from pkg_resources import EntryPoint
         return EntryPoint.parse('x=%s' % dotted_name).load(False)
     else:
         # Assume it's already loaded.
         return dotted_name
 
 
-def import_path(fullpath):
+def import_path(fullpath, forget=False):
     """Import a file with full path specification. Allows one to
     import from anywhere, something __import__ does not do.
 
     :param fullpath: Path to a Python file to import
     :type string:
+    :param forget: Remove the module and modules it imported from
+        its directory from :data:`sys.modules` afterwards, so imports
+        of many *setup.py* files don't pile up or shadow each other
+    :type forget: bool
     :rtype: Python module
 
     """
     # http://zephyrfalcon.org/weblog/arch_d7_2002_08_31.html
     path, filename = os.path.split(fullpath)
     filename, ext = os.path.splitext(filename)
+    loaded = set(sys.modules)
     sys.path.insert(0, path)
-    module = __import__(filename)
-    reload(module)  # Might be out of date during tests
-    del sys.path[0]
+    try:
+        module = __import__(filename)
+        if filename in loaded:
+            reload(module)  # Might be out of date during tests
+    finally:
+        del sys.path[0]
+        if forget:
+            forget_modules(path, set(sys.modules) - loaded | set([filename]))
     return module
 
 
+def forget_modules(path, names):
+    """Remove modules `names` loaded from `path` from :data:`sys.modules`
+
+    :param path: Directory
+    :type path: string
+    :param names: Module names
+    :type names: iterable of strings
+
+    """
+    path = os.path.join(os.path.abspath(path), '')
+    for name in names:
+        module = sys.modules.get(name)
+        filename = getattr(module, '__file__', None)
+        if module is None or (filename and os.path.abspath(filename).startswith(path)):
+            sys.modules.pop(name, None)
+
+
 def asbool(obj):
     """Do everything to consider ``obj`` as  boolean.
 
@@ -69,6 +101,120 @@ def asbool(obj):
     return bool(obj)
 
 
+class LRUCache(object):
+    """Bounded mapping that evicts least recently used entries once
+    more than ``maxsize`` items are stored. Safe to share between threads.
+
+    Example::
+
+        >>> cache = LRUCache(maxsize=2)
+        >>> cache['a'] = 1
+        >>> cache['b'] = 2
+        >>> cache['c'] = 3
+        >>> 'a' in cache
+        False
+        >>> cache.get('c')
+        3
+
+    :param maxsize: Maximum number of entries kept
+    :type maxsize: int
+
+    """
+    MISSING = object()
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<LRUCache size(%d/%d) hits(%d) misses(%d)>" % \
+            (len(self), self.maxsize, self.hits, self.misses)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get(self, key, default=None):
+        """Return cached value for ``key`` and mark it as recently used."""
+        with self._lock:
+            value = self._data.pop(key, self.MISSING)
+            if value is self.MISSING:
+                self.misses += 1
+                return default
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def clear(self):
+        """Drop all entries and reset statistics."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+
+#: caches of :func:`memoize` decorated functions by module.function name
+CACHES = {}
+
+
+def memoize(maxsize=1024, copy=None):
+    """Decorator that caches results of a function in a :class:`LRUCache`.
+
+    Calls with unhashable arguments (lists, dicts) bypass the cache.
+    Exceptions are not cached. The cache is exposed as ``.cache``
+    attribute of the decorated function and in :data:`CACHES`.
+
+    :param maxsize: Maximum number of cached results
+    :type maxsize: int
+    :param copy: Called on a cached result before it is returned,
+        use it when callers may mutate results
+    :type copy: callable
+
+    Example::
+
+        >>> @memoize(maxsize=10)
+        ... def double(x):
+        ...     return x * 2
+        >>> double(2), double(2)
+        (4, 4)
+        >>> double.cache.hits
+        1
+
+    """
+    def decorator(f):
+        cache = LRUCache(maxsize)
+        CACHES['%s.%s' % (f.__module__, f.__name__)] = cache
+
+        @wraps(f)
+        def wrapper(*args, **kw):
+            key = args
+            if kw:
+                key += (LRUCache.MISSING,) + tuple(sorted(kw.items()))
+            try:
+                result = cache.get(key, LRUCache.MISSING)
+            except TypeError:
+                # unhashable arguments
+                return f(*args, **kw)
+            if result is LRUCache.MISSING:
+                result = f(*args, **kw)
+                cache[key] = result
+            return copy(result) if copy else result
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+
 class PortageStreamHandler(logging.StreamHandler):
     """StreamHandler that does not add additional newline"""
 
@@ -106,6 +252,8 @@ class PortageFormatter(logging.Formatter):
 
     def format(self, record):
         """format according to logging level"""
+        from portage.output import EOutput
+
         output = logging.Formatter(self._fmt, self.datefmt).format(record)
 
         class LoggingOutput(EOutput):
@@ -137,3 +285,72 @@ def recursivley_find_file(path, filename, in_text=None):
                 return file_
             elif in_text in open(file_).read():
                 return file_
+
+
+def read_requirements(path):
+    """Parse requirements file in pip format.
+
+    Includes (``-r other.txt``) are followed relative to the including
+    file, comments and blank lines are skipped. Other pip options,
+    editable and URL requirements can't be turned into ebuilds
+    and are skipped with a warning. Requirements with environment
+    markers not matching current interpreter are skipped too.
+
+    :param path: Path to the file, ``-`` reads stdin
+    :type path: string
+    :returns: requirements in file order
+    :rtype: list of :class:`pkg_resources.Requirement`
+    :raises: :exc:`gpypi.exc.GPyPiInvalidParameter` if file can't be
+        read or a line can't be parsed
+
+    """
+    from pkg_resources import Requirement
+
+    if path == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        try:
+            with open(path) as f:
+                lines = f.read().splitlines()
+        except IOError, e:
+            raise GPyPiInvalidParameter("Could not read requirements %s: %s" % (path, e))
+
+    requirements = []
+    logical = ''
+    for line in lines:
+        if line.endswith('\\'):
+            logical += line[:-1]
+            continue
+        line, logical = logical + line, ''
+        if line.lstrip().startswith('#'):
+            continue
+        line = line.split(' #', 1)[0].strip()
+        if not line:
+            continue
+
+        include = None
+        option, _, value = line.partition(' ')
+        if option in ('-r', '--requirement'):
+            include = value.strip()
+        elif option.startswith('--requirement='):
+            include = option.split('=', 1)[1]
+        elif option.startswith('-r') and not value:
+            include = option[2:]
+
+        if include:
+            if path != '-':
+                include = os.path.join(os.path.dirname(path), include)
+            requirements.extend(read_requirements(include))
+        elif line.startswith('-') or '/' in line:
+            log.warn("Skipping unsupported requirement line in %s: %s", path, line)
+        else:
+            try:
+                requirement = Requirement.parse(line)
+            except ValueError, e:
+                raise GPyPiInvalidParameter("Invalid requirement in %s: %s (%s)" % (path, line, e))
+            marker = getattr(requirement, 'marker', None)
+            if marker is not None and not marker.evaluate():
+                log.debug("Skipping %s, marker does not match", line)
+                continue
+            requirements.append(requirement)
+    return requirements
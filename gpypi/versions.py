@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Ordering of upstream (:term:`PyPi`) versions
+============================================
+
+Versions are compared with :func:`pkg_resources.parse_version`
+(:pep:`440` with newer setuptools). Parsed keys are cached per version
+string, so sorting versions of the same project again while syncing
+or resolving dependencies doesn't parse anything.
+
+"""
+
+from gpypi.utils import memoize
+
+VERSION_CACHE_SIZE = 100000
+
+
+@memoize(VERSION_CACHE_SIZE)
+def version_key(version):
+    """Return sort key of an upstream version.
+
+    :param version: upstream version
+    :type version: string
+    :returns: :func:`pkg_resources.parse_version` result
+
+    **Example:**
+
+    >>> version_key('1.0b1') < version_key('1.0')
+    True
+
+    """
+    from pkg_resources import parse_version
+    return parse_version(version)
+
+
+def is_prerelease(version):
+    """Return True for alpha, beta, rc and dev versions
+
+    **Example:**
+
+    >>> is_prerelease('1.0b1'), is_prerelease('1.0.post1')
+    (True, False)
+
+    """
+    key = version_key(version)
+    if hasattr(key, 'is_prerelease'):
+        return key.is_prerelease
+    # old setuptools return tuple of strings, pre-release
+    # markers ('*a', '*@', ...) sort before '*final'
+    return any(part.startswith('*') and part < '*final' for part in key)
+
+
+def sort_versions(versions, reverse=False):
+    """Sort versions from the lowest, or from the highest if `reverse`
+
+    :param versions: upstream versions
+    :type versions: iterable of strings
+    :rtype: list
+
+    """
+    return sorted(versions, key=version_key, reverse=reverse)
+
+
+def highest_version(versions, stable=False):
+    """Select the highest version.
+
+    :param versions: upstream versions
+    :type versions: iterable of strings
+    :param stable: Skip pre-releases, unless there is no stable version
+    :type stable: bool
+    :returns: version or None if `versions` is empty
+
+    **Example:**
+
+    >>> highest_version(['1.0', '1.1b1', '0.9'])
+    '1.1b1'
+    >>> highest_version(['1.0', '1.1b1', '0.9'], stable=True)
+    '1.0'
+
+    """
+    newest = newest_versions(versions, 1, stable=stable)
+    return newest[0] if newest else None
+
+
+def highest_matching(versions, requirement):
+    """Select the highest version matching requirement specs.
+
+    :param versions: upstream versions
+    :type versions: iterable of strings
+    :param requirement: Requirement to match
+    :type requirement: string or :class:`pkg_resources.Requirement`
+    :returns: version or None if no version matches
+
+    **Example:**
+
+    >>> highest_matching(['1.0', '1.1', '2.0'], 'foo>=1.0,<2.0')
+    '1.1'
+
+    """
+    if isinstance(requirement, basestring):
+        from pkg_resources import Requirement
+        requirement = Requirement.parse(requirement)
+    for version in sort_versions(versions, reverse=True):
+        if version_key(version) in requirement:
+            return version
+
+
+def newest_versions(versions, n=None, stable=False):
+    """Return `n` newest versions, from the highest.
+
+    :param versions: upstream versions
+    :type versions: iterable of strings
+    :param n: How many versions to return, all if None
+    :type n: int
+    :param stable: Skip pre-releases, unless there is no stable version
+    :type stable: bool
+    :rtype: list
+
+    """
+    ordered = sort_versions(versions, reverse=True)
+    if stable:
+        ordered = [v for v in ordered if not is_prerelease(v)] or ordered
+    return ordered[:n]
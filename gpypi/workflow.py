@@ -16,6 +16,8 @@ from subprocess import Popen, PIPE, STDOUT
 from metagen import metagenerator
 from metagen.main import parse_echangelog_variable
 
+from gpypi.profiling import traced
+
 # TODO: depend on gentoolkit-dev and metagen
 # TODO: cleanup on failures
 # TODO: argparse params
@@ -68,6 +70,7 @@ class Metadata(Workflow):
 
     """
 
+    @traced('workflow.metadata')
     def __call__(self):
         """"""
         if self.options.metadata_disable:
@@ -114,6 +117,7 @@ class Metadata(Workflow):
 class Echangelog(Workflow):
     """Update changelog by echangelog."""
 
+    @traced('workflow.echangelog')
     def __call__(self):
         """"""
         if self.options.echangelog_disable:
@@ -128,6 +132,7 @@ class Echangelog(Workflow):
 class Repoman(Workflow):
     """Run repoman with atleast manifest command."""
 
+    @traced('workflow.repoman')
     def __call__(self):
         """"""
         if self.command('repoman %s' % self.options.repoman_commands):